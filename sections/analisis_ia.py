@@ -5,6 +5,7 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import yfinance as yf
+from utils.scoring import puntuar_registro, PERFIL_MEJORADO
 
 def mostrar(datos_accion):
     """
@@ -285,127 +286,15 @@ def calcular_scoring_fundamental_mejorado(info):
     """
     Scoring fundamental MEJORADO con más métricas y análisis
     """
-    score = 0
-    max_score = 100
-    metricas = {}
+    score, metricas = puntuar_registro(info, PERFIL_MEJORADO)
     analisis = {}
     
-    # CORRECCIÓN: Asegurar que todos los valores sean numéricos
-    pe = float(info.get('trailingPE', 0)) if info.get('trailingPE') else 0
-    revenue_growth = float(info.get('revenueGrowth', 0)) if info.get('revenueGrowth') else 0
-    roe = float(info.get('returnOnEquity', 0)) if info.get('returnOnEquity') else 0
-    debt_to_equity = float(info.get('debtToEquity', 0)) if info.get('debtToEquity') else 0
-    profit_margins = float(info.get('profitMargins', 0)) if info.get('profitMargins') else 0
-    current_ratio = float(info.get('currentRatio', 0)) if info.get('currentRatio') else 0
-    
-    # 1. VALUACIÓN (25 puntos)
-    if pe and pe > 0:
-        if pe < 12:
-            score += 25
-            metricas['P/E Ratio'] = '🟢 Excelente (Muy Barato)'
-        elif pe < 18:
-            score += 20
-            metricas['P/E Ratio'] = '🟡 Bueno (Razonable)'
-        elif pe < 25:
-            score += 15
-            metricas['P/E Ratio'] = '🟠 Moderado (Justo)'
-        else:
-            score += 5
-            metricas['P/E Ratio'] = '🔴 Alto (Caro)'
-    else:
-        metricas['P/E Ratio'] = '⚪ No disponible'
-    
-    # 2. CRECIMIENTO (20 puntos)
-    if revenue_growth and revenue_growth > 0:
-        if revenue_growth > 0.20:
-            score += 20
-            metricas['Crecimiento Ingresos'] = '🟢 Excelente (>20%)'
-        elif revenue_growth > 0.10:
-            score += 15
-            metricas['Crecimiento Ingresos'] = '🟡 Bueno (10-20%)'
-        elif revenue_growth > 0.05:
-            score += 10
-            metricas['Crecimiento Ingresos'] = '🟠 Moderado (5-10%)'
-        else:
-            score += 5
-            metricas['Crecimiento Ingresos'] = '🔴 Bajo (<5%)'
-    else:
-        metricas['Crecimiento Ingresos'] = '🔴 Negativo'
-    
-    # 3. RENTABILIDAD (20 puntos)
-    if roe and roe > 0:
-        if roe > 0.20:
-            score += 20
-            metricas['ROE'] = '🟢 Excelente (>20%)'
-        elif roe > 0.15:
-            score += 15
-            metricas['ROE'] = '🟡 Bueno (15-20%)'
-        elif roe > 0.08:
-            score += 10
-            metricas['ROE'] = '🟠 Moderado (8-15%)'
-        else:
-            score += 5
-            metricas['ROE'] = '🔴 Bajo (<8%)'
-    else:
-        metricas['ROE'] = '🔴 Negativo'
-    
-    # 4. SOLVENCIA (15 puntos)
-    if debt_to_equity and debt_to_equity > 0:
-        if debt_to_equity < 0.5:
-            score += 15
-            metricas['Deuda/Equity'] = '🟢 Excelente (<0.5)'
-        elif debt_to_equity < 1.0:
-            score += 12
-            metricas['Deuda/Equity'] = '🟡 Bueno (0.5-1.0)'
-        elif debt_to_equity < 2.0:
-            score += 8
-            metricas['Deuda/Equity'] = '🟠 Moderado (1.0-2.0)'
-        else:
-            score += 3
-            metricas['Deuda/Equity'] = '🔴 Alto (>2.0)'
-    else:
-        metricas['Deuda/Equity'] = '🟢 Sin deuda'
-    
-    # 5. MÁRGENES (10 puntos)
-    if profit_margins and profit_margins > 0:
-        if profit_margins > 0.20:
-            score += 10
-            metricas['Margen Beneficio'] = '🟢 Excelente (>20%)'
-        elif profit_margins > 0.10:
-            score += 8
-            metricas['Margen Beneficio'] = '🟡 Bueno (10-20%)'
-        elif profit_margins > 0.05:
-            score += 5
-            metricas['Margen Beneficio'] = '🟠 Moderado (5-10%)'
-        else:
-            score += 2
-            metricas['Margen Beneficio'] = '🔴 Bajo (<5%)'
-    else:
-        metricas['Margen Beneficio'] = '🔴 Sin beneficio'
-    
-    # 6. EFICIENCIA (10 puntos)
-    if current_ratio and current_ratio > 0:
-        if current_ratio > 2.0:
-            score += 10
-            metricas['Liquidez'] = '🟢 Excelente (>2.0)'
-        elif current_ratio > 1.5:
-            score += 8
-            metricas['Liquidez'] = '🟡 Bueno (1.5-2.0)'
-        elif current_ratio > 1.0:
-            score += 5
-            metricas['Liquidez'] = '🟠 Moderado (1.0-1.5)'
-        else:
-            score += 2
-            metricas['Liquidez'] = '🔴 Bajo (<1.0)'
-    else:
-        metricas['Liquidez'] = '⚪ No disponible'
-    
     # Análisis adicional
     analisis['resumen_ejecutivo'] = generar_resumen_ejecutivo(score, metricas)
     analisis['comparativa_sector'] = generar_comparativa_sector(info)
     analisis['estrategia'] = generar_estrategia_recomendada(score, info)
     
-    return min(score, max_score), metricas, analisis
+    return score, metricas, analisis
 
 def analizar_sentimiento_avanzado(info, datos_historicos):
     """Análisis de sentimiento MEJORADO"""
@@ -6,6 +6,60 @@ import plotly.express as px
 from datetime import datetime, timedelta
 import yfinance as yf
 import google.generativeai as genai
+from utils.risk_analysis import (
+    calcular_metricas_riesgo_avanzadas, crear_grafica_drawdown_mejorada, crear_grafica_distribucion_retornos,
+    crear_grafica_metricas_moviles, simular_var_montecarlo, crear_grafica_montecarlo
+)
+from utils.almacen_precios import obtener_precios
+from utils.data_fetcher import descargar_precios_lote
+from utils.estres import reproducir_eventos, construir_tabla_estres
+from utils.instantaneas import registrar_instantanea, obtener_instantanea, estado_instantanea, reconstruir_instantanea
+from utils.actualizador import registrar_tarea
+from utils.config import (
+    CACHE_CONFIG, EVENTOS_ESTRES, ESTRES_CONFIG, CARTERAS_ESTRES, SP500_COMPONENTES
+)
+
+def construir_tabla_estres_universo(progreso=None):
+    """
+    Reproduce los eventos de estrés sobre el panel de precios del universo y de las carteras
+    No usa la interfaz de Streamlit; el resultado es la tabla de consulta de la pestaña de riesgo.
+    """
+    simbolos = list(dict.fromkeys(
+        SP500_COMPONENTES + [ticker for cartera in CARTERAS_ESTRES.values() for ticker in cartera] + [ESTRES_CONFIG['indice']]
+    ))
+    if progreso:
+        progreso(0.0, f"Descargando {len(simbolos)} históricos para eventos de estrés...")
+    panel_precios, _ = descargar_precios_lote(simbolos, periodo=ESTRES_CONFIG['periodo'])
+    if panel_precios is None or panel_precios.empty:
+        return None
+    return construir_tabla_estres(panel_precios['Close'], CARTERAS_ESTRES)
+
+registrar_instantanea("estres", construir_tabla_estres_universo, CACHE_CONFIG["datos_sp500"])
+registrar_tarea("estres_eventos", lambda: reconstruir_instantanea("estres"), CACHE_CONFIG["datos_sp500"])
+
+def obtener_estres_ticker(ticker):
+    """
+    Resultados de la acción y del S&P500 en cada evento de estrés
+    Se leen de la tabla precalculada; si aún no existe o la acción no está en el universo se
+    reproducen al momento solo para esta acción (sin esperar a construir el universo).
+    Retorna: DataFrame indexado por (Evento, Símbolo)
+    """
+    indice = ESTRES_CONFIG['indice']
+    if estado_instantanea("estres")["disponible"]:
+        tabla = obtener_instantanea("estres")
+        if tabla is not None:
+            acciones = tabla['acciones']
+            simbolos = acciones.index.get_level_values('Símbolo')
+            if ticker in simbolos and indice in simbolos:
+                return acciones[simbolos.isin([ticker, indice])]
+    
+    inicio = min(pd.Timestamp(evento['inicio']) for evento in EVENTOS_ESTRES)
+    cierres = {}
+    for simbolo in dict.fromkeys([ticker, indice]):
+        datos = obtener_precios(simbolo, intervalo='1d', inicio=inicio)
+        if datos is not None and not datos.empty and 'Close' in datos.columns:
+            cierres[simbolo] = datos['Close']
+    return reproducir_eventos(pd.DataFrame(cierres))
 
 def mostrar(datos_accion):
     """
@@ -166,7 +220,61 @@ def mostrar(datos_accion):
                 st.plotly_chart(grafica_distribucion, use_container_width=True)
                 st.caption("Distribución de ganancias/pérdidas diarias. Línea roja = distribución normal teórica.")
         
+        # Evolución temporal del riesgo (ventanas móviles de 63, 126 y 252 días)
+        st.markdown("**📈 Evolución del Riesgo (Métricas Móviles)**")
+        periodo_movil = st.selectbox(
+            "Historial para las métricas móviles:",
+            [5, 10, 20],
+            format_func=lambda años: f"{años} años",
+            key="periodo_riesgo_movil"
+        )
+        grafica_moviles = crear_grafica_metricas_moviles(stonk, periodo_años=periodo_movil)
+        if grafica_moviles:
+            st.plotly_chart(grafica_moviles, use_container_width=True)
+            st.caption("Beta, volatilidad, Sharpe y drawdown en ventanas de 3, 6 y 12 meses. Permite ver si el riesgo actual es alto respecto a su propia historia.")
+        
 
+        # Simulación Monte Carlo del VaR a varios horizontes
+        st.markdown("**🎲 VaR Monte Carlo por Horizonte**")
+        col_modelo, col_trayectorias = st.columns(2)
+        with col_modelo:
+            modelo_mc = st.selectbox(
+                "Modelo de simulación:",
+                ['bootstrap', 'gbm', 't'],
+                format_func=lambda modelo: {
+                    'bootstrap': 'Bootstrap histórico',
+                    'gbm': 'Browniano geométrico (normal)',
+                    't': 't de Student (colas pesadas)'
+                }[modelo],
+                key="modelo_montecarlo"
+            )
+        with col_trayectorias:
+            trayectorias_mc = st.selectbox(
+                "Trayectorias:",
+                [10_000, 100_000, 250_000],
+                index=1,
+                format_func=lambda n: f"{n:,}",
+                key="trayectorias_montecarlo"
+            )
+        
+        with st.spinner('Simulando trayectorias...'):
+            simulacion = simular_var_montecarlo(stonk, modelo=modelo_mc, trayectorias=trayectorias_mc)
+        
+        if simulacion:
+            grafica_mc = crear_grafica_montecarlo(simulacion, stonk)
+            if grafica_mc:
+                st.plotly_chart(grafica_mc, use_container_width=True)
+            
+            tabla_mc = pd.DataFrame({
+                'Horizonte (días)': simulacion['horizontes'],
+                **{f"VaR {nivel:.0%}": [f"{valor:.2%}" for valor in simulacion['var'][nivel]] for nivel in simulacion['var']},
+                **{f"CVaR {nivel:.0%}": [f"{valor:.2%}" for valor in simulacion['cvar'][nivel]] for nivel in simulacion['cvar']},
+                'Prob. Pérdida': [f"{valor:.1f}%" for valor in simulacion['prob_perdida']]
+            })
+            st.dataframe(tabla_mc, use_container_width=True, hide_index=True)
+            st.caption(f"Rendimiento acumulado simulado ({simulacion['trayectorias_por_segundo']:,.0f} trayectorias/s). "
+                       "Semilla fija: los resultados son reproducibles.")
+        
         # =============================================
         # 4. COMPARATIVA CON EL MERCADO
         # =============================================
@@ -233,21 +341,48 @@ def mostrar(datos_accion):
         # =============================================
         st.subheader("📅 Historial de Eventos de Estrés")
         
-        # Simulación de eventos de estrés (en una app real esto vendría de datos históricos)
-        eventos_estres = [
-            {"fecha": "2020-03", "evento": "COVID-19", "impacto": "Mercado global -40%"},
-            {"fecha": "2022-01", "evento": "Subida tasas Fed", "impacto": "Tech -30%"},
-            {"fecha": "2023-03", "evento": "Crisis bancaria", "impacto": "Bancos -25%"}
-        ]
-        
-        for evento in eventos_estres:
-            col_fecha, col_evento, col_impacto = st.columns([1, 2, 2])
-            with col_fecha:
-                st.write(f"**{evento['fecha']}**")
-            with col_evento:
-                st.write(evento['evento'])
-            with col_impacto:
-                st.write(evento['impacto'])
+        # Eventos reales reproducidos sobre los precios históricos (tabla precalculada)
+        estres = obtener_estres_ticker(stonk)
+        indice = ESTRES_CONFIG['indice']
+        
+        filas_estres = []
+        for evento in EVENTOS_ESTRES:
+            if (evento['id'], stonk) not in estres.index:
+                continue
+            accion = estres.loc[(evento['id'], stonk)]
+            if pd.isna(accion['Rendimiento']):
+                continue
+            mercado = estres.loc[(evento['id'], indice)] if (evento['id'], indice) in estres.index else None
+            filas_estres.append({
+                'Evento': evento['evento'],
+                'Período': f"{evento['inicio']} → {evento['fin']}",
+                'Rendimiento': f"{accion['Rendimiento']:.1%}",
+                'Drawdown Máximo': f"{accion['Drawdown Máximo']:.1%}",
+                'Pico → Valle': f"{accion['Fecha Pico']:%Y-%m-%d} → {accion['Fecha Valle']:%Y-%m-%d} ({accion['Días Pico a Valle']:.0f} sesiones)",
+                'S&P500': f"{mercado['Rendimiento']:.1%}" if mercado is not None and pd.notna(mercado['Rendimiento']) else "N/A",
+                'Contexto': evento['descripcion']
+            })
+        
+        if filas_estres:
+            st.dataframe(pd.DataFrame(filas_estres), use_container_width=True, hide_index=True)
+            st.caption("Rendimiento y mayor caída pico-valle de la acción dentro de cada evento, comparados con el S&P500.")
+        else:
+            st.info(f"No hay histórico de {stonk} que cubra los eventos de estrés registrados")
+        
+        if estado_instantanea("estres")["disponible"]:
+            tabla_estres = obtener_instantanea("estres")
+            if tabla_estres is not None and not tabla_estres['carteras'].empty:
+                with st.expander("📦 Carteras sectoriales en los mismos eventos"):
+                    nombres_eventos = {evento['id']: evento['evento'] for evento in EVENTOS_ESTRES}
+                    carteras = tabla_estres['carteras'].reset_index()
+                    carteras['Evento'] = carteras['Evento'].map(nombres_eventos)
+                    st.dataframe(
+                        carteras.pivot(index='Cartera', columns='Evento', values='Drawdown Máximo').map(
+                            lambda valor: f"{valor:.1%}" if pd.notna(valor) else "N/A"
+                        ),
+                        use_container_width=True
+                    )
+                    st.caption("Drawdown máximo de carteras equiponderadas compradas al inicio de cada evento.")
 
         # =============================================
         # 7. ANÁLISIS CUALITATIVO CON IA
@@ -531,521 +666,7 @@ def mostrar(datos_accion):
         - **Revisa periódicamente** tu exposición al riesgo
         """)
 
-# FUNCIONES DE APOYO (MANTENIDAS DEL CÓDIGO ORIGINAL)
-def calcular_metricas_riesgo_avanzadas(ticker_symbol, periodo_años=5):
-    """
-    Calcula métricas avanzadas de riesgo MEJORADAS para una acción
-    """
-    try:
-        # Descargar datos históricos
-        end_date = datetime.today()
-        start_date = end_date - timedelta(days=periodo_años * 365)
-        
-        st.info(f"📊 Calculando métricas de riesgo para {ticker_symbol}...")
-        
-        # Datos de la acción
-        stock_data = yf.download(ticker_symbol, start=start_date, end=end_date, interval='1d', progress=False)
-        if stock_data.empty or len(stock_data) < 100:
-            st.warning(f"Datos insuficientes para {ticker_symbol}")
-            return None
-            
-        # Datos del mercado (S&P500 como benchmark)
-        market_data = yf.download('^GSPC', start=start_date, end=end_date, interval='1d', progress=False)
-        if market_data.empty:
-            st.warning("No se pudieron obtener datos del mercado")
-            return None
-        
-        # Obtener precios de cierre
-        if isinstance(stock_data.columns, pd.MultiIndex):
-            stock_close = stock_data[('Close', ticker_symbol)]
-        else:
-            stock_close = stock_data['Close']
-            
-        if isinstance(market_data.columns, pd.MultiIndex):
-            market_close = market_data[('Close', '^GSPC')]
-        else:
-            market_close = market_data['Close']
-        
-        # Limpiar datos NaN
-        stock_close = stock_close.dropna()
-        market_close = market_close.dropna()
-        
-        if len(stock_close) < 100 or len(market_close) < 100:
-            st.warning("Datos insuficientes después de limpieza")
-            return None
-        
-        # Calcular rendimientos
-        stock_returns = stock_close.pct_change().dropna()
-        market_returns = market_close.pct_change().dropna()
-        
-        # Alinear fechas
-        common_dates = stock_returns.index.intersection(market_returns.index)
-        if len(common_dates) < 50:
-            st.warning("No hay suficientes fechas comunes con el mercado")
-            return None
-            
-        stock_returns = stock_returns.loc[common_dates]
-        market_returns = market_returns.loc[common_dates]
-        
-        if len(stock_returns) < 50:
-            st.warning("Rendimientos insuficientes para análisis")
-            return None
-        
-        # Convertir a arrays numpy
-        stock_returns_array = stock_returns.values
-        market_returns_array = market_returns.values
-        
-        # 1. CALCULAR BETA Y ALPHA
-        try:
-            covariance = np.cov(stock_returns_array, market_returns_array)[0, 1]
-            market_variance = np.var(market_returns_array)
-            beta = covariance / market_variance if market_variance != 0 else 1.0
-            
-            # Calcular rendimientos totales para Alpha
-            stock_total_return = (stock_close.iloc[-1] / stock_close.iloc[0] - 1)
-            market_total_return = (market_close.iloc[-1] / market_close.iloc[0] - 1)
-            alpha = stock_total_return - (beta * market_total_return)
-        except:
-            beta = 1.0
-            alpha = 0
-        
-        # 2. CALCULAR SHARPE RATIO
-        try:
-            risk_free_rate = 0.02 / 252  # Tasa libre de riesgo diaria (2% anual)
-            excess_returns = stock_returns_array - risk_free_rate
-            sharpe_ratio = (np.mean(excess_returns) / np.std(excess_returns)) * np.sqrt(252) if np.std(excess_returns) != 0 else 0
-        except:
-            sharpe_ratio = 0
-        
-        # 3. CALCULAR SORTINO RATIO (CORREGIDO)
-        try:
-            # Solo considerar rendimientos negativos para el denominador
-            negative_returns = stock_returns_array[stock_returns_array < 0]
-            downside_std = np.std(negative_returns) if len(negative_returns) > 0 else 0.001
-            
-            # Usar el mismo excess_returns que para Sharpe
-            sortino_ratio = (np.mean(excess_returns) / downside_std) * np.sqrt(252) if downside_std != 0 else 0
-        except:
-            sortino_ratio = 0
-        
-        # 4. CALCULAR VALUE AT RISK (VaR) - CORREGIDO
-        try:
-            # VaR histórico (no paramétrico)
-            var_95 = np.percentile(stock_returns_array, 5)  # 5% peores rendimientos
-            var_95_annual = var_95 * np.sqrt(252)  # Anualizar
-            
-            # VaR 99%
-            var_99 = np.percentile(stock_returns_array, 1)
-            var_99_annual = var_99 * np.sqrt(252)
-        except:
-            var_95 = 0
-            var_95_annual = 0
-            var_99 = 0
-            var_99_annual = 0
-        
-        # 5. CALCULAR EXPECTED SHORTFALL (CVaR) - CORREGIDO
-        try:
-            # Promedio de los peores 5% rendimientos
-            cvar_95 = stock_returns_array[stock_returns_array <= var_95].mean()
-            cvar_95_annual = cvar_95 * np.sqrt(252) if not np.isnan(cvar_95) else 0
-        except:
-            cvar_95_annual = 0
-        
-        # 6. CALCULAR DRAWDOWN MÁXIMO - CORREGIDO
-        try:
-            # Calcular retornos acumulados
-            cumulative_returns = (1 + stock_returns).cumprod()
-            rolling_max = cumulative_returns.expanding().max()
-            drawdown = (cumulative_returns - rolling_max) / rolling_max
-            max_drawdown = drawdown.min()
-            
-            # Calcular duración del drawdown máximo
-            max_dd_idx = drawdown.idxmin()
-            # Encontrar el inicio del drawdown (último máximo antes del mínimo)
-            drawdown_period = drawdown[:max_dd_idx]
-            max_dd_start = drawdown_period[drawdown_period == 0].last_valid_index()
-            
-            if max_dd_start is not None:
-                max_dd_duration = (max_dd_idx - max_dd_start).days
-            else:
-                max_dd_duration = 0
-        except:
-            max_drawdown = 0
-            max_dd_duration = 0
-        
-        # 7. CALCULAR VOLATILIDAD ANUALIZADA
-        try:
-            volatility_annual = np.std(stock_returns_array) * np.sqrt(252)
-        except:
-            volatility_annual = 0
-        
-        # 8. CALCULAR CORRELACIÓN CON S&P500
-        try:
-            correlation_sp500 = np.corrcoef(stock_returns_array, market_returns_array)[0, 1]
-            if np.isnan(correlation_sp500):
-                correlation_sp500 = 0
-        except:
-            correlation_sp500 = 0
-        
-        # 9. CALCULAR MÁXIMO GANANCIA/PÉRDIDA CONSECUTIVA - CORREGIDO
-        try:
-            positive_streak = 0
-            negative_streak = 0
-            max_positive_streak = 0
-            max_negative_streak = 0
-            
-            for ret in stock_returns_array:
-                if ret > 0:
-                    positive_streak += 1
-                    negative_streak = 0
-                    max_positive_streak = max(max_positive_streak, positive_streak)
-                elif ret < 0:
-                    negative_streak += 1
-                    positive_streak = 0
-                    max_negative_streak = max(max_negative_streak, negative_streak)
-        except:
-            max_positive_streak = 0
-            max_negative_streak = 0
-        
-        # 10. CALCULAR SKEWNESS Y KURTOSIS - CORREGIDO
-        try:
-            if len(stock_returns_array) >= 4:
-                skewness = float(pd.Series(stock_returns_array).skew())
-                kurtosis = float(pd.Series(stock_returns_array).kurtosis())
-            else:
-                skewness = 0
-                kurtosis = 0
-        except:
-            skewness = 0
-            kurtosis = 0
-        
-        # 11. CALCULAR PROBABILIDAD DE PÉRDIDA - CORREGIDO
-        try:
-            prob_loss = (np.sum(stock_returns_array < 0) / len(stock_returns_array)) * 100
-        except:
-            prob_loss = 50
-        
-        # 12. CALCULAR TREYNOR RATIO
-        try:
-            treynor_ratio = (stock_total_return - 0.02) / beta if beta != 0 else 0
-        except:
-            treynor_ratio = 0
-        
-        # 13. CALCULAR INFORMATION RATIO
-        try:
-            active_returns = stock_returns_array - market_returns_array
-            tracking_error = np.std(active_returns) * np.sqrt(252) if len(active_returns) > 0 else 0
-            information_ratio = (stock_total_return - market_total_return) / tracking_error if tracking_error != 0 else 0
-        except:
-            information_ratio = 0
-        
-        st.success(f"✅ Métricas calculadas: {len(stock_returns)} días analizados")
-        
-        return {
-            # Métricas básicas
-            'Beta': beta,
-            'Alpha': alpha,
-            'Sharpe Ratio': sharpe_ratio,
-            'Sortino Ratio': sortino_ratio,
-            'Treynor Ratio': treynor_ratio,
-            'Information Ratio': information_ratio,
-            
-            # Métricas de riesgo
-            'VaR 95% Diario': var_95,
-            'VaR 95% Anual': var_95_annual,
-            'VaR 99% Diario': var_99,
-            'VaR 99% Anual': var_99_annual,
-            'Expected Shortfall 95%': cvar_95_annual,
-            'Drawdown Máximo': max_drawdown,
-            'Duración Drawdown (días)': max_dd_duration,
-            'Volatilidad Anual': volatility_annual,
-            
-            # Correlaciones
-            'Correlación S&P500': correlation_sp500,
-            
-            # Estadísticas avanzadas
-            'Máxima Ganancia Consecutiva': max_positive_streak,
-            'Máxima Pérdida Consecutiva': max_negative_streak,
-            'Skewness': skewness,
-            'Kurtosis': kurtosis,
-            'Probabilidad de Pérdida (%)': prob_loss,
-            
-            # Rendimientos
-            'Rendimiento Total': stock_total_return,
-            'Rendimiento Mercado': market_total_return,
-            'Días Analizados': len(stock_returns),
-            'Período': f"{periodo_años} años"
-        }
-        
-    except Exception as e:
-        st.error(f"❌ Error calculando métricas de riesgo: {str(e)}")
-        st.error(f"Tipo de error: {type(e).__name__}")
-        return None
-
-def crear_grafica_drawdown_mejorada(ticker_symbol, periodo_años=5):
-    """
-    Crea gráfica de drawdown con datos reales
-    """
-    try:
-        end_date = datetime.today()
-        start_date = end_date - timedelta(days=periodo_años * 365)
-        
-        stock_data = yf.download(ticker_symbol, start=start_date, end=end_date, interval='1d')
-        if stock_data.empty:
-            return None
-        
-        if isinstance(stock_data.columns, pd.MultiIndex):
-            stock_close = stock_data[('Close', ticker_symbol)]
-        else:
-            stock_close = stock_data['Close']
-        
-        returns = stock_close.pct_change().dropna()
-        cumulative_returns = (1 + returns).cumprod()
-        rolling_max = cumulative_returns.expanding().max()
-        drawdown = (cumulative_returns - rolling_max) / rolling_max
-        
-        fig = go.Figure()
-        
-        fig.add_trace(go.Scatter(
-            x=drawdown.index,
-            y=drawdown * 100,
-            fill='tozeroy',
-            fillcolor='rgba(255, 0, 0, 0.3)',
-            line=dict(color='red', width=2),
-            name='Drawdown'
-        ))
-        
-        fig.update_layout(
-            title=f'Drawdown Real - {ticker_symbol}',
-            xaxis_title='Fecha',
-            yaxis_title='Drawdown (%)',
-            height=500
-        )
-        
-        return fig
-        
-    except Exception as e:
-        return None
-
-def crear_grafica_distribucion_retornos(ticker_symbol, periodo_años=5):
-    """
-    Crea gráfica de distribución de retornos diarios COMPLETA con estadísticas avanzadas
-    """
-    try:
-        # Descargar datos históricos
-        end_date = datetime.today()
-        start_date = end_date - timedelta(days=periodo_años * 365)
-        
-        st.info(f"📊 Calculando distribución de retornos para {ticker_symbol} ({periodo_años} años)...")
-        
-        stock_data = yf.download(ticker_symbol, start=start_date, end=end_date, interval='1d', progress=False)
-        if stock_data.empty:
-            st.warning(f"No se pudieron obtener datos para {ticker_symbol}")
-            return None
-        
-        # Manejar MultiIndex columns
-        if isinstance(stock_data.columns, pd.MultiIndex):
-            stock_close = stock_data[('Close', ticker_symbol)]
-        else:
-            stock_close = stock_data['Close']
-        
-        # Calcular retornos diarios en porcentaje
-        returns = stock_close.pct_change().dropna() * 100
-        
-        if len(returns) < 30:
-            st.warning(f"Datos insuficientes para análisis: solo {len(returns)} días de trading")
-            return None
-        
-        # Calcular estadísticas avanzadas
-        mean_return = returns.mean()
-        std_return = returns.std()
-        median_return = returns.median()
-        skewness = returns.skew()
-        kurtosis = returns.kurtosis()
-        
-        # Calcular percentiles
-        percentiles = {
-            '1%': returns.quantile(0.01),
-            '5%': returns.quantile(0.05),
-            '25%': returns.quantile(0.25),
-            '75%': returns.quantile(0.75),
-            '95%': returns.quantile(0.95),
-            '99%': returns.quantile(0.99)
-        }
-        
-        # Crear figura principal
-        fig = go.Figure()
-        
-        # HISTOGRAMA PRINCIPAL
-        fig.add_trace(go.Histogram(
-            x=returns,
-            nbinsx=50,
-            name='Frecuencia de Retornos',
-            opacity=0.75,
-            marker_color='#1f77b4',
-            marker_line_color='#0d47a1',
-            marker_line_width=1,
-            hovertemplate=(
-                '<b>Rango de Retorno:</b> %{x:.2f}%<br>' +
-                '<b>Frecuencia:</b> %{y} días<br>' +
-                '<b>Probabilidad:</b> %{y}' + f'/{len(returns)} días<br>' +
-                '<extra></extra>'
-            )
-        ))
-        
-        # CALCULAR Y AGREGAR DISTRIBUCIÓN NORMAL TEÓRICA
-        x_norm = np.linspace(returns.min() * 1.1, returns.max() * 1.1, 200)
-        pdf_norm = (1/(std_return * np.sqrt(2 * np.pi))) * np.exp(-0.5 * ((x_norm - mean_return)/std_return) ** 2)
-        pdf_norm = pdf_norm * len(returns) * (returns.max() - returns.min()) / 50  # Escalar
-        
-        fig.add_trace(go.Scatter(
-            x=x_norm,
-            y=pdf_norm,
-            mode='lines',
-            name='Distribución Normal Teórica',
-            line=dict(color='red', width=3, dash='dash'),
-            hovertemplate='<b>Distribución Normal</b><br>Retorno: %{x:.2f}%<br>Densidad: %{y:.2f}<extra></extra>'
-        ))
-        
-        # LÍNEAS DE REFERENCIA PRINCIPALES
-        # Línea en CERO
-        fig.add_vline(x=0, line_dash="solid", line_color="green", line_width=2,
-                     annotation_text="Cero", annotation_position="top right",
-                     annotation_font_color="green")
-        
-        # Línea de MEDIA
-        fig.add_vline(x=mean_return, line_dash="dot", line_color="orange", line_width=2,
-                     annotation_text=f"Media: {mean_return:.2f}%", 
-                     annotation_position="top left",
-                     annotation_font_color="orange")
-        
-        # Líneas de DESVIACIÓN ESTÁNDAR
-        colors_sigma = ['#ff6b6b', '#ffa726', '#66bb6a']
-        for i, std_mult in enumerate([1, 2, 3], 1):
-            color = colors_sigma[i-1]
-            # +Sigma
-            fig.add_vline(x=mean_return + std_mult * std_return, 
-                         line_dash="dot", line_color=color, line_width=1,
-                         annotation_text=f"+{std_mult}σ" if std_mult <= 2 else "",
-                         annotation_position="top")
-            # -Sigma
-            fig.add_vline(x=mean_return - std_mult * std_return, 
-                         line_dash="dot", line_color=color, line_width=1,
-                         annotation_text=f"-{std_mult}σ" if std_mult <= 2 else "",
-                         annotation_position="top")
-        
-        # PERCENTILES IMPORTANTES
-        # Percentil 5% (VaR aproximado)
-        fig.add_vline(x=percentiles['5%'], line_dash="dash", line_color="purple", line_width=2,
-                     annotation_text=f"5%: {percentiles['5%']:.2f}%",
-                     annotation_position="bottom right")
-        
-        # Percentil 95%
-        fig.add_vline(x=percentiles['95%'], line_dash="dash", line_color="purple", line_width=2,
-                     annotation_text=f"95%: {percentiles['95%']:.2f}%",
-                     annotation_position="bottom right")
-        
-        # CONFIGURACIÓN DEL LAYOUT
-        fig.update_layout(
-            title=dict(
-                text=f'Distribución de Retornos Diarios - {ticker_symbol}',
-                x=0.5,
-                xanchor='center',
-                font=dict(size=16, color='white')
-            ),
-            xaxis_title=dict(text='Retorno Diario (%)', font=dict(size=14)),
-            yaxis_title=dict(text='Frecuencia (Días)', font=dict(size=14)),
-            height=600,
-            showlegend=True,
-            bargap=0.02,
-            hovermode='x unified',
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1,
-                bgcolor='rgba(0,0,0,0.5)',
-                bordercolor='white'
-            ),
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='white')
-        )
-        
-        # PANEL DE ESTADÍSTICAS DETALLADO
-        fig.add_annotation(
-            x=0.02, y=0.98,
-            xref="paper", yref="paper",
-            text=(
-                f"<b>📊 ESTADÍSTICAS AVANZADAS</b><br>"
-                f"<b>Retorno Promedio:</b> {mean_return:.3f}%<br>"
-                f"<b>Volatilidad (σ):</b> {std_return:.3f}%<br>"
-                f"<b>Mediana:</b> {median_return:.3f}%<br>"
-                f"<b>Asimetría (Skew):</b> {skewness:.3f}<br>"
-                f"<b>Curtosis:</b> {kurtosis:.3f}<br>"
-                f"<b>Días Analizados:</b> {len(returns):,}<br>"
-                f"<b>Período:</b> {periodo_años} años"
-            ),
-            showarrow=False,
-            bgcolor="rgba(30, 30, 30, 0.9)",
-            bordercolor="white",
-            borderwidth=1,
-            borderpad=10,
-            font=dict(size=11, color='white'),
-            align="left"
-        )
-        
-        # INTERPRETACIÓN DE SKEWNESS Y KURTOSIS
-        skew_interpretation = (
-            "Sesgo positivo (colas derechas)" if skewness > 0.5 else
-            "Sesgo negativo (colas izquierdas)" if skewness < -0.5 else
-            "Distribución simétrica"
-        )
-        
-        kurt_interpretation = (
-            "Colas pesadas (Leptocúrtica)" if kurtosis > 3 else
-            "Colas livianas (Platicúrtica)" if kurtosis < 3 else
-            "Colas normales (Mesocúrtica)"
-        )
-        
-        fig.add_annotation(
-            x=0.98, y=0.98,
-            xref="paper", yref="paper",
-            text=(
-                f"<b>🔍 INTERPRETACIÓN</b><br>"
-                f"<b>Asimetría:</b> {skew_interpretation}<br>"
-                f"<b>Curtosis:</b> {kurt_interpretation}<br>"
-                f"<b>Normalidad:</b> {'No normal' if abs(skewness) > 1 or abs(kurtosis) > 3 else 'Cercana a normal'}"
-            ),
-            showarrow=False,
-            bgcolor="rgba(30, 30, 30, 0.9)",
-            bordercolor="white",
-            borderwidth=1,
-            borderpad=10,
-            font=dict(size=11, color='white'),
-            align="right"
-        )
-        
-        # MEJORAS EN LOS EJES
-        fig.update_xaxes(
-            gridcolor='rgba(128, 128, 128, 0.3)',
-            zerolinecolor='rgba(128, 128, 128, 0.5)',
-            zerolinewidth=2
-        )
-        
-        fig.update_yaxes(
-            gridcolor='rgba(128, 128, 128, 0.3)'
-        )
-        
-        return fig
-        
-    except Exception as e:
-        st.error(f"❌ Error creando gráfica de distribución: {str(e)}")
-        # Debug information
-        st.error(f"Tipo de error: {type(e).__name__}")
-        return None
-
+# FUNCIONES DE APOYO (métricas y gráficas de riesgo en utils/risk_analysis)
 def generar_analisis_riesgo_ia(simbolo, datos_riesgo, nombre_empresa):
     """
     Genera análisis de riesgo COMPLETO usando IA de Google Gemini
@@ -5,8 +5,17 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from utils.data_fetcher import obtener_datos_accion
-from utils.technical_analysis import calcular_indicadores_tecnicos
+from utils.almacen_precios import obtener_precios_con_huella
+from utils.registro_indicadores import calcular_indicadores, INDICADORES_SENALES
+from utils.indicadores_incrementales import ultimos_indicadores_almacenados
+
+# Indicadores del registro que necesita cada opción del selector
+INDICADORES_SELECCION = {
+    "RSI": ["RSI"],
+    "MACD": ["MACD_Signal"],
+    "Bandas Bollinger": ["BB"],
+    "Medias Móviles": ["SMA_20", "SMA_50", "SMA_200"]
+}
 
 def mostrar(datos_accion):
     """
@@ -25,8 +34,8 @@ def mostrar_analisis_tecnico(stonk, nombre):
     st.header(f"📈 Análisis Técnico - {nombre}")
     
     try:
-        # Obtener datos
-        data = obtener_datos_accion(stonk, periodo="1y")
+        # Obtener datos (con su huella para las cachés de indicadores)
+        data, huella = obtener_precios_con_huella(stonk, periodo="1y", intervalo="1d")
         
         if data.empty:
             st.warning("No se encontraron datos para análisis técnico")
@@ -44,21 +53,32 @@ def mostrar_analisis_tecnico(stonk, nombre):
                     simple_data[col_type] = data[cols[0]]
             data = simple_data
         
-        # Calcular indicadores técnicos
-        data_tech = calcular_indicadores_tecnicos(data)
-        
-        if data_tech.empty:
-            st.error("No se pudieron calcular los indicadores técnicos")
-            return
-        
         # Selector de indicadores
         st.subheader("🔧 Indicadores Técnicos")
         indicadores = st.multiselect(
             "Selecciona los indicadores a mostrar:",
-            ["RSI", "MACD", "Bandas Bollinger", "Medias Móviles"],
+            list(INDICADORES_SELECCION.keys()),
             default=["RSI", "MACD"]
         )
         
+        # Calcular solo los indicadores de la selección (memorizados por huella); las señales y el
+        # resumen leen la última barra del estado incremental
+        necesarios = []
+        for indicador in indicadores:
+            necesarios.extend(INDICADORES_SELECCION[indicador])
+        data_tech = calcular_indicadores(data, necesarios, huella=huella)
+        
+        if data_tech.empty:
+            st.error("No se pudieron calcular los indicadores técnicos")
+            return
+        
+        # Valores de la última barra para señales y resumen (estado incremental guardado)
+        try:
+            ultimo = ultimos_indicadores_almacenados(stonk, data)
+        except Exception:
+            ultimo = calcular_indicadores(data, INDICADORES_SENALES + ["SMA_20", "SMA_50", "SMA_200"],
+                                          huella=huella).iloc[-1]
+        
         # Crear gráfica principal
         fig = crear_grafica_principal(data_tech, indicadores, stonk)
         st.plotly_chart(fig, use_container_width=True)
@@ -67,13 +87,13 @@ def mostrar_analisis_tecnico(stonk, nombre):
         st.markdown("<br>", unsafe_allow_html=True)
         
         # Mostrar señales técnicas
-        mostrar_senales_tecnicas(data_tech)
+        mostrar_senales_tecnicas(ultimo)
         
         # PEQUEÑO ESPACIO ANTES DEL RESUMEN
         st.markdown("<br>", unsafe_allow_html=True)
         
         # Mostrar resumen de indicadores
-        mostrar_resumen_indicadores(data_tech)
+        mostrar_resumen_indicadores(ultimo)
         
         # PEQUEÑO ESPACIO ANTES DE LA SECCIÓN EDUCATIVA
         st.markdown("<br>", unsafe_allow_html=True)
@@ -208,20 +228,18 @@ def crear_grafica_principal(data_tech, indicadores, stonk):
     
     return fig
 
-def mostrar_senales_tecnicas(data_tech):
+def mostrar_senales_tecnicas(ultimo):
     """
     Muestra las señales técnicas actuales
+    `ultimo`: Series con el cierre y los indicadores de la última barra
     """
     st.subheader("📊 Señales Técnicas Actuales")
     
-    if not data_tech.empty:
-        # Obtener el último dato
-        ultimo = data_tech.iloc[-1]
-        
+    if not ultimo.empty:
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            if 'RSI' in data_tech.columns:
+            if 'RSI' in ultimo.index:
                 rsi_actual = ultimo['RSI']
                 st.metric("RSI", f"{rsi_actual:.2f}")
                 if rsi_actual > 70:
@@ -232,7 +250,7 @@ def mostrar_senales_tecnicas(data_tech):
                     st.info("NEUTRAL 🟡")
         
         with col2:
-            if all(col in data_tech.columns for col in ['MACD', 'MACD_Signal']):
+            if all(col in ultimo.index for col in ['MACD', 'MACD_Signal']):
                 macd_actual = ultimo['MACD']
                 signal_actual = ultimo['MACD_Signal']
                 st.metric("MACD", f"{macd_actual:.4f}")
@@ -242,7 +260,7 @@ def mostrar_senales_tecnicas(data_tech):
                     st.error("BAJISTA 🔴")
         
         with col3:
-            if 'Close' in data_tech.columns and 'SMA_50' in data_tech.columns:
+            if 'Close' in ultimo.index and 'SMA_50' in ultimo.index:
                 precio_actual = ultimo['Close']
                 sma_50 = ultimo['SMA_50']
                 st.metric("Precio vs SMA50", f"${precio_actual:.2f}")
@@ -252,7 +270,7 @@ def mostrar_senales_tecnicas(data_tech):
                     st.error("POR DEBAJO 🔴")
         
         with col4:
-            if all(col in data_tech.columns for col in ['BB_Upper', 'BB_Lower', 'Close']):
+            if all(col in ultimo.index for col in ['BB_Upper', 'BB_Lower', 'Close']):
                 precio_actual = ultimo['Close']
                 bb_upper = ultimo['BB_Upper']
                 bb_lower = ultimo['BB_Lower']
@@ -264,31 +282,32 @@ def mostrar_senales_tecnicas(data_tech):
                 else:
                     st.info("DENTRO BANDAS 🟡")
 
-def mostrar_resumen_indicadores(data_tech):
+def mostrar_resumen_indicadores(ultimo):
     """
     Muestra un resumen tabular de todos los indicadores
+    `ultimo`: Series con el cierre y los indicadores de la última barra
     """
     st.subheader("📈 Resumen de Indicadores")
     
     # Crear DataFrame resumen
     resumen_data = []
     
-    if 'RSI' in data_tech.columns:
-        rsi_actual = data_tech['RSI'].iloc[-1]
+    if 'RSI' in ultimo.index:
+        rsi_actual = ultimo['RSI']
         rsi_señal = "SOBRECOMPRA" if rsi_actual > 70 else "SOBREVENTA" if rsi_actual < 30 else "NEUTRAL"
         resumen_data.append({'Indicador': 'RSI', 'Valor': f"{rsi_actual:.2f}", 'Señal': rsi_señal})
     
-    if all(col in data_tech.columns for col in ['MACD', 'MACD_Signal']):
-        macd_actual = data_tech['MACD'].iloc[-1]
-        signal_actual = data_tech['MACD_Signal'].iloc[-1]
+    if all(col in ultimo.index for col in ['MACD', 'MACD_Signal']):
+        macd_actual = ultimo['MACD']
+        signal_actual = ultimo['MACD_Signal']
         macd_señal = "ALCISTA" if macd_actual > signal_actual else "BAJISTA"
         resumen_data.append({'Indicador': 'MACD', 'Valor': f"{macd_actual:.4f}", 'Señal': macd_señal})
     
-    if all(col in data_tech.columns for col in ['Close', 'SMA_20', 'SMA_50', 'SMA_200']):
-        precio_actual = data_tech['Close'].iloc[-1]
-        sma_20 = data_tech['SMA_20'].iloc[-1]
-        sma_50 = data_tech['SMA_50'].iloc[-1]
-        sma_200 = data_tech['SMA_200'].iloc[-1]
+    if all(col in ultimo.index for col in ['Close', 'SMA_20', 'SMA_50', 'SMA_200']):
+        precio_actual = ultimo['Close']
+        sma_20 = ultimo['SMA_20']
+        sma_50 = ultimo['SMA_50']
+        sma_200 = ultimo['SMA_200']
         
         # Señal de tendencia basada en medias
         if precio_actual > sma_20 > sma_50 > sma_200:
@@ -300,10 +319,10 @@ def mostrar_resumen_indicadores(data_tech):
         
         resumen_data.append({'Indicador': 'Tendencia Medias', 'Valor': f"${precio_actual:.2f}", 'Señal': tendencia})
     
-    if all(col in data_tech.columns for col in ['BB_Upper', 'BB_Lower', 'Close']):
-        precio_actual = data_tech['Close'].iloc[-1]
-        bb_upper = data_tech['BB_Upper'].iloc[-1]
-        bb_lower = data_tech['BB_Lower'].iloc[-1]
+    if all(col in ultimo.index for col in ['BB_Upper', 'BB_Lower', 'Close']):
+        precio_actual = ultimo['Close']
+        bb_upper = ultimo['BB_Upper']
+        bb_lower = ultimo['BB_Lower']
         
         if precio_actual > bb_upper:
             bb_señal = "SOBRE SUPERIOR 🔴"
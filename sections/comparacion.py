@@ -6,7 +6,12 @@ import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime, timedelta
-from utils.data_fetcher import obtener_datos_accion
+from utils.data_fetcher import obtener_datos_accion, obtener_info_completa, descargar_precios_lote
+from utils.almacen_precios import obtener_precios
+from utils.capm import calcular_capm, FRECUENCIAS_CAPM
+from utils.correlaciones import matriz_log_rendimientos, calcular_correlaciones, correlacion_universo
+from utils.config import CACHE_CONFIG, CORRELACION_UNIVERSO_CONFIG
+from sections.screener import SP500_SYMBOLS
 
 def mostrar(datos_accion):
     """
@@ -18,6 +23,97 @@ def mostrar(datos_accion):
     
     mostrar_comparacion(stonk, nombre)
 
+def crear_mapa_correlacion(matriz, nombres, titulo):
+    """
+    Mapa de calor de una matriz de correlación en una sola traza
+    Los valores se escriben en las celdas solo en matrices pequeñas; en matrices grandes quedan
+    en el texto emergente.
+    """
+    matriz = np.asarray(matriz)
+    anotar = len(nombres) <= CORRELACION_UNIVERSO_CONFIG['anotar_hasta']
+    fig = go.Figure(go.Heatmap(
+        z=matriz,
+        x=nombres,
+        y=nombres,
+        colorscale='RdBu_r',
+        zmin=-1,
+        zmax=1,
+        hoverongaps=False,
+        texttemplate='%{z:.2f}' if anotar else None,
+        textfont=dict(size=10),
+        hovertemplate=(
+            '<b>%{y}</b> vs <b>%{x}</b><br>' +
+            'Correlación: %{z:.3f}<extra></extra>'
+        ),
+        colorbar=dict(title="Correlación")
+    ))
+    
+    fig.update_layout(
+        title=titulo,
+        xaxis_title='',
+        yaxis_title='',
+        height=500 if anotar else 800,
+        xaxis=dict(tickangle=45, showticklabels=anotar or len(nombres) <= 60),
+        yaxis=dict(tickangle=0, showticklabels=anotar or len(nombres) <= 60)
+    )
+    return fig
+
+@st.cache_data(ttl=CACHE_CONFIG["datos_sp500"], show_spinner=False)
+def obtener_correlacion_universo(periodo):
+    """
+    Correlación del universo del screener (Ledoit-Wolf y orden por clustering) para una ventana
+    Los cierres salen del almacén local, que el actualizador mantiene al día para el screener: solo
+    se descargan los símbolos sin histórico suficiente para la ventana.
+    Se guarda por ventana: cambiar de ventana no recalcula las ya consultadas.
+    """
+    try:
+        panel_precios, _ = descargar_precios_lote(SP500_SYMBOLS[:520], periodo=periodo)
+        if panel_precios is None or panel_precios.empty:
+            return {}
+        return correlacion_universo(panel_precios['Close'], CORRELACION_UNIVERSO_CONFIG['cobertura_minima'])
+    except Exception:
+        return {}
+
+def mostrar_correlacion_universo():
+    """Mapa de calor de correlaciones de todo el universo, agrupado por clusters"""
+    with st.expander("🌐 Correlación del universo S&P 500 (clusters)"):
+        ventanas = CORRELACION_UNIVERSO_CONFIG['ventanas']
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            ventana = st.selectbox("Ventana de cálculo:", list(ventanas.keys()), index=1,
+                                   key="ventana_correlacion_universo")
+        with col2:
+            calcular = st.checkbox("Calcular matriz del universo", key="calcular_correlacion_universo")
+        
+        if not calcular:
+            st.caption("Descarga el histórico de todo el universo; las ventanas ya calculadas se guardan en caché.")
+            return
+        
+        with st.spinner("Calculando correlaciones del universo..."):
+            resultado = obtener_correlacion_universo(ventanas[ventana])
+        
+        if not resultado:
+            st.warning("⚠️ No hay datos suficientes para calcular la correlación del universo")
+            return
+        
+        correlacion = resultado['correlacion']
+        st.plotly_chart(
+            crear_mapa_correlacion(correlacion.to_numpy(), list(correlacion.columns),
+                                   f'Correlación del Universo ({ventana}, ordenada por clusters)'),
+            use_container_width=True
+        )
+        
+        superior = correlacion.to_numpy()[np.triu_indices(len(correlacion), k=1)]
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Instrumentos", f"{len(correlacion)}", f"{resultado['fechas']} días comunes")
+        with col2:
+            st.metric("Correlación Promedio", f"{superior.mean():.3f}")
+        with col3:
+            st.metric("Contracción Ledoit-Wolf", f"{resultado['intensidad']:.1%}")
+        st.caption("Covarianza contraída hacia una identidad escalada (Ledoit-Wolf): estable aunque haya "
+                   "más acciones que días; el orden agrupa las acciones que se mueven juntas.")
+
 def mostrar_comparacion(stonk, nombre):
     """
     Muestra la sección completa de comparación de acciones
@@ -104,6 +200,7 @@ def mostrar_comparacion(stonk, nombre):
             
             nombres_acciones = {}
             datos_comparacion = {}
+            precios_cierre = {}
             metricas_detalladas = {}
             
             # OBTENER NOMBRES Y DATOS DE CADA ACCIÓN
@@ -123,10 +220,8 @@ def mostrar_comparacion(stonk, nombre):
                             nombres_acciones[accion] = nombre_accion
                         
                         # Descargar datos históricos
-                        data_temp = yf.download(accion, 
-                                              start=start_date_comparacion.strftime('%Y-%m-%d'), 
-                                              end=end_date.strftime('%Y-%m-%d'),
-                                              progress=False)
+                        data_temp = obtener_precios(accion, intervalo='1d',
+                                                    inicio=start_date_comparacion, fin=end_date)
                         
                         if not data_temp.empty:
                             # Manejar MultiIndex columns
@@ -147,6 +242,7 @@ def mostrar_comparacion(stonk, nombre):
                                 precio_inicial = precios.iloc[0]
                                 if precio_inicial > 0:
                                     datos_comparacion[accion] = (precios / precio_inicial - 1) * 100
+                                    precios_cierre[accion] = precios
                                     
                                     # CALCULAR MÉTRICAS ADICIONALES
                                     returns = precios.pct_change().dropna()
@@ -219,6 +315,7 @@ def mostrar_comparacion(stonk, nombre):
                 
                 # GUARDAR DATOS EN SESSION_STATE PARA USAR EN CAPM
                 st.session_state.datos_comparacion = datos_comparacion
+                st.session_state.precios_cierre = precios_cierre
                 st.session_state.nombres_acciones = nombres_acciones
                 st.session_state.metricas_detalladas = metricas_detalladas
                 st.session_state.acciones_comparar = acciones_comparar
@@ -229,6 +326,7 @@ def mostrar_comparacion(stonk, nombre):
     # MOSTRAR RESULTADOS DE COMPARACIÓN SI EXISTEN
     if hasattr(st.session_state, 'comparacion_realizada') and st.session_state.comparacion_realizada:
         datos_comparacion = st.session_state.datos_comparacion
+        precios_cierre = st.session_state.get('precios_cierre', {})
         nombres_acciones = st.session_state.nombres_acciones
         metricas_detalladas = st.session_state.metricas_detalladas
         acciones_comparar = st.session_state.acciones_comparar
@@ -392,112 +490,38 @@ def mostrar_comparacion(stonk, nombre):
             acciones_validas = [a for a in acciones_comparar if a != indice_symbol and a in datos_comparacion]
             
             if len(acciones_validas) > 1:
-                precios_originales = {}
-                
-                for accion in acciones_validas:
-                    try:
-                        # Descargar datos frescos para obtener precios originales
-                        data_temp = yf.download(accion, 
-                                            start=start_date_comparacion.strftime('%Y-%m-%d'), 
-                                            end=end_date.strftime('%Y-%m-%d'),
-                                            progress=False)
-                        
-                        if not data_temp.empty:
-                            # Obtener precios de cierre originales
-                            if isinstance(data_temp.columns, pd.MultiIndex):
-                                close_columns = [col for col in data_temp.columns if 'Close' in col]
-                                if close_columns:
-                                    precios = data_temp[close_columns[0]]
-                                else:
-                                    continue
-                            else:
-                                if 'Close' in data_temp.columns:
-                                    precios = data_temp['Close']
-                                else:
-                                    continue
-                            
-                            precios_originales[accion] = precios
-                    except Exception as e:
-                        st.warning(f"Error obteniendo precios para {accion}: {str(e)}")
-                
-                # Calcular matriz de correlación con precios originales
+                # Un único panel de rendimientos logarítmicos con los cierres ya descargados
+                rendimientos = matriz_log_rendimientos(
+                    {accion: precios_cierre[accion] for accion in acciones_validas if accion in precios_cierre}
+                )
+                correlaciones = calcular_correlaciones(rendimientos) if not rendimientos.empty else {}
+
+                metodos_correlacion = {
+                    'Pearson (fechas comunes por pareja)': 'pareada',
+                    'Pearson (fechas comunes a todas)': 'pearson',
+                    'Spearman (fechas comunes a todas)': 'spearman'
+                }
+                metodo_correlacion = st.radio(
+                    "Método de correlación:",
+                    list(metodos_correlacion.keys()),
+                    horizontal=True,
+                    key="metodo_correlacion_comparacion"
+                )
+
+                # Sin datos suficientes la correlación se muestra como 0
                 corr_matrix = np.zeros((len(acciones_validas), len(acciones_validas)))
+                if correlaciones:
+                    corr_matrix = correlaciones[metodos_correlacion[metodo_correlacion]] \
+                        .reindex(index=acciones_validas, columns=acciones_validas).fillna(0).to_numpy()
+                    np.fill_diagonal(corr_matrix, 1.0)
                 nombres_display = [nombres_acciones.get(a, a) for a in acciones_validas]
                 
-                for i, accion1 in enumerate(acciones_validas):
-                    for j, accion2 in enumerate(acciones_validas):
-                        if i == j:
-                            corr_matrix[i, j] = 1.0
-                        else:
-                            try:
-                                if accion1 in precios_originales and accion2 in precios_originales:
-                                    precios1 = precios_originales[accion1]
-                                    precios2 = precios_originales[accion2]
-                                    
-                                    # Alinear fechas
-                                    common_dates = precios1.index.intersection(precios2.index)
-                                    if len(common_dates) > 10:
-                                        precios1_aligned = precios1.loc[common_dates]
-                                        precios2_aligned = precios2.loc[common_dates]
-                                        
-                                        # Calcular rendimientos logarítmicos diarios para mejor correlación
-                                        returns1 = np.log(precios1_aligned / precios1_aligned.shift(1)).dropna()
-                                        returns2 = np.log(precios2_aligned / precios2_aligned.shift(1)).dropna()
-                                        
-                                        # Alinear después del cálculo
-                                        common_returns = returns1.index.intersection(returns2.index)
-                                        if len(common_returns) > 0:
-                                            returns1_final = returns1.loc[common_returns]
-                                            returns2_final = returns2.loc[common_returns]
-                                            
-                                            # Calcular correlación de Pearson
-                                            corr = returns1_final.corr(returns2_final)
-                                            corr_matrix[i, j] = corr if not np.isnan(corr) else 0
-                                else:
-                                    corr_matrix[i, j] = 0
-                            except Exception as e:
-                                corr_matrix[i, j] = 0
-                
                 # Solo mostrar la gráfica si hay correlaciones no cero
                 if not np.all(corr_matrix == 0):
                     # GRÁFICA DE CORRELACIÓN
-                    fig_corr = go.Figure()
-                    
-                    fig_corr.add_trace(go.Heatmap(
-                        z=corr_matrix,
-                        x=nombres_display,
-                        y=nombres_display,
-                        colorscale='RdBu_r',
-                        zmin=-1,
-                        zmax=1,
-                        hoverongaps=False,
-                        hovertemplate=(
-                            '<b>%{y}</b> vs <b>%{x}</b><br>' +
-                            'Correlación: %{z:.3f}<extra></extra>'
-                        ),
-                        colorbar=dict(title="Correlación")
-                    ))
-                    
-                    # Agregar anotaciones con valores
-                    for i in range(len(acciones_validas)):
-                        for j in range(len(acciones_validas)):
-                            color = 'white' if abs(corr_matrix[i, j]) > 0.5 else 'black'
-                            fig_corr.add_annotation(
-                                x=j,
-                                y=i,
-                                text=f"{corr_matrix[i, j]:.2f}",
-                                showarrow=False,
-                                font=dict(color=color, size=10)
-                            )
-                    
-                    fig_corr.update_layout(
-                        title='Matriz de Correlación entre Acciones (Rendimientos Diarios)',
-                        xaxis_title='',
-                        yaxis_title='',
-                        height=500,
-                        width=600,
-                        xaxis=dict(tickangle=45),
-                        yaxis=dict(tickangle=0)
+                    fig_corr = crear_mapa_correlacion(
+                        corr_matrix, nombres_display,
+                        'Matriz de Correlación entre Acciones (Rendimientos Diarios)'
                     )
                     
                     st.plotly_chart(fig_corr, use_container_width=True)
@@ -563,6 +587,8 @@ def mostrar_comparacion(stonk, nombre):
             else:
                 st.info("ℹ️ Se necesitan al menos 2 acciones válidas para calcular correlaciones")
                     
+        mostrar_correlacion_universo()
+        
         # ANÁLISIS DE RIESGO-RENDIMIENTO
         st.subheader("🎯 Análisis Riesgo-Rendimiento")
         
@@ -749,87 +775,48 @@ def mostrar_comparacion(stonk, nombre):
                     "10 años": 3650
                 }
 
-                frecuencia_map = {
-                    "Diario": "1d",
-                    "Semanal": "1wk", 
-                    "Mensual": "1mo"
-                }
-
                 dias_periodo_comp = periodo_map[periodo_capm_comp]
-                intervalo_comp = frecuencia_map[frecuencia_capm_comp]
-
-                # Función para calcular CAPM comparativo
-                def calcular_capm_comparativo(simbolo, indice_symbol, dias_periodo, intervalo):
-                    """Calcula métricas CAPM para comparación"""
+                start_date_capm = datetime.today() - timedelta(days=dias_periodo_comp)
+                
+                # Barras del almacén local; las semanales y mensuales se derivan del histórico diario
+                intervalo_capm = FRECUENCIAS_CAPM[frecuencia_capm_comp][0]
+                acciones_capm = [a for a in acciones_comparar
+                                 if a not in indices_map.values() and a in datos_comparacion]
+                cierres_capm = {}
+                for simbolo in acciones_capm + [indice_symbol]:
                     try:
-                        start_date = datetime.today() - timedelta(days=dias_periodo)
-                        end_date = datetime.today()
-                        
-                        # Descargar datos
-                        stock_data = yf.download(simbolo, start=start_date, end=end_date, interval=intervalo)
-                        market_data = yf.download(indice_symbol, start=start_date, end=end_date, interval=intervalo)
-                        
-                        if stock_data.empty or market_data.empty:
-                            return None
-                        
-                        # Obtener precios de cierre
-                        if isinstance(stock_data.columns, pd.MultiIndex):
-                            stock_close = stock_data[('Close', simbolo)]
-                        else:
-                            stock_close = stock_data['Close']
-                            
-                        if isinstance(market_data.columns, pd.MultiIndex):
-                            market_close = market_data[('Close', indice_symbol)]
-                        else:
-                            market_close = market_data['Close']
-                        
-                        # Calcular rendimientos
-                        stock_returns = stock_close.pct_change().dropna()
-                        market_returns = market_close.pct_change().dropna()
-                        
-                        # Alinear fechas
-                        common_dates = stock_returns.index.intersection(market_returns.index)
-                        stock_returns = stock_returns.loc[common_dates]
-                        market_returns = market_returns.loc[common_dates]
-                        
-                        if len(stock_returns) < 5:
-                            return None
-                        
-                        # Calcular Beta histórico
-                        if len(market_returns) > 1:
-                            beta_real, intercepto = np.polyfit(market_returns, stock_returns, 1)
-                            r_squared = np.corrcoef(market_returns, stock_returns)[0, 1] ** 2
-                        else:
-                            beta_real = 1.0
-                            r_squared = 0
-                        
-                        # Calcular CAPM
-                        costo_capital = tasa_libre_riesgo_comp + beta_real * prima_riesgo_mercado_comp
-                        
-                        return {
-                            'beta_historico': beta_real,
-                            'r_squared': r_squared,
-                            'costo_capital': costo_capital,
-                            'puntos_datos': len(stock_returns),
-                            'rendimiento_promedio': stock_returns.mean() * 100,
-                            'volatilidad': stock_returns.std() * 100,
-                            'stock_returns': stock_returns,
-                            'market_returns': market_returns,
-                            'fechas': common_dates
-                        }
-                        
+                        data_temp = obtener_precios(simbolo, intervalo=intervalo_capm, inicio=start_date_capm,
+                                                    fin=datetime.today())
+                        if not data_temp.empty and 'Close' in data_temp.columns:
+                            cierres_capm[simbolo] = data_temp['Close']
                     except Exception as e:
-                        st.error(f"Error calculando CAPM para {simbolo}: {str(e)}")
-                        return None
-
-                # Calcular CAPM para todas las acciones
+                        st.error(f"Error obteniendo precios para {simbolo}: {str(e)}")
+                
+                # Calcular CAPM para todas las acciones en una sola regresión
                 datos_capm_comparativo = {}
                 
-                for accion in [a for a in acciones_comparar if a not in indices_map.values()]:
-                    if accion in datos_comparacion:  # Solo acciones con datos válidos
-                        datos_capm = calcular_capm_comparativo(accion, indice_symbol, dias_periodo_comp, intervalo_comp)
-                        if datos_capm:
-                            datos_capm_comparativo[accion] = datos_capm
+                if indice_symbol in cierres_capm and len(cierres_capm) > 1:
+                    cierre_indice = cierres_capm.pop(indice_symbol)
+                    tabla_capm, rendimientos_capm, rendimiento_indice = calcular_capm(
+                        pd.DataFrame(cierres_capm), cierre_indice, frecuencia_capm_comp
+                    )
+                    
+                    for accion, fila in tabla_capm.dropna(subset=['Beta']).iterrows():
+                        stock_returns = rendimientos_capm[accion].dropna()
+                        market_returns = rendimiento_indice.loc[stock_returns.index]
+                        datos_capm_comparativo[accion] = {
+                            'beta_historico': fila['Beta'],
+                            'alfa': fila['Alfa'],
+                            'r_squared': fila['R²'],
+                            'volatilidad_residual': fila['Volatilidad Residual Anual'],
+                            'costo_capital': tasa_libre_riesgo_comp + fila['Beta'] * prima_riesgo_mercado_comp,
+                            'puntos_datos': int(fila['Observaciones']),
+                            'rendimiento_promedio': fila['Rendimiento Promedio'] * 100,
+                            'volatilidad': fila['Volatilidad'] * 100,
+                            'stock_returns': stock_returns,
+                            'market_returns': market_returns,
+                            'fechas': stock_returns.index
+                        }
 
                 # GUARDAR RESULTADOS CAPM EN SESSION_STATE
                 st.session_state.datos_capm_comparativo = datos_capm_comparativo
@@ -880,7 +867,7 @@ def mostrar_comparacion(stonk, nombre):
                     # Agregar línea de regresión para cada acción
                     if len(datos['market_returns']) > 1:
                         beta_real = datos['beta_historico']
-                        intercepto = np.polyfit(datos['market_returns'], datos['stock_returns'], 1)[1]
+                        intercepto = datos['alfa']
                         
                         x_line = np.linspace(datos['market_returns'].min(), datos['market_returns'].max(), 50)
                         y_line = intercepto + beta_real * x_line
@@ -954,8 +941,7 @@ def mostrar_comparacion(stonk, nombre):
                 for accion, datos in datos_capm_comparativo.items():
                     # Obtener Beta de Yahoo Finance para comparación
                     try:
-                        ticker_temp = yf.Ticker(accion)
-                        info_temp = ticker_temp.info
+                        info_temp = obtener_info_completa(accion)
                         beta_yahoo = info_temp.get('beta', datos['beta_historico'])
                         diferencia_beta = datos['beta_historico'] - beta_yahoo
                     except:
@@ -1038,6 +1024,7 @@ def mostrar_comparacion(stonk, nombre):
                         'R_Cuadrado': datos['r_squared'],
                         'Rendimiento_Promedio_%': datos['rendimiento_promedio'],
                         'Volatilidad_%': datos['volatilidad'],
+                        'Volatilidad_Residual_Anual_%': datos['volatilidad_residual'] * 100,
                         'Puntos_Datos': datos['puntos_datos'],
                         'Periodo': periodo_capm_comp,
                         'Frecuencia': frecuencia_capm_comp
@@ -10,6 +10,11 @@ from datetime import datetime, timedelta
 import google.generativeai as genai
 import os
 from dotenv import load_dotenv
+from utils.almacen_precios import obtener_precios
+from utils.capm import calcular_capm, FRECUENCIAS_CAPM
+from utils.risk_analysis import (
+    obtener_base_riesgo, crear_grafica_drawdown_mejorada, crear_grafica_distribucion_retornos
+)
 
 # Cargar variables de entorno
 load_dotenv()
@@ -59,350 +64,26 @@ def extraer_tabla_finviz(ticker):
     except Exception as e:
         return {}
 
-def calcular_skewness_kurtosis(returns):
-    """
-    Calcula skewness y kurtosis de una serie de retornos
-    """
-    try:
-        n = len(returns)
-        if n < 4:
-            return 0, 0
-        
-        mean = np.mean(returns)
-        std = np.std(returns)
-        
-        if std == 0:
-            return 0, 0
-        
-        # Skewness
-        skew = np.sum((returns - mean) ** 3) / (n * std ** 3)
-        
-        # Kurtosis (Fisher's definition, excess kurtosis)
-        kurt = np.sum((returns - mean) ** 4) / (n * std ** 4) - 3
-        
-        return skew, kurt
-        
-    except Exception as e:
-        return 0, 0
-
 def calcular_metricas_riesgo_avanzadas(ticker_symbol, periodo_años=5):
     """
-    Calcula métricas avanzadas de riesgo MEJORADAS para una acción
+    Métricas de riesgo del núcleo compartido (utils/risk_analysis) redondeadas para mostrarlas
     """
     try:
-        # Descargar datos históricos
-        end_date = datetime.today()
-        start_date = end_date - timedelta(days=periodo_años * 365)
-        
-        # Datos de la acción
-        stock_data = yf.download(ticker_symbol, start=start_date, end=end_date, interval='1d')
-        if stock_data.empty or len(stock_data) == 0:
+        metricas = obtener_base_riesgo(ticker_symbol, periodo_años)['metricas']
+        if metricas is None:
             return None
-            
-        # Datos del mercado (S&P500 como benchmark)
-        market_data = yf.download('^GSPC', start=start_date, end=end_date, interval='1d')
-        if market_data.empty or len(market_data) == 0:
-            return None
-        
-        # Asegurarnos de que tenemos columnas de cierre
-        if 'Close' not in stock_data.columns or 'Close' not in market_data.columns:
-            return None
-        
-        # Calcular rendimientos diarios - manejar MultiIndex
-        if isinstance(stock_data.columns, pd.MultiIndex):
-            stock_close = stock_data[('Close', ticker_symbol)]
-        else:
-            stock_close = stock_data['Close']
-            
-        if isinstance(market_data.columns, pd.MultiIndex):
-            market_close = market_data[('Close', '^GSPC')]
-        else:
-            market_close = market_data['Close']
-        
-        stock_returns = stock_close.pct_change().dropna()
-        market_returns = market_close.pct_change().dropna()
         
-        # Alinear las fechas
-        common_dates = stock_returns.index.intersection(market_returns.index)
-        if len(common_dates) == 0:
-            return None
-            
-        stock_returns = stock_returns.loc[common_dates]
-        market_returns = market_returns.loc[common_dates]
-        
-        if len(stock_returns) < 30:  # Mínimo de datos
-            return None
-        
-        # Convertir a arrays numpy para evitar problemas con Series
-        stock_returns_array = stock_returns.values
-        market_returns_array = market_returns.values
-        
-        # 1. CALCULAR BETA
-        covariance = np.cov(stock_returns_array, market_returns_array)[0, 1]
-        market_variance = np.var(market_returns_array)
-        beta = covariance / market_variance if market_variance != 0 else 0
-        
-        # 2. CALCULAR ALPHA
-        stock_total_return = (stock_close.iloc[-1] / stock_close.iloc[0] - 1)
-        market_total_return = (market_close.iloc[-1] / market_close.iloc[0] - 1)
-        alpha = stock_total_return - (beta * market_total_return)
-        
-        # 3. CALCULAR SHARPE RATIO
-        risk_free_rate = 0.02 / 252  # Tasa diaria
-        excess_returns = stock_returns_array - risk_free_rate
-        sharpe_ratio = (np.mean(excess_returns) / np.std(excess_returns) * np.sqrt(252) 
-                      if np.std(excess_returns) != 0 else 0)
-        
-        # 4. CALCULAR SORTINO RATIO
-        downside_returns = stock_returns_array[stock_returns_array < 0]
-        downside_std = np.std(downside_returns) if len(downside_returns) > 0 else 0
-        sortino_ratio = (np.mean(excess_returns) / downside_std * np.sqrt(252) 
-                       if downside_std != 0 else 0)
-        
-        # 5. CALCULAR TREYNOR RATIO
-        treynor_ratio = (stock_total_return - 0.02) / beta if beta != 0 else 0
-        
-        # 6. CALCULAR INFORMATION RATIO
-        active_returns = stock_returns_array - market_returns_array
-        tracking_error = np.std(active_returns) * np.sqrt(252) if len(active_returns) > 0 else 0
-        information_ratio = (stock_total_return - market_total_return) / tracking_error if tracking_error != 0 else 0
-        
-        # 7. CALCULAR VALUE AT RISK (VaR)
-        var_95 = np.percentile(stock_returns_array, 5)
-        var_95_annual = var_95 * np.sqrt(252)
-        var_99 = np.percentile(stock_returns_array, 1)
-        var_99_annual = var_99 * np.sqrt(252)
-        
-        # 8. CALCULAR EXPECTED SHORTFALL (CVaR)
-        cvar_95 = stock_returns_array[stock_returns_array <= var_95].mean()
-        cvar_95_annual = cvar_95 * np.sqrt(252) if not np.isnan(cvar_95) else 0
-        
-        # 9. CALCULAR DRAWDOWN MÁXIMO
-        cumulative_returns = (1 + stock_returns).cumprod()
-        rolling_max = cumulative_returns.expanding().max()
-        drawdown = (cumulative_returns - rolling_max) / rolling_max
-        max_drawdown = drawdown.min()
-        
-        # Calcular duración del drawdown máximo
-        max_dd_idx = drawdown.idxmin()
-        max_dd_start = drawdown[drawdown == 0].last_valid_index()
-        if max_dd_start is not None:
-            max_dd_duration = (max_dd_idx - max_dd_start).days
-        else:
-            max_dd_duration = 0
-        
-        # 10. CALCULAR VOLATILIDAD ANUALIZADA
-        volatility_annual = np.std(stock_returns_array) * np.sqrt(252)
-        
-        # 11. CALCULAR CORRELACIONES CON MÚLTIPLES ÍNDICES 
-        correlation_sp500 = np.corrcoef(stock_returns_array, market_returns_array)[0, 1]
-        
-        # 12. CALCULAR MÁXIMO GANANCIA/PÉRDIDA CONSECUTIVA 
-        positive_streak = 0
-        negative_streak = 0
-        max_positive_streak = 0
-        max_negative_streak = 0
-        
-        for ret in stock_returns_array:
-            if ret > 0:
-                positive_streak += 1
-                negative_streak = 0
-                max_positive_streak = max(max_positive_streak, positive_streak)
-            elif ret < 0:
-                negative_streak += 1
-                positive_streak = 0
-                max_negative_streak = max(max_negative_streak, negative_streak)
-        
-        # 13. CALCULAR SKEWNESS Y KURTOSIS
-        skewness, kurtosis = calcular_skewness_kurtosis(stock_returns_array)
-        
-        # 14. CALCULAR PROBABILIDAD DE PÉRDIDA
-        prob_loss = np.mean(stock_returns_array < 0) * 100
-        
-        return {
-            # Métricas básicas
-            'Beta': round(beta, 4),
-            'Alpha': round(alpha, 4),
-            'Sharpe Ratio': round(sharpe_ratio, 4),
-            'Sortino Ratio': round(sortino_ratio, 4),
-            'Treynor Ratio': round(treynor_ratio, 4),
-            'Information Ratio': round(information_ratio, 4),
-            
-            # Métricas de riesgo
-            'VaR 95% Diario': round(var_95, 4),
-            'VaR 95% Anual': round(var_95_annual, 4),
-            'VaR 99% Diario': round(var_99, 4),
-            'VaR 99% Anual': round(var_99_annual, 4),
-            'Expected Shortfall 95%': round(cvar_95_annual, 4),
-            'Drawdown Máximo': round(max_drawdown, 4),
-            'Duración Drawdown (días)': max_dd_duration,
-            'Volatilidad Anual': round(volatility_annual, 4),
-            
-            # Correlaciones
-            'Correlación S&P500': round(correlation_sp500, 4),
-            
-            # Estadísticas avanzadas
-            'Máxima Ganancia Consecutiva': max_positive_streak,
-            'Máxima Pérdida Consecutiva': max_negative_streak,
-            'Skewness': round(skewness, 4),
-            'Kurtosis': round(kurtosis, 4),
-            'Probabilidad de Pérdida (%)': round(prob_loss, 2),
-            
-            # Rendimientos
-            'Rendimiento Total': round(stock_total_return, 4),
-            'Rendimiento Mercado': round(market_total_return, 4),
-            'Días Analizados': len(stock_returns),
-            'Período': f"{periodo_años} años"
-        }
+        redondeadas = {}
+        for clave, valor in metricas.items():
+            if isinstance(valor, (float, np.floating)):
+                valor = round(float(valor), 2 if clave == 'Probabilidad de Pérdida (%)' else 4)
+            redondeadas[clave] = valor
+        return redondeadas
         
     except Exception as e:
         st.error(f"Error calculando métricas de riesgo: {str(e)}")
         return None
 
-def crear_grafica_drawdown_mejorada(ticker_symbol, periodo_años=5):
-    """
-    Crea gráfica de drawdown MEJORADA para visualizar pérdidas máximas
-    """
-    try:
-        # Descargar datos
-        end_date = datetime.today()
-        start_date = end_date - timedelta(days=periodo_años * 365)
-        
-        stock_data = yf.download(ticker_symbol, start=start_date, end=end_date, interval='1d')
-        if stock_data.empty:
-            return None
-        
-        # Manejar MultiIndex columns
-        if isinstance(stock_data.columns, pd.MultiIndex):
-            stock_close = stock_data[('Close', ticker_symbol)]
-        else:
-            stock_close = stock_data['Close']
-        
-        # Calcular drawdown
-        returns = stock_close.pct_change().dropna()
-        cumulative_returns = (1 + returns).cumprod()
-        rolling_max = cumulative_returns.expanding().max()
-        drawdown = (cumulative_returns - rolling_max) / rolling_max
-        
-        # Crear gráfica
-        fig = go.Figure()
-        
-        # Área de drawdown
-        fig.add_trace(go.Scatter(
-            x=drawdown.index,
-            y=drawdown * 100,
-            fill='tozeroy',
-            fillcolor='rgba(255, 0, 0, 0.3)',
-            line=dict(color='red', width=2),
-            name='Drawdown',
-            hovertemplate='<b>Drawdown</b><br>Fecha: %{x}<br>Drawdown: %{y:.2f}%<extra></extra>'
-        ))
-        
-        # Línea de máximo anterior
-        fig.add_hline(y=0, line_dash="dash", line_color="green", annotation_text="Máximo Anterior")
-        
-        # Encontrar los 3 mayores drawdowns
-        drawdown_sorted = drawdown.sort_values()
-        top_drawdowns = drawdown_sorted.head(3)
-        
-        # Anotar los mayores drawdowns
-        for i, (fecha, valor) in enumerate(top_drawdowns.items()):
-            fig.add_annotation(
-                x=fecha,
-                y=valor * 100,
-                text=f"DD {i+1}: {valor*100:.1f}%",
-                showarrow=True,
-                arrowhead=2,
-                bgcolor="red",
-                font=dict(color="white", size=10),
-                yshift=10 if i == 0 else (-20 if i == 1 else 30)
-            )
-        
-        fig.update_layout(
-            title=f'Análisis de Drawdown - {ticker_symbol}',
-            xaxis_title='Fecha',
-            yaxis_title='Drawdown (%)',
-            height=500,
-            showlegend=True,
-            hovermode='x unified'
-        )
-        
-        return fig
-        
-    except Exception as e:
-        st.error(f"Error creando gráfica de drawdown: {str(e)}")
-        return None
-
-def crear_grafica_distribucion_retornos(ticker_symbol, periodo_años=5):
-    """
-    Crea gráfica de distribución de retornos
-    """
-    try:
-        # Descargar datos
-        end_date = datetime.today()
-        start_date = end_date - timedelta(days=periodo_años * 365)
-        
-        stock_data = yf.download(ticker_symbol, start=start_date, end=end_date, interval='1d')
-        if stock_data.empty:
-            return None
-        
-        # Manejar MultiIndex columns
-        if isinstance(stock_data.columns, pd.MultiIndex):
-            stock_close = stock_data[('Close', ticker_symbol)]
-        else:
-            stock_close = stock_data['Close']
-        
-        # Calcular retornos
-        returns = stock_close.pct_change().dropna() * 100  # En porcentaje
-        
-        # Crear histograma con curva normal
-        fig = go.Figure()
-        
-        # Histograma
-        fig.add_trace(go.Histogram(
-            x=returns,
-            nbinsx=50,
-            name='Frecuencia',
-            opacity=0.7,
-            marker_color='lightblue'
-        ))
-        
-        # Calcular distribución normal (aproximación)
-        if len(returns) > 0:
-            x_norm = np.linspace(returns.min(), returns.max(), 100)
-            # Aproximación manual de distribución normal
-            mean = np.mean(returns)
-            std = np.std(returns)
-            if std > 0:
-                y_norm = (1/(std * np.sqrt(2 * np.pi))) * np.exp(-0.5 * ((x_norm - mean)/std) ** 2)
-                y_norm = y_norm * len(returns) * (returns.max() - returns.min()) / 50  # Escalar
-                
-                # Curva normal
-                fig.add_trace(go.Scatter(
-                    x=x_norm,
-                    y=y_norm,
-                    mode='lines',
-                    name='Distribución Normal',
-                    line=dict(color='red', width=2)
-                ))
-        
-        # Línea en cero
-        fig.add_vline(x=0, line_dash="dash", line_color="green")
-        
-        fig.update_layout(
-            title=f'Distribución de Retornos Diarios - {ticker_symbol}',
-            xaxis_title='Retorno Diario (%)',
-            yaxis_title='Frecuencia',
-            height=400,
-            showlegend=True
-        )
-        
-        return fig
-        
-    except Exception as e:
-        st.error(f"Error creando gráfica de distribución: {str(e)}")
-        return None
-
 # FUNCIÓN PRINCIPAL DE LA SECCIÓN (EXACTAMENTE COMO EN TU CÓDIGO ORIGINAL)
 def mostrar(datos_accion):
     stonk = datos_accion['ticker']
@@ -813,19 +494,13 @@ def mostrar(datos_accion):
                     "10 años": 3650
                 }
 
-                frecuencia_map = {
-                    "Diario": "1d",
-                    "Semanal": "1wk", 
-                    "Mensual": "1mo"
-                }
-
                 dias_periodo = periodo_map[periodo_capm]
-                intervalo = frecuencia_map[frecuencia_capm]
+                frecuencia_calculo = frecuencia_capm
 
                 # Ajustar frecuencia automáticamente para períodos muy cortos
                 if dias_periodo <= 90 and frecuencia_capm == "Mensual":  # 3 meses o menos
                     st.warning("⚠️ Para períodos cortos (≤ 3 meses) se recomienda frecuencia Diaria o Semanal para mejor análisis")
-                    intervalo = "1d"  # Forzar diario para períodos cortos
+                    frecuencia_calculo = "Diario"  # Forzar diario para períodos cortos
 
                 st.info(f"**📊 Configuración:** {periodo_capm} | {frecuencia_capm} | {stonk} vs S&P500")
 
@@ -834,31 +509,20 @@ def mostrar(datos_accion):
                     start_date = datetime.today() - timedelta(days=dias_periodo)
                     end_date = datetime.today()
                     
-                    # Descargar datos
+                    # Barras del almacén local; las semanales y mensuales se derivan del histórico diario
+                    intervalo_capm = FRECUENCIAS_CAPM[frecuencia_calculo][0]
                     with st.spinner(f'Cargando datos {frecuencia_capm.lower()} para {periodo_capm}...'):
-                        stock_data = yf.download(stonk, start=start_date, end=end_date, interval=intervalo)
-                        market_data = yf.download('^GSPC', start=start_date, end=end_date, interval=intervalo)
+                        stock_data = obtener_precios(stonk, intervalo=intervalo_capm, inicio=start_date, fin=end_date)
+                        market_data = obtener_precios('^GSPC', intervalo=intervalo_capm, inicio=start_date, fin=end_date)
                     
                     if not stock_data.empty and not market_data.empty:
-                        # Obtener precios de cierre
-                        if isinstance(stock_data.columns, pd.MultiIndex):
-                            stock_close = stock_data[('Close', stonk)]
-                        else:
-                            stock_close = stock_data['Close']
-                            
-                        if isinstance(market_data.columns, pd.MultiIndex):
-                            market_close = market_data[('Close', '^GSPC')]
-                        else:
-                            market_close = market_data['Close']
-                        
-                        # Calcular rendimientos
-                        stock_returns = stock_close.pct_change().dropna()
-                        market_returns = market_close.pct_change().dropna()
-                        
-                        # Alinear fechas
-                        common_dates = stock_returns.index.intersection(market_returns.index)
-                        stock_returns = stock_returns.loc[common_dates]
-                        market_returns = market_returns.loc[common_dates]
+                        tabla_capm, rendimientos_capm, market_returns = calcular_capm(
+                            stock_data['Close'].rename(stonk), market_data['Close'], frecuencia_calculo
+                        )
+                        stock_returns = rendimientos_capm[stonk].dropna()
+                        market_returns = market_returns.loc[stock_returns.index]
+                        common_dates = stock_returns.index
+                        regresion = tabla_capm.loc[stonk]
                         
                         if len(stock_returns) > 5:  # Mínimo reducido para períodos cortos
                             # Crear scatter plot
@@ -897,8 +561,8 @@ def mostrar(datos_accion):
                             
                             # Calcular línea de regresión (Beta histórico)
                             if len(market_returns) > 1:
-                                beta_real, intercepto = np.polyfit(market_returns, stock_returns, 1)
-                                r_squared = np.corrcoef(market_returns, stock_returns)[0, 1] ** 2
+                                beta_real, intercepto = regresion['Beta'], regresion['Alfa']
+                                r_squared = regresion['R²']
                                 
                                 # Línea de regresión
                                 x_line = np.linspace(market_returns.min(), market_returns.max(), 50)
@@ -915,9 +579,9 @@ def mostrar(datos_accion):
                             
                             # Línea CAPM teórica
                             # Ajustar tasa libre de riesgo según frecuencia
-                            if frecuencia_capm == "Diario":
+                            if frecuencia_calculo == "Diario":
                                 rf_ajustado = tasa_libre_riesgo / 252
-                            elif frecuencia_capm == "Semanal":
+                            elif frecuencia_calculo == "Semanal":
                                 rf_ajustado = tasa_libre_riesgo / 52
                             else:  # Mensual
                                 rf_ajustado = tasa_libre_riesgo / 12
@@ -8,7 +8,17 @@ from datetime import datetime, timedelta
 import time
 import requests
 import google.generativeai as genai
-from utils.data_fetcher import obtener_datos_accion, obtener_info_completa
+from utils.data_fetcher import (
+    obtener_datos_accion, obtener_info_completa, descargar_precios_lote, extraer_ticker_lote,
+    obtener_info_lote
+)
+from utils.almacen_precios import obtener_precios
+from utils.instantaneas import (
+    registrar_instantanea, obtener_instantanea, invalidar_instantanea, estado_instantanea,
+    reconstruir_instantanea
+)
+from utils.actualizador import registrar_tarea
+from utils.config import CACHE_CONFIG
 
 def mostrar_seccion_inicio():
     """
@@ -31,10 +41,37 @@ def mostrar_seccion_inicio():
 def _precalcular_datos_mercado():
     """
     Precalcula todos los datos del mercado para máxima velocidad
+    Los datos son una instantánea compartida entre sesiones: solo la primera petición
+    del proceso espera a que se construya.
     """
-    if 'datos_mercado_precalculados' in st.session_state:
-        return st.session_state.datos_mercado_precalculados
+    if estado_instantanea("mercado")["disponible"]:
+        return obtener_instantanea("mercado")
     
+    with st.spinner('🔄 Precalculando datos del mercado...'):
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+        
+        def _mostrar_progreso(fraccion, texto):
+            progress_bar.progress(fraccion)
+            status_text.text(texto)
+        
+        datos_precalculados = obtener_instantanea("mercado", progreso=_mostrar_progreso)
+        
+        progress_bar.empty()
+        status_text.empty()
+    
+    return datos_precalculados or {
+        'sp500_data': pd.DataFrame(),
+        'market_data': {},
+        'empresa_info': {},
+        'sectores': _obtener_componentes_sp500()
+    }
+
+def _construir_datos_mercado(progreso=None):
+    """
+    Construye los datos de mercado de Inicio (índice, precios e info de empresas)
+    No usa la interfaz de Streamlit; `progreso(fraccion, texto)` permite mostrar el avance.
+    """
     # Inicializar estructura de datos
     datos_precalculados = {
         'sp500_data': {},
@@ -44,51 +81,45 @@ def _precalcular_datos_mercado():
     }
     
     # Precalcular datos del S&P 500
-    with st.spinner('🔄 Precalculando datos del mercado...'):
-        try:
-            sp500_data = obtener_datos_accion("^GSPC")
-            datos_precalculados['sp500_data'] = sp500_data
-        except:
-            datos_precalculados['sp500_data'] = pd.DataFrame()
-        
-        # Precalcular información de empresas
-        todos_los_tickers = []
-        for sector, stocks in datos_precalculados['sectores'].items():
-            for stock in stocks:
-                todos_los_tickers.append(stock["ticker"])
-        
-        # Limitar a 100 tickers para demo
-        tickers_rapidos = todos_los_tickers[:160]
-        
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        for i, ticker in enumerate(tickers_rapidos):
-            try:
-                # Precalcular datos de precio
-                stock_data = obtener_datos_accion(ticker)
-                if not stock_data.empty and len(stock_data) >= 2:
-                    datos_precalculados['market_data'][ticker] = stock_data
-                
-                # Precalcular info de empresa
-                company_info = obtener_info_completa(ticker)
-                datos_precalculados['empresa_info'][ticker] = company_info
-                
-                # Actualizar progreso
-                if i % 10 == 0:
-                    progress_percent = (i + 1) / len(tickers_rapidos)
-                    progress_bar.progress(progress_percent)
-                    status_text.text(f"Precalculando: {i+1}/{len(tickers_rapidos)} acciones")
-                    
-            except Exception as e:
-                continue
-        
-        progress_bar.empty()
-        status_text.empty()
+    try:
+        datos_precalculados['sp500_data'] = obtener_precios("^GSPC", periodo="1y", intervalo="1d")
+    except:
+        datos_precalculados['sp500_data'] = pd.DataFrame()
+    
+    # Precalcular información de empresas
+    todos_los_tickers = []
+    for sector, stocks in datos_precalculados['sectores'].items():
+        for stock in stocks:
+            todos_los_tickers.append(stock["ticker"])
+    
+    # Limitar a 100 tickers para demo
+    tickers_rapidos = todos_los_tickers[:160]
+    
+    # Precalcular datos de precio de todos los tickers en descargas múltiples
+    if progreso:
+        progreso(0.0, f"Descargando precios de {len(tickers_rapidos)} acciones...")
+    panel_precios, _ = descargar_precios_lote(tickers_rapidos, periodo="1y")
+    
+    for ticker in tickers_rapidos:
+        stock_data = extraer_ticker_lote(panel_precios, ticker)
+        if not stock_data.empty and len(stock_data) >= 2:
+            datos_precalculados['market_data'][ticker] = stock_data
+    
+    # Precalcular info de empresas en paralelo (limitador compartido de Yahoo)
+    def _actualizar_progreso(completados, total):
+        if progreso and (completados % 10 == 0 or completados == total):
+            progreso(completados / total, f"Precalculando: {completados}/{total} acciones")
+    
+    infos, errores_info = obtener_info_lote(tickers_rapidos, progreso=_actualizar_progreso)
+    datos_precalculados['empresa_info'].update(infos)
+    for ticker in errores_info:
+        datos_precalculados['empresa_info'][ticker] = {}
     
-    st.session_state.datos_mercado_precalculados = datos_precalculados
     return datos_precalculados
 
+registrar_instantanea("mercado", _construir_datos_mercado, CACHE_CONFIG["datos_precios"])
+registrar_tarea("inicio_mercado", lambda: reconstruir_instantanea("mercado"), CACHE_CONFIG["datos_precios"])
+
 def _obtener_componentes_sp500():
     """
     Retorna la lista completa de componentes del S&P 500 por sector
@@ -663,8 +694,7 @@ def _mostrar_analisis_actual():
 # Función para limpiar caché
 def limpiar_cache_mercado():
     """Limpia el caché del mercado"""
-    if 'datos_mercado_precalculados' in st.session_state:
-        del st.session_state.datos_mercado_precalculados
+    invalidar_instantanea("mercado")
     if 'analisis_actual' in st.session_state:
         del st.session_state.analisis_actual
 
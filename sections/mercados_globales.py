@@ -2,11 +2,15 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import yfinance as yf
-import requests
+import time
 from datetime import datetime
+from functools import partial
 import google.generativeai as genai
 import os
 from dotenv import load_dotenv
+from utils.config import MERCADOS_CONFIG
+from utils.peticiones_async import llamar, obtener_json, resolver_cadena, compartida, recoger
+from utils.salud_proveedores import estado_proveedores
 
 # Cargar variables de entorno
 load_dotenv()
@@ -28,730 +32,381 @@ API_KEYS = {
     "alpha_vantage": AlphaVantage
 }
 
+# Símbolo de cada activo en cada proveedor (si falta la clave, el proveedor no lo ofrece);
+# 'alpha_vantage_fx' se consulta como tipo de cambio y 'alpha_vantage' como cotización
+INDICES_GLOBALES = {
+    "S&P 500": {"fmp": "^GSPC", "alpha_vantage": ".INX", "yahoo": "^GSPC"},
+    "NASDAQ": {"fmp": "^IXIC", "alpha_vantage": ".IXIC", "yahoo": "^IXIC"},
+    "Dow Jones": {"fmp": "^DJI", "alpha_vantage": ".DJI", "yahoo": "^DJI"},
+    "Russell 2000": {"fmp": "^RUT", "yahoo": "^RUT"},
+    "NYSE Composite": {"fmp": "^NYA", "yahoo": "^NYA"},
+    "FTSE 100": {"fmp": "^FTSE", "alpha_vantage": ".FTSE", "yahoo": "^FTSE"},
+    "DAX": {"fmp": "^GDAXI", "alpha_vantage": ".GDAXI", "yahoo": "^GDAXI"},
+    "CAC 40": {"fmp": "^FCHI", "yahoo": "^FCHI"},
+    "Euro Stoxx 50": {"fmp": "^STOXX50E", "yahoo": "^STOXX50E"},
+    "IBEX 35": {"fmp": "^IBEX", "yahoo": "^IBEX"},
+    "Nikkei 225": {"fmp": "^N225", "yahoo": "^N225"},
+    "Hang Seng": {"fmp": "^HSI", "yahoo": "^HSI"},
+    "Shanghai Composite": {"fmp": "000001.SS", "yahoo": "000001.SS"},
+    "S&P/TSX Composite": {"fmp": "^GSPTSE", "yahoo": "^GSPTSE"},
+    "ASX 200": {"fmp": "^AXJO", "yahoo": "^AXJO"},
+    "Bovespa": {"fmp": "^BVSP", "yahoo": "^BVSP"},
+    "SMI Switzerland": {"fmp": "^SSMI", "yahoo": "^SSMI"}
+}
+
+# Divisas: CurrencyAPI da todas en una sola llamada (con base USD)
+DIVISAS_GLOBALES = {
+    "EUR/USD": {"currency_api": "EUR", "fmp": "EURUSD", "alpha_vantage_fx": "EURUSD", "yahoo": "EURUSD=X"},
+    "USD/JPY": {"currency_api": "JPY", "fmp": "USDJPY", "alpha_vantage_fx": "USDJPY", "yahoo": "JPY=X"},
+    "GBP/USD": {"currency_api": "GBP", "fmp": "GBPUSD", "alpha_vantage_fx": "GBPUSD", "yahoo": "GBPUSD=X"},
+    "USD/CHF": {"currency_api": "CHF", "fmp": "USDCHF", "alpha_vantage_fx": "USDCHF", "yahoo": "CHF=X"},
+    "USD/CAD": {"currency_api": "CAD", "fmp": "USDCAD", "yahoo": "CAD=X"},
+    "AUD/USD": {"currency_api": "AUD", "fmp": "AUDUSD", "alpha_vantage_fx": "AUDUSD", "yahoo": "AUDUSD=X"},
+    "NZD/USD": {"currency_api": "NZD", "fmp": "NZDUSD", "yahoo": "NZDUSD=X"},
+    "USD/CNY": {"currency_api": "CNY", "fmp": "USDCNY", "yahoo": "CNY=X"},
+    "USD/HKD": {"currency_api": "HKD", "fmp": "USDHKD", "yahoo": "HKD=X"},
+    "USD/SGD": {"currency_api": "SGD", "fmp": "USDSGD", "yahoo": "SGD=X"},
+    "USD/SEK": {"currency_api": "SEK", "fmp": "USDSEK", "yahoo": "SEK=X"},
+    "USD/NOK": {"currency_api": "NOK", "fmp": "USDNOK", "yahoo": "NOK=X"},
+    "USD/MXN": {"currency_api": "MXN", "fmp": "USDMXN", "yahoo": "MXN=X"},
+    "USD/INR": {"currency_api": "INR", "fmp": "USDINR", "yahoo": "INR=X"},
+    "USD/BRL": {"currency_api": "BRL", "fmp": "USDBRL", "yahoo": "BRL=X"},
+    "USD/ZAR": {"currency_api": "ZAR", "fmp": "USDZAR", "yahoo": "ZAR=X"},
+    "USD/RUB": {"currency_api": "RUB", "fmp": "USDRUB", "yahoo": "RUB=X"}
+}
+
+# Pares cotizados como divisa/USD: CurrencyAPI da USD/divisa y hay que invertir
+DIVISAS_INVERTIDAS = ["EUR", "GBP", "AUD", "NZD"]
+
+CRIPTOMONEDAS = {
+    "Bitcoin": {"fmp": "BTCUSD", "alpha_vantage_fx": "BTCUSD", "yahoo": "BTC-USD"},
+    "Ethereum": {"fmp": "ETHUSD", "alpha_vantage_fx": "ETHUSD", "yahoo": "ETH-USD"},
+    "BNB": {"fmp": "BNBUSD", "yahoo": "BNB-USD"},
+    "XRP": {"fmp": "XRPUSD", "alpha_vantage_fx": "XRPUSD", "yahoo": "XRP-USD"},
+    "Cardano": {"fmp": "ADAUSD", "alpha_vantage_fx": "ADAUSD", "yahoo": "ADA-USD"},
+    "Solana": {"fmp": "SOLUSD", "yahoo": "SOL-USD"},
+    "Dogecoin": {"fmp": "DOGEUSD", "yahoo": "DOGE-USD"},
+    "Polkadot": {"fmp": "DOTUSD", "yahoo": "DOT-USD"},
+    "Litecoin": {"fmp": "LTCUSD", "alpha_vantage_fx": "LTCUSD", "yahoo": "LTC-USD"},
+    "Chainlink": {"fmp": "LINKUSD", "yahoo": "LINK-USD"},
+    "Bitcoin Cash": {"fmp": "BCHUSD", "yahoo": "BCH-USD"},
+    "Avalanche": {"fmp": "AVAXUSD", "yahoo": "AVAX-USD"},
+    "Polygon": {"fmp": "MATICUSD", "yahoo": "MATIC-USD"},
+    "Stellar": {"fmp": "XLMUSD", "yahoo": "XLM-USD"},
+    "Uniswap": {"fmp": "UNIUSD", "yahoo": "UNI-USD"},
+    "Shiba Inu": {"fmp": "SHIBUSD", "yahoo": "SHIB-USD"},
+    "Tron": {"fmp": "TRXUSD", "yahoo": "TRX-USD"}
+}
+
+MATERIAS_PRIMAS = {
+    "Petróleo WTI": {"fmp": "CLUSD", "alpha_vantage": "CLUSD", "yahoo": "CL=F"},
+    "Petróleo Brent": {"fmp": "BZUSD", "yahoo": "BZ=F"},
+    "Oro": {"fmp": "GCUSD", "alpha_vantage": "GCUSD", "yahoo": "GC=F"},
+    "Plata": {"fmp": "SIUSD", "alpha_vantage": "SIUSD", "yahoo": "SI=F"},
+    "Cobre": {"fmp": "HGUSD", "alpha_vantage": "HGUSD", "yahoo": "HG=F"},
+    "Gas Natural": {"fmp": "NGUSD", "yahoo": "NG=F"},
+    "Platino": {"fmp": "PLUSD", "yahoo": "PL=F"},
+    "Paladio": {"fmp": "PAUSD", "yahoo": "PA=F"},
+    "Aluminio": {"fmp": "ALIUSD", "yahoo": "ALI=F"},
+    "Trigo": {"fmp": "ZWUSD", "yahoo": "ZW=F"},
+    "Maíz": {"fmp": "ZCUSD", "yahoo": "ZC=F"},
+    "Soja": {"fmp": "ZSUSD", "yahoo": "ZS=F"},
+    "Azúcar": {"fmp": "SBUSD", "yahoo": "SB=F"},
+    "Café": {"fmp": "KCUSD", "yahoo": "KC=F"},
+    "Cacao": {"fmp": "CCUSD", "yahoo": "CC=F"},
+    "Algodón": {"fmp": "CTUSD", "yahoo": "CT=F"},
+    "Ganado": {"fmp": "LEUSD", "yahoo": "LE=F"}
+}
+
+# Tasas del Tesoro: campo del endpoint de FMP (todas en una llamada) y plazo de Alpha Vantage
+TASAS_TESORO = {
+    "Tesoro USA 1 mes": {"fmp": "month1"},
+    "Tesoro USA 2 meses": {"fmp": "month2"},
+    "Tesoro USA 3 meses": {"fmp": "month3"},
+    "Tesoro USA 6 meses": {"fmp": "month6"},
+    "Tesoro USA 1 año": {"fmp": "year1"},
+    "Tesoro USA 2 años": {"fmp": "year2", "alpha_vantage": "2year"},
+    "Tesoro USA 3 años": {"fmp": "year3"},
+    "Tesoro USA 5 años": {"fmp": "year5", "alpha_vantage": "5year"},
+    "Tesoro USA 7 años": {"fmp": "year7"},
+    "Tesoro USA 10 años": {"fmp": "year10", "alpha_vantage": "10year"},
+    "Tesoro USA 20 años": {"fmp": "year20"},
+    "Tesoro USA 30 años": {"fmp": "year30"}
+}
+
+BONOS_YAHOO = {
+    "USA 2 años": "^IRX",
+    "USA 10 años": "^TNX",
+    "USA 30 años": "^TYX",
+    "USA 5 años": "^FVX",
+    "USA 13 semanas": "^IRX"
+}
+
+# Activos cotizados por clase (las tasas se construyen aparte)
+ACTIVOS_MERCADO = {
+    "indices": INDICES_GLOBALES,
+    "forex": DIVISAS_GLOBALES,
+    "cripto": CRIPTOMONEDAS,
+    "commodities": MATERIAS_PRIMAS
+}
+CLASES_MERCADO = ("indices", "forex", "cripto", "commodities", "tasas")
+
+NOMBRES_FUENTES = {
+    "fmp": "Financial Modeling Prep",
+    "alpha_vantage": "Alpha Vantage",
+    "currency_api": "CurrencyAPI",
+    "yahoo": "Yahoo Finance",
+    "coingecko": "CoinGecko"
+}
+
+# FUENTES: cada una devuelve {"valor", "cambio" (None si el proveedor no lo da), "fuente"} o None
+
+async def _cotizaciones_fmp(simbolos, limite):
+    """Cotizaciones de Financial Modeling Prep de varios símbolos en una sola llamada"""
+    url = f"https://financialmodelingprep.com/api/v3/quote/{','.join(simbolos)}?apikey={API_KEYS['financial_modeling_prep']}"
+    data = await obtener_json(url, "fmp", limite)
+    if not isinstance(data, list):
+        return None
+    return {quote.get('symbol'): quote for quote in data}
+
+async def _cotizacion_fmp(cotizaciones, simbolo):
+    """Cotización de un símbolo a partir de la respuesta compartida de FMP"""
+    datos = await cotizaciones()
+    if not datos or simbolo not in datos:
+        return None
+    quote = datos[simbolo]
+    return {"valor": quote.get('price', 0), "cambio": quote.get('changesPercentage', 0), "fuente": NOMBRES_FUENTES["fmp"]}
+
+async def _cotizacion_alpha_vantage(simbolo, limite):
+    """GLOBAL_QUOTE de Alpha Vantage"""
+    url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={simbolo}&apikey={API_KEYS['alpha_vantage']}"
+    data = await obtener_json(url, "alpha_vantage", limite)
+    if not data or "Global Quote" not in data:
+        return None
+    quote = data["Global Quote"]
+    precio_actual = float(quote.get('05. price', 0))
+    if precio_actual <= 0:
+        return None
+    cambio_porcentaje = float(quote.get('10. change percent', '0%').replace('%', ''))
+    return {"valor": precio_actual, "cambio": cambio_porcentaje, "fuente": NOMBRES_FUENTES["alpha_vantage"]}
+
+async def _tipo_cambio_alpha_vantage(par, limite):
+    """CURRENCY_EXCHANGE_RATE de Alpha Vantage para un par 'EURUSD' (también cripto 'BTCUSD')"""
+    origen, destino = par[:-3], par[-3:]
+    url = f"https://www.alphavantage.co/query?function=CURRENCY_EXCHANGE_RATE&from_currency={origen}&to_currency={destino}&apikey={API_KEYS['alpha_vantage']}"
+    data = await obtener_json(url, "alpha_vantage", limite)
+    if not data or "Realtime Currency Exchange Rate" not in data:
+        return None
+    precio = float(data["Realtime Currency Exchange Rate"].get('5. Exchange Rate', 0))
+    return {"valor": precio, "cambio": None, "fuente": NOMBRES_FUENTES["alpha_vantage"]}
+
+def _cierres_yahoo(ticker):
+    """
+    Últimos cierres de Yahoo (bloqueante)
+    Un histórico vacío (Yahoo limitando o símbolo desconocido) es un fallo del proveedor: cuenta
+    para su cortacircuitos y no entra en sus percentiles como respuesta rápida.
+    """
+    hist = yf.Ticker(ticker).history(period="2d")
+    if hist.empty or 'Close' not in hist.columns:
+        raise ValueError(f"yahoo: sin cierres para {ticker}")
+    return hist['Close']
+
+async def _cotizacion_yahoo(ticker, limite):
+    """Último cierre de Yahoo y su cambio frente al anterior"""
+    cierres = await llamar("yahoo", _cierres_yahoo, ticker, limite=limite)
+    if cierres is None or len(cierres) < 2:
+        return None
+    current, previous = cierres.iloc[-1], cierres.iloc[-2]
+    return {"valor": current, "cambio": ((current - previous) / previous) * 100, "fuente": NOMBRES_FUENTES["yahoo"]}
+
+async def _tipos_currencyapi(limite):
+    """Todos los tipos de cambio contra USD de CurrencyAPI (una sola llamada)"""
+    url = f"https://api.currencyapi.com/v3/latest?apikey={API_KEYS['currency_api']}&base_currency=USD"
+    data = await obtener_json(url, "currency_api", limite)
+    return data.get("data") if data else None
+
+async def _divisa_currencyapi(tipos, codigo):
+    """Par de una divisa a partir de la respuesta compartida de CurrencyAPI"""
+    datos = await tipos()
+    if not datos or codigo not in datos:
+        return None
+    rate = datos[codigo]["value"]
+    if codigo in DIVISAS_INVERTIDAS:
+        rate = 1 / rate if rate != 0 else 0
+    return {"valor": rate, "cambio": None, "fuente": NOMBRES_FUENTES["currency_api"]}
+
+async def _tesoro_fmp(limite):
+    """Curva del Tesoro más reciente de FMP (una sola llamada)"""
+    url = f"https://financialmodelingprep.com/api/v4/treasury?apikey={API_KEYS['financial_modeling_prep']}"
+    data = await obtener_json(url, "fmp", limite)
+    return data[0] if isinstance(data, list) and len(data) > 0 else None
+
+async def _tasa_tesoro_fmp(curva, campo):
+    """Un plazo de la curva compartida de FMP"""
+    latest = await curva()
+    tasa = latest.get(campo, 0) if latest else 0
+    return {"valor": tasa, "fuente": NOMBRES_FUENTES["fmp"]} if tasa and tasa > 0 else None
+
+async def _tasa_tesoro_alpha_vantage(plazo, limite):
+    """TREASURY_YIELD mensual de Alpha Vantage"""
+    url = f"https://www.alphavantage.co/query?function=TREASURY_YIELD&interval=monthly&maturity={plazo}&apikey={API_KEYS['alpha_vantage']}"
+    data = await obtener_json(url, "alpha_vantage", limite)
+    if not data or "data" not in data or len(data["data"]) == 0:
+        return None
+    tasa = float(data["data"][0].get('value', 0))
+    return {"valor": tasa, "fuente": NOMBRES_FUENTES["alpha_vantage"]} if tasa > 0 else None
+
+async def _bono_yahoo(ticker, limite):
+    """Rendimiento de un bono en Yahoo (último cierre del índice de rendimiento)"""
+    cierres = await llamar("yahoo", _cierres_yahoo, ticker, limite=limite)
+    if cierres is None or len(cierres) == 0:
+        return None
+    yield_val = cierres.iloc[-1]
+    if not 0.1 < yield_val < 20:
+        return None
+    return {"valor": f"{yield_val:.2f}%", "fuente": NOMBRES_FUENTES["yahoo"], "categoria": "bonos"}
+
+async def _global_coingecko(limite):
+    """Métricas globales del mercado cripto de CoinGecko (una sola llamada)"""
+    data = await obtener_json("https://api.coingecko.com/api/v3/global", "coingecko", limite)
+    return data.get("data") if data else None
+
+async def _metrica_coingecko(global_cripto, metrica):
+    """Volumen, capitalización o cambio 24h a partir de la respuesta compartida de CoinGecko"""
+    market_data = await global_cripto()
+    if not market_data:
+        return None
+    if metrica == "Vol Cripto 24h":
+        total_volume = market_data.get("total_volume", {})
+        valor = f"${total_volume['usd']:,.0f}" if "usd" in total_volume else None
+    elif metrica == "Market Cap Cripto":
+        market_cap = market_data.get("total_market_cap", {})
+        valor = f"${market_cap['usd']:,.0f}" if "usd" in market_cap else None
+    else:
+        valor = f"{market_data.get('market_cap_change_percentage_24h_usd', 0):+.2f}%"
+    return {"valor": valor, "fuente": NOMBRES_FUENTES["coingecko"], "categoria": "cripto"} if valor else None
+
+# CADENAS: un activo prueba sus proveedores en orden (lanzando el siguiente en paralelo si el actual
+# tarda más que su p95); todos los activos van en paralelo
+
+def _formatear_precio(clase, nombre, precio):
+    """Formato del precio según la clase de activo"""
+    if clase == "indices":
+        return f"${precio:,.0f}" if precio > 1000 else f"${precio:.2f}"
+    if clase == "forex":
+        return f"{precio:.4f}"
+    if clase == "cripto" or nombre in ["Oro", "Plata", "Platino", "Paladio"]:
+        return f"${precio:,.2f}"
+    return f"${precio:.2f}"
+
+async def _cadena_cotizacion(clase, nombre, fuentes):
+    """Primera cotización disponible de un activo, ya formateada para la interfaz"""
+    dato = await resolver_cadena(fuentes)
+    if dato is None:
+        return None
+    return {
+        "precio": _formatear_precio(clase, nombre, dato["valor"]),
+        "cambio": "0.00%" if dato["cambio"] is None else f"{dato['cambio']:+.2f}%",
+        "valor": dato["valor"],
+        "fuente": dato["fuente"]
+    }
+
+async def _cadena_tasa(fuentes):
+    """Primera tasa disponible, con el formato de la sección de tasas"""
+    dato = await resolver_cadena(fuentes)
+    if dato is None:
+        return None
+    if not isinstance(dato["valor"], str):
+        dato = dict(dato, valor=f"{dato['valor']:.2f}%", categoria="tesoro")
+    return dato
+
+def _fuentes_cotizacion(clase, simbolos, limite, compartidas):
+    """Proveedores de un activo en orden de preferencia (solo los que tienen API key): [(proveedor, fuente)]"""
+    fuentes = []
+    if API_KEYS["currency_api"] and "currency_api" in simbolos:
+        fuentes.append(("currency_api", partial(_divisa_currencyapi, compartidas["currency_api"], simbolos["currency_api"])))
+    if API_KEYS["financial_modeling_prep"] and "fmp" in simbolos:
+        fuentes.append(("fmp", partial(_cotizacion_fmp, compartidas[("fmp", clase)], simbolos["fmp"])))
+    if API_KEYS["alpha_vantage"] and "alpha_vantage" in simbolos:
+        fuentes.append(("alpha_vantage", partial(_cotizacion_alpha_vantage, simbolos["alpha_vantage"], limite)))
+    if API_KEYS["alpha_vantage"] and "alpha_vantage_fx" in simbolos:
+        fuentes.append(("alpha_vantage", partial(_tipo_cambio_alpha_vantage, simbolos["alpha_vantage_fx"], limite)))
+    if "yahoo" in simbolos:
+        fuentes.append(("yahoo", partial(_cotizacion_yahoo, simbolos["yahoo"], limite)))
+    return fuentes
+
+def _cadenas_mercado(clases, limite):
+    """Cadena de proveedores de cada activo de las clases pedidas: {(clase, nombre): función async}"""
+    compartidas = {
+        "currency_api": compartida(partial(_tipos_currencyapi, limite)),
+        "tesoro": compartida(partial(_tesoro_fmp, limite)),
+        "coingecko": compartida(partial(_global_coingecko, limite))
+    }
+    # FMP acepta varios símbolos por llamada: una petición por clase de activo
+    for clase, activos in ACTIVOS_MERCADO.items():
+        simbolos_fmp = [simbolos["fmp"] for simbolos in activos.values() if "fmp" in simbolos]
+        compartidas[("fmp", clase)] = compartida(partial(_cotizaciones_fmp, simbolos_fmp, limite))
+    cadenas = {}
+    for clase in clases:
+        if clase != "tasas":
+            for nombre, simbolos in ACTIVOS_MERCADO[clase].items():
+                fuentes = _fuentes_cotizacion(clase, simbolos, limite, compartidas)
+                cadenas[(clase, nombre)] = partial(_cadena_cotizacion, clase, nombre, fuentes)
+            continue
+
+        for nombre, plazos in TASAS_TESORO.items():
+            fuentes = []
+            if API_KEYS["financial_modeling_prep"]:
+                fuentes.append(("fmp", partial(_tasa_tesoro_fmp, compartidas["tesoro"], plazos["fmp"])))
+            if API_KEYS["alpha_vantage"] and "alpha_vantage" in plazos:
+                fuentes.append(("alpha_vantage", partial(_tasa_tesoro_alpha_vantage, plazos["alpha_vantage"], limite)))
+            cadenas[(clase, nombre)] = partial(_cadena_tasa, fuentes)
+        for nombre, ticker in BONOS_YAHOO.items():
+            cadenas[(clase, nombre)] = partial(_cadena_tasa, [("yahoo", partial(_bono_yahoo, ticker, limite))])
+        for metrica in ["Vol Cripto 24h", "Market Cap Cripto", "Cambio MC Cripto 24h"]:
+            cadenas[(clase, metrica)] = partial(_cadena_tasa, [("coingecko", partial(_metrica_coingecko, compartidas["coingecko"], metrica))])
+    return cadenas
+
+def cargar_mercados(clases=CLASES_MERCADO, presupuesto=None):
+    """
+    Carga todos los activos de las clases pedidas en paralelo dentro del presupuesto de tiempo
+    Retorna: (dict {clase: {nombre: datos}} en el orden de las tablas, número de activos que no
+    llegaron a tiempo)
+    """
+    presupuesto = MERCADOS_CONFIG["presupuesto"] if presupuesto is None else presupuesto
+    cadenas = _cadenas_mercado(clases, time.monotonic() + presupuesto)
+    resultados, pendientes = recoger(cadenas, presupuesto)
+
+    datos = {clase: {} for clase in clases}
+    for clase, nombre in cadenas:
+        if (clase, nombre) in resultados:
+            datos[clase][nombre] = resultados[(clase, nombre)]
+    return datos, len(pendientes)
+
 @st.cache_data(ttl=300)
+def obtener_datos_mercados():
+    """Índices, divisas, cripto, materias primas y tasas en una sola carga concurrente"""
+    return cargar_mercados()
+
 def obtener_datos_indices():
     """Obtiene índices bursátiles de múltiples fuentes"""
-    indices_data = {}
-    
-    # ✅ FUENTE 1: Financial Modeling Prep (PRINCIPAL)
-    if API_KEYS["financial_modeling_prep"]:
-        try:
-            # MÁS ÍNDICES - 17 ÍNDICES GLOBALES
-            indices_fmp = {
-                "S&P 500": "^GSPC",
-                "NASDAQ": "^IXIC", 
-                "Dow Jones": "^DJI",
-                "Russell 2000": "^RUT",
-                "NYSE Composite": "^NYA",
-                "FTSE 100": "^FTSE",
-                "DAX": "^GDAXI",
-                "CAC 40": "^FCHI",
-                "Euro Stoxx 50": "^STOXX50E",
-                "IBEX 35": "^IBEX",
-                "Nikkei 225": "^N225",
-                "Hang Seng": "^HSI",
-                "Shanghai Composite": "000001.SS",
-                "S&P/TSX Composite": "^GSPTSE",
-                "ASX 200": "^AXJO",
-                "Bovespa": "^BVSP",
-                "SMI Switzerland": "^SSMI"
-            }
-            
-            for nombre, simbolo in indices_fmp.items():
-                url = f"https://financialmodelingprep.com/api/v3/quote/{simbolo}?apikey={API_KEYS['financial_modeling_prep']}"
-                response = requests.get(url, timeout=10)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data and len(data) > 0:
-                        quote = data[0]
-                        precio_actual = quote.get('price', 0)
-                        cambio_porcentaje = quote.get('changesPercentage', 0)
-                        
-                        # Formatear precio
-                        if precio_actual > 1000:
-                            precio_str = f"${precio_actual:,.0f}"
-                        else:
-                            precio_str = f"${precio_actual:.2f}"
-                        
-                        indices_data[nombre] = {
-                            "precio": precio_str,
-                            "cambio": f"{cambio_porcentaje:+.2f}%",
-                            "valor": precio_actual,
-                            "fuente": "Financial Modeling Prep"
-                        }
-                        
-        except Exception as e:
-            st.warning(f"FMP no disponible: {str(e)}")
-    
-    # ✅ FUENTE 2: Alpha Vantage (ALTERNATIVA)
-    if not indices_data and API_KEYS["alpha_vantage"]:
-        try:
-            indices_av = {
-                "S&P 500": ".INX",
-                "NASDAQ": ".IXIC",
-                "Dow Jones": ".DJI",
-                "FTSE 100": ".FTSE",
-                "DAX": ".GDAXI"
-            }
-            
-            for nombre, simbolo in indices_av.items():
-                url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={simbolo}&apikey={API_KEYS['alpha_vantage']}"
-                response = requests.get(url, timeout=10)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if "Global Quote" in data:
-                        quote = data["Global Quote"]
-                        precio_actual = float(quote.get('05. price', 0))
-                        cambio_porcentaje = float(quote.get('10. change percent', '0%').replace('%', ''))
-                        
-                        if precio_actual > 0:
-                            if precio_actual > 1000:
-                                precio_str = f"${precio_actual:,.0f}"
-                            else:
-                                precio_str = f"${precio_actual:.2f}"
-                            
-                            indices_data[nombre] = {
-                                "precio": precio_str,
-                                "cambio": f"{cambio_porcentaje:+.2f}%",
-                                "valor": precio_actual,
-                                "fuente": "Alpha Vantage"
-                            }
-                            
-        except Exception as e:
-            st.warning(f"Alpha Vantage no disponible: {str(e)}")
-    
-    # ✅ FUENTE 3: Yahoo Finance (FALLBACK)
-    if not indices_data:
-        yf_indices = {
-            "S&P 500": "^GSPC",
-            "NASDAQ": "^IXIC", 
-            "Dow Jones": "^DJI",
-            "Russell 2000": "^RUT",
-            "NYSE Composite": "^NYA",
-            "FTSE 100": "^FTSE",
-            "DAX": "^GDAXI",
-            "CAC 40": "^FCHI",
-            "Euro Stoxx 50": "^STOXX50E",
-            "IBEX 35": "^IBEX",
-            "Nikkei 225": "^N225",
-            "Hang Seng": "^HSI",
-            "Shanghai Composite": "000001.SS",
-            "S&P/TSX Composite": "^GSPTSE",
-            "ASX 200": "^AXJO",
-            "Bovespa": "^BVSP",
-            "SMI Switzerland": "^SSMI"
-        }
-        
-        for nombre, ticker in yf_indices.items():
-            try:
-                stock = yf.Ticker(ticker)
-                hist = stock.history(period="2d")
-                if not hist.empty and len(hist) >= 2:
-                    current = hist['Close'].iloc[-1]
-                    previous = hist['Close'].iloc[-2]
-                    change = ((current - previous) / previous) * 100
-                    
-                    indices_data[nombre] = {
-                        "precio": f"${current:,.0f}" if current > 1000 else f"${current:.2f}",
-                        "cambio": f"{change:+.2f}%",
-                        "valor": current,
-                        "fuente": "Yahoo Finance"
-                    }
-            except Exception as e:
-                continue
-    
-    return indices_data
+    return obtener_datos_mercados()[0]["indices"]
 
-@st.cache_data(ttl=300)
 def obtener_datos_forex():
     """Obtiene datos de divisas de múltiples fuentes"""
-    forex_data = {}
-    
-    # ✅ FUENTE 1: CurrencyAPI (ESPECIALIZADA EN FOREX)
-    if API_KEYS["currency_api"]:
-        try:
-            url = f"https://api.currencyapi.com/v3/latest?apikey={API_KEYS['currency_api']}&base_currency=USD"
-            response = requests.get(url, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if "data" in data:
-                    # MÁS PARES DE DIVISAS - 17 PARES
-                    divisas_objetivo = {
-                        "EUR": "EUR/USD",
-                        "JPY": "USD/JPY", 
-                        "GBP": "GBP/USD",
-                        "CHF": "USD/CHF",
-                        "CAD": "USD/CAD",
-                        "AUD": "AUD/USD",
-                        "NZD": "NZD/USD",
-                        "CNY": "USD/CNY",
-                        "HKD": "USD/HKD",
-                        "SGD": "USD/SGD",
-                        "SEK": "USD/SEK",
-                        "NOK": "USD/NOK",
-                        "MXN": "USD/MXN",
-                        "INR": "USD/INR",
-                        "BRL": "USD/BRL",
-                        "ZAR": "USD/ZAR",
-                        "RUB": "USD/RUB"
-                    }
-                    
-                    for currency_code, par_nombre in divisas_objetivo.items():
-                        if currency_code in data["data"]:
-                            rate_data = data["data"][currency_code]
-                            rate = rate_data["value"]
-                            
-                            if currency_code in ["EUR", "GBP", "AUD", "NZD"]:
-                                precio_formateado = f"{1/rate:.4f}" if rate != 0 else "0.0000"
-                                forex_data[par_nombre] = {
-                                    "precio": precio_formateado,
-                                    "cambio": "0.00%",  # CurrencyAPI no proporciona cambios
-                                    "valor": 1/rate if rate != 0 else 0,
-                                    "fuente": "CurrencyAPI"
-                                }
-                            else:
-                                precio_formateado = f"{rate:.4f}"
-                                forex_data[par_nombre] = {
-                                    "precio": precio_formateado,
-                                    "cambio": "0.00%",
-                                    "valor": rate,
-                                    "fuente": "CurrencyAPI"
-                                }
-        except Exception as e:
-            st.warning(f"CurrencyAPI no disponible: {str(e)}")
-    
-    # ✅ FUENTE 2: Financial Modeling Prep
-    if not forex_data and API_KEYS["financial_modeling_prep"]:
-        try:
-            # MÁS PARES FOREX
-            pares_forex = [
-                "EURUSD", "USDJPY", "GBPUSD", "USDCHF", "USDCAD", 
-                "AUDUSD", "NZDUSD", "USDCNY", "USDHKD", "USDSGD",
-                "USDSEK", "USDNOK", "USDMXN", "USDINR", "USDBRL",
-                "USDZAR", "USDRUB"
-            ]
-            nombres_pares = {
-                "EURUSD": "EUR/USD",
-                "USDJPY": "USD/JPY",
-                "GBPUSD": "GBP/USD", 
-                "USDCHF": "USD/CHF",
-                "USDCAD": "USD/CAD",
-                "AUDUSD": "AUD/USD",
-                "NZDUSD": "NZD/USD",
-                "USDCNY": "USD/CNY",
-                "USDHKD": "USD/HKD",
-                "USDSGD": "USD/SGD",
-                "USDSEK": "USD/SEK",
-                "USDNOK": "USD/NOK",
-                "USDMXN": "USD/MXN",
-                "USDINR": "USD/INR",
-                "USDBRL": "USD/BRL",
-                "USDZAR": "USD/ZAR",
-                "USDRUB": "USD/RUB"
-            }
-            
-            for par in pares_forex:
-                url = f"https://financialmodelingprep.com/api/v3/quote/{par}?apikey={API_KEYS['financial_modeling_prep']}"
-                response = requests.get(url, timeout=10)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data and len(data) > 0:
-                        quote = data[0]
-                        precio = quote.get('price', 0)
-                        cambio_porcentaje = quote.get('changesPercentage', 0)
-                        
-                        nombre_par = nombres_pares.get(par, par)
-                        forex_data[nombre_par] = {
-                            "precio": f"{precio:.4f}",
-                            "cambio": f"{cambio_porcentaje:+.2f}%",
-                            "valor": precio,
-                            "fuente": "Financial Modeling Prep"
-                        }
-        except Exception as e:
-            st.warning(f"FMP Forex no disponible: {str(e)}")
-    
-    # ✅ FUENTE 3: Alpha Vantage
-    if not forex_data and API_KEYS["alpha_vantage"]:
-        try:
-            pares_av = {
-                "EUR/USD": "EURUSD",
-                "USD/JPY": "USDJPY", 
-                "GBP/USD": "GBPUSD",
-                "USD/CHF": "USDCHF",
-                "AUD/USD": "AUDUSD"
-            }
-            
-            for par_nombre, simbolo in pares_av.items():
-                url = f"https://www.alphavantage.co/query?function=CURRENCY_EXCHANGE_RATE&from_currency={simbolo[:3]}&to_currency={simbolo[3:]}&apikey={API_KEYS['alpha_vantage']}"
-                response = requests.get(url, timeout=10)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if "Realtime Currency Exchange Rate" in data:
-                        rate_data = data["Realtime Currency Exchange Rate"]
-                        precio = float(rate_data.get('5. Exchange Rate', 0))
-                        
-                        forex_data[par_nombre] = {
-                            "precio": f"{precio:.4f}",
-                            "cambio": "0.00%",  # Alpha Vantage no da cambios en esta API
-                            "valor": precio,
-                            "fuente": "Alpha Vantage"
-                        }
-        except Exception as e:
-            st.warning(f"Alpha Vantage Forex no disponible: {str(e)}")
-    
-    # ✅ FUENTE 4: Yahoo Finance (ÚLTIMO RECURSO)
-    if not forex_data:
-        yf_forex = {
-            "EUR/USD": "EURUSD=X",
-            "USD/JPY": "JPY=X",
-            "GBP/USD": "GBPUSD=X",
-            "USD/CHF": "CHF=X",
-            "USD/CAD": "CAD=X",
-            "AUD/USD": "AUDUSD=X",
-            "NZD/USD": "NZDUSD=X",
-            "USD/CNY": "CNY=X",
-            "USD/HKD": "HKD=X",
-            "USD/SGD": "SGD=X",
-            "USD/SEK": "SEK=X",
-            "USD/NOK": "NOK=X",
-            "USD/MXN": "MXN=X",
-            "USD/INR": "INR=X",
-            "USD/BRL": "BRL=X",
-            "USD/ZAR": "ZAR=X",
-            "USD/RUB": "RUB=X"
-        }
-        
-        for par, ticker in yf_forex.items():
-            try:
-                fx = yf.Ticker(ticker)
-                hist = fx.history(period="2d")
-                if not hist.empty and len(hist) >= 2:
-                    current = hist['Close'].iloc[-1]
-                    previous = hist['Close'].iloc[-2]
-                    change = ((current - previous) / previous) * 100
-                    
-                    forex_data[par] = {
-                        "precio": f"{current:.4f}",
-                        "cambio": f"{change:+.2f}%",
-                        "valor": current,
-                        "fuente": "Yahoo Finance"
-                    }
-            except Exception as e:
-                continue
-    
-    return forex_data
+    return obtener_datos_mercados()[0]["forex"]
 
-@st.cache_data(ttl=300)
 def obtener_datos_cripto():
     """Obtiene datos de criptomonedas de múltiples fuentes"""
-    crypto_data = {}
-    
-    # ✅ FUENTE 1: Financial Modeling Prep
-    if API_KEYS["financial_modeling_prep"]:
-        try:
-            # MÁS CRIPTOMONEDAS - 17 CRIPTOS
-            criptos_fmp = {
-                "Bitcoin": "BTCUSD",
-                "Ethereum": "ETHUSD",
-                "BNB": "BNBUSD",
-                "XRP": "XRPUSD",
-                "Cardano": "ADAUSD",
-                "Solana": "SOLUSD",
-                "Dogecoin": "DOGEUSD",
-                "Polkadot": "DOTUSD",
-                "Litecoin": "LTCUSD",
-                "Chainlink": "LINKUSD",
-                "Bitcoin Cash": "BCHUSD",
-                "Avalanche": "AVAXUSD",
-                "Polygon": "MATICUSD",
-                "Stellar": "XLMUSD",
-                "Uniswap": "UNIUSD",
-                "Shiba Inu": "SHIBUSD",
-                "Tron": "TRXUSD"
-            }
-            
-            for nombre, simbolo in criptos_fmp.items():
-                url = f"https://financialmodelingprep.com/api/v3/quote/{simbolo}?apikey={API_KEYS['financial_modeling_prep']}"
-                response = requests.get(url, timeout=10)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data and len(data) > 0:
-                        quote = data[0]
-                        precio = quote.get('price', 0)
-                        cambio_porcentaje = quote.get('changesPercentage', 0)
-                        
-                        crypto_data[nombre] = {
-                            "precio": f"${precio:,.2f}",
-                            "cambio": f"{cambio_porcentaje:+.2f}%",
-                            "valor": precio,
-                            "fuente": "Financial Modeling Prep"
-                        }
-        except Exception as e:
-            st.warning(f"FMP Crypto no disponible: {str(e)}")
-    
-    # ✅ FUENTE 2: Alpha Vantage
-    if not crypto_data and API_KEYS["alpha_vantage"]:
-        try:
-            criptos_av = {
-                "Bitcoin": "BTC",
-                "Ethereum": "ETH",
-                "Litecoin": "LTC",
-                "Ripple": "XRP",
-                "Cardano": "ADA"
-            }
-            
-            for nombre, simbolo in criptos_av.items():
-                url = f"https://www.alphavantage.co/query?function=CURRENCY_EXCHANGE_RATE&from_currency={simbolo}&to_currency=USD&apikey={API_KEYS['alpha_vantage']}"
-                response = requests.get(url, timeout=10)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if "Realtime Currency Exchange Rate" in data:
-                        rate_data = data["Realtime Currency Exchange Rate"]
-                        precio = float(rate_data.get('5. Exchange Rate', 0))
-                        
-                        crypto_data[nombre] = {
-                            "precio": f"${precio:,.2f}",
-                            "cambio": "0.00%",
-                            "valor": precio,
-                            "fuente": "Alpha Vantage"
-                        }
-        except Exception as e:
-            st.warning(f"Alpha Vantage Crypto no disponible: {str(e)}")
-    
-    # ✅ FUENTE 3: Yahoo Finance
-    if not crypto_data:
-        yf_crypto = {
-            "Bitcoin": "BTC-USD",
-            "Ethereum": "ETH-USD",
-            "BNB": "BNB-USD",
-            "XRP": "XRP-USD",
-            "Cardano": "ADA-USD",
-            "Solana": "SOL-USD",
-            "Dogecoin": "DOGE-USD",
-            "Polkadot": "DOT-USD",
-            "Litecoin": "LTC-USD",
-            "Chainlink": "LINK-USD",
-            "Bitcoin Cash": "BCH-USD",
-            "Avalanche": "AVAX-USD",
-            "Polygon": "MATIC-USD",
-            "Stellar": "XLM-USD",
-            "Uniswap": "UNI-USD",
-            "Shiba Inu": "SHIB-USD",
-            "Tron": "TRX-USD"
-        }
-        
-        for nombre, ticker in yf_crypto.items():
-            try:
-                crypto = yf.Ticker(ticker)
-                hist = crypto.history(period="2d")
-                if not hist.empty and len(hist) >= 2:
-                    current = hist['Close'].iloc[-1]
-                    previous = hist['Close'].iloc[-2]
-                    change = ((current - previous) / previous) * 100
-                    
-                    crypto_data[nombre] = {
-                        "precio": f"${current:,.2f}",
-                        "cambio": f"{change:+.2f}%",
-                        "valor": current,
-                        "fuente": "Yahoo Finance"
-                    }
-            except Exception as e:
-                continue
-    
-    return crypto_data
+    return obtener_datos_mercados()[0]["cripto"]
 
-@st.cache_data(ttl=300)
 def obtener_datos_commodities():
     """Obtiene datos de materias primas de múltiples fuentes"""
-    commodities_data = {}
-    
-    # ✅ FUENTE 1: Financial Modeling Prep (PRINCIPAL)
-    if API_KEYS["financial_modeling_prep"]:
-        try:
-            # MÁS COMMODITIES - 17 PRODUCTOS
-            commodities_fmp = {
-                "Petróleo WTI": "CLUSD",
-                "Petróleo Brent": "BZUSD", 
-                "Oro": "GCUSD",
-                "Plata": "SIUSD",
-                "Cobre": "HGUSD",
-                "Gas Natural": "NGUSD",
-                "Platino": "PLUSD",
-                "Paladio": "PAUSD",
-                "Aluminio": "ALIUSD",
-                "Trigo": "ZWUSD",
-                "Maíz": "ZCUSD",
-                "Soja": "ZSUSD",
-                "Azúcar": "SBUSD",
-                "Café": "KCUSD",
-                "Cacao": "CCUSD",
-                "Algodón": "CTUSD",
-                "Ganado": "LEUSD"
-            }
-            
-            for nombre, simbolo in commodities_fmp.items():
-                url = f"https://financialmodelingprep.com/api/v3/quote/{simbolo}?apikey={API_KEYS['financial_modeling_prep']}"
-                response = requests.get(url, timeout=10)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data and len(data) > 0:
-                        quote = data[0]
-                        precio = quote.get('price', 0)
-                        cambio_porcentaje = quote.get('changesPercentage', 0)
-                        
-                        if nombre in ["Oro", "Plata", "Platino", "Paladio"]:
-                            precio_str = f"${precio:,.2f}"
-                        elif nombre in ["Petróleo WTI", "Petróleo Brent", "Gas Natural"]:
-                            precio_str = f"${precio:.2f}"
-                        elif nombre in ["Trigo", "Maíz", "Soja", "Azúcar", "Café", "Cacao", "Algodón"]:
-                            precio_str = f"${precio:.2f}"  # Commodities agrícolas
-                        else:
-                            precio_str = f"${precio:.2f}"
-                        
-                        commodities_data[nombre] = {
-                            "precio": precio_str,
-                            "cambio": f"{cambio_porcentaje:+.2f}%",
-                            "valor": precio,
-                            "fuente": "Financial Modeling Prep"
-                        }
-        except Exception as e:
-            st.warning(f"FMP Commodities no disponible: {str(e)}")
-    
-    # ✅ FUENTE 2: Alpha Vantage
-    if not commodities_data and API_KEYS["alpha_vantage"]:
-        try:
-            commodities_av = {
-                "Oro": "GCUSD",
-                "Petróleo WTI": "CLUSD",
-                "Plata": "SIUSD",
-                "Cobre": "HGUSD"
-            }
-            
-            for nombre, simbolo in commodities_av.items():
-                url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={simbolo}&apikey={API_KEYS['alpha_vantage']}"
-                response = requests.get(url, timeout=10)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if "Global Quote" in data:
-                        quote = data["Global Quote"]
-                        precio_actual = float(quote.get('05. price', 0))
-                        cambio_porcentaje = float(quote.get('10. change percent', '0%').replace('%', ''))
-                        
-                        if precio_actual > 0:
-                            if nombre in ["Oro", "Plata"]:
-                                precio_str = f"${precio_actual:,.2f}"
-                            else:
-                                precio_str = f"${precio_actual:.2f}"
-                            
-                            commodities_data[nombre] = {
-                                "precio": precio_str,
-                                "cambio": f"{cambio_porcentaje:+.2f}%",
-                                "valor": precio_actual,
-                                "fuente": "Alpha Vantage"
-                            }
-        except Exception as e:
-            st.warning(f"Alpha Vantage Commodities no disponible: {str(e)}")
-    
-    # ✅ FUENTE 3: Yahoo Finance (FALLBACK)
-    if not commodities_data:
-        yf_commodities = {
-            "Petróleo WTI": "CL=F",
-            "Petróleo Brent": "BZ=F", 
-            "Oro": "GC=F",
-            "Plata": "SI=F",
-            "Cobre": "HG=F",
-            "Gas Natural": "NG=F",
-            "Platino": "PL=F",
-            "Paladio": "PA=F",
-            "Aluminio": "ALI=F",
-            "Trigo": "ZW=F",
-            "Maíz": "ZC=F",
-            "Soja": "ZS=F",
-            "Azúcar": "SB=F",
-            "Café": "KC=F",
-            "Cacao": "CC=F",
-            "Algodón": "CT=F",
-            "Ganado": "LE=F"
-        }
-        
-        for nombre, ticker in yf_commodities.items():
-            try:
-                comm = yf.Ticker(ticker)
-                hist = comm.history(period="2d")
-                if not hist.empty and len(hist) >= 2:
-                    current = hist['Close'].iloc[-1]
-                    previous = hist['Close'].iloc[-2]
-                    change = ((current - previous) / previous) * 100
-                    
-                    if nombre in ["Oro", "Plata", "Platino", "Paladio"]:
-                        precio_str = f"${current:,.2f}"
-                    elif nombre in ["Petróleo WTI", "Petróleo Brent", "Gas Natural"]:
-                        precio_str = f"${current:.2f}"
-                    elif nombre in ["Trigo", "Maíz", "Soja", "Azúcar", "Café", "Cacao", "Algodón"]:
-                        precio_str = f"${current:.2f}"
-                    else:
-                        precio_str = f"${current:.2f}"
-                    
-                    commodities_data[nombre] = {
-                        "precio": precio_str,
-                        "cambio": f"{change:+.2f}%",
-                        "valor": current,
-                        "fuente": "Yahoo Finance"
-                    }
-            except Exception as e:
-                continue
-    
-    return commodities_data
+    return obtener_datos_mercados()[0]["commodities"]
 
-@st.cache_data(ttl=3600)
 def obtener_datos_tasas_reales():
     """Obtiene tasas de interés REALES de múltiples fuentes"""
-    tasas_data = {}
-    
-    try:
-        # ✅ FUENTE PRINCIPAL: FMP para tasas del Tesoro
-        if API_KEYS["financial_modeling_prep"]:
-            try:
-                # Obtener tasas del Tesoro de FMP
-                url = f"https://financialmodelingprep.com/api/v4/treasury?apikey={API_KEYS['financial_modeling_prep']}"
-                response = requests.get(url, timeout=10)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data and len(data) > 0:
-                        # Tomar la entrada más reciente
-                        latest = data[0]
-                        date = latest.get('date', '')
-                        
-                        # MÁS TASAS - 13 PLAZOS DIFERENTES
-                        tasas_mapping = {
-                            'month1': 'Tesoro USA 1 mes',
-                            'month2': 'Tesoro USA 2 meses', 
-                            'month3': 'Tesoro USA 3 meses',
-                            'month6': 'Tesoro USA 6 meses',
-                            'year1': 'Tesoro USA 1 año',
-                            'year2': 'Tesoro USA 2 años',
-                            'year3': 'Tesoro USA 3 años',
-                            'year5': 'Tesoro USA 5 años',
-                            'year7': 'Tesoro USA 7 años',
-                            'year10': 'Tesoro USA 10 años',
-                            'year20': 'Tesoro USA 20 años',
-                            'year30': 'Tesoro USA 30 años'
-                        }
-                        
-                        for key, nombre in tasas_mapping.items():
-                            tasa = latest.get(key, 0)
-                            if tasa and tasa > 0:
-                                tasas_data[nombre] = {
-                                    "valor": f"{tasa:.2f}%",
-                                    "fuente": "Financial Modeling Prep",
-                                    "categoria": "tesoro"
-                                }
-            except Exception as e:
-                st.warning(f"FMP Tasas no disponible: {str(e)}")
-
-        # ✅ FUENTE 2: Alpha Vantage para tasas
-        if not tasas_data and API_KEYS["alpha_vantage"]:
-            try:
-                # Alpha Vantage para datos macroeconómicos
-                tasas_av = {
-                    "Tesoro USA 10 años": "10year",
-                    "Tesoro USA 5 años": "5year", 
-                    "Tesoro USA 2 años": "2year"
-                }
-                
-                for nombre, plazo in tasas_av.items():
-                    url = f"https://www.alphavantage.co/query?function=TREASURY_YIELD&interval=monthly&maturity={plazo}&apikey={API_KEYS['alpha_vantage']}"
-                    response = requests.get(url, timeout=10)
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        if "data" in data and len(data["data"]) > 0:
-                            latest_yield = data["data"][0]
-                            tasa = float(latest_yield.get('value', 0))
-                            
-                            if tasa > 0:
-                                tasas_data[nombre] = {
-                                    "valor": f"{tasa:.2f}%",
-                                    "fuente": "Alpha Vantage",
-                                    "categoria": "tesoro"
-                                }
-            except Exception as e:
-                st.warning(f"Alpha Vantage Tasas no disponible: {str(e)}")
-
-        # ✅ FUENTE 3: Yahoo Finance para bonos gubernamentales (fallback)
-        bonos_yahoo = {
-            "USA 2 años": "^IRX",
-            "USA 10 años": "^TNX", 
-            "USA 30 años": "^TYX",
-            "USA 5 años": "^FVX",
-            "USA 13 semanas": "^IRX"
-        }
-        
-        for nombre, ticker in bonos_yahoo.items():
-            try:
-                bono = yf.Ticker(ticker)
-                hist = bono.history(period="2d")
-                if not hist.empty:
-                    yield_val = hist['Close'].iloc[-1]
-                    if 0.1 < yield_val < 20:
-                        tasas_data[nombre] = {
-                            "valor": f"{yield_val:.2f}%",
-                            "fuente": "Yahoo Finance",
-                            "categoria": "bonos"
-                        }
-            except Exception as e:
-                continue
-
-        # ✅ FUENTE 4: CoinGecko para métricas cripto
-        try:
-            url = "https://api.coingecko.com/api/v3/global"
-            response = requests.get(url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if "data" in data:
-                    market_data = data["data"]
-                    total_volume = market_data.get("total_volume", {})
-                    market_cap = market_data.get("total_market_cap", {})
-                    market_cap_change = market_data.get("market_cap_change_percentage_24h_usd", 0)
-                    
-                    if "usd" in total_volume:
-                        vol_str = f"${total_volume['usd']:,.0f}"
-                        tasas_data["Vol Cripto 24h"] = {
-                            "valor": vol_str,
-                            "fuente": "CoinGecko", 
-                            "categoria": "cripto"
-                        }
-                    
-                    if "usd" in market_cap:
-                        cap_str = f"${market_cap['usd']:,.0f}"
-                        tasas_data["Market Cap Cripto"] = {
-                            "valor": cap_str,
-                            "fuente": "CoinGecko",
-                            "categoria": "cripto"
-                        }
-                    
-                    tasas_data["Cambio MC Cripto 24h"] = {
-                        "valor": f"{market_cap_change:+.2f}%",
-                        "fuente": "CoinGecko",
-                        "categoria": "cripto"
-                    }
-        except Exception as e:
-            pass
-
-    except Exception as e:
-        st.error(f"Error obteniendo tasas: {str(e)}")
-    
-    return tasas_data
+    return obtener_datos_mercados()[0]["tasas"]
 
 # FUNCIÓN DE ANÁLISIS CON GEMINI (TU API GOOGLE)
 @st.cache_data(ttl=1800)
@@ -824,13 +479,21 @@ def mostrar(datos_accion):
     
     # OBTENER TODOS LOS DATOS
     with st.spinner('🔄 Conectando con fuentes de datos globales...'):
-        indices = obtener_datos_indices()
-        forex = obtener_datos_forex()
-        crypto = obtener_datos_cripto()
-        commodities = obtener_datos_commodities()
-        tasas = obtener_datos_tasas_reales()
+        mercados, sin_respuesta = obtener_datos_mercados()
+        if sin_respuesta:
+            # Carga parcial: no se conserva en caché para completarla en la siguiente visita
+            obtener_datos_mercados.clear()
+        indices = mercados["indices"]
+        forex = mercados["forex"]
+        crypto = mercados["cripto"]
+        commodities = mercados["commodities"]
+        tasas = mercados["tasas"]
         analisis = obtener_analisis_completo(indices, forex, crypto, commodities, tasas)
 
+    if sin_respuesta:
+        st.caption(f"⏱️ {sin_respuesta} activos no respondieron en {MERCADOS_CONFIG['presupuesto']:.0f} s; "
+                   "se muestran los datos recibidos.")
+
     # DISEÑO DE LA INTERFAZ
     st.markdown("### 🤖 Análisis de Mercados en Tiempo Real")
     with st.container():
@@ -1034,6 +697,20 @@ def mostrar(datos_accion):
             st.cache_data.clear()
             st.rerun()
 
+    with st.expander("🩺 Estado de los proveedores"):
+        estado = estado_proveedores()
+        if estado:
+            tabla_estado = pd.DataFrame.from_dict(estado, orient="index")
+            tabla_estado.index = [NOMBRES_FUENTES.get(proveedor, proveedor) for proveedor in tabla_estado.index]
+            for percentil in ["p50", "p95"]:
+                tabla_estado[percentil] = tabla_estado[percentil].map(lambda s: f"{s:.2f} s" if pd.notna(s) else "—")
+            st.dataframe(tabla_estado, use_container_width=True)
+            st.caption("Con el circuito abierto las llamadas a ese proveedor se descartan sin esperar "
+                       "y la cadena pasa al siguiente; si un proveedor tarda más que su p95 se consulta "
+                       "también el siguiente en paralelo.")
+        else:
+            st.info("Aún no se ha consultado ningún proveedor en esta sesión del servidor.")
+
 # Función para ejecutar la sección
 def run():
     mostrar(datos_accion=None)
@@ -7,6 +7,26 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import time
 import random
+from utils.almacen_precios import obtener_precios
+from utils.instantaneas import (
+    registrar_instantanea, obtener_instantanea, invalidar_instantanea, estado_instantanea,
+    reconstruir_instantanea
+)
+from utils.actualizador import registrar_tarea
+from utils.tabla_screener import (
+    construir_tabla_screener, construir_indices_screener, filtrar_tabla_screener
+)
+from utils.config import CACHE_CONFIG
+from utils.scoring import puntuar_registro, puntuar_registros, PERFIL_DINAMICO
+from utils.technical_analysis import ultimos_indicadores_panel
+from utils.risk_analysis import tabla_riesgo_universo
+from utils.data_fetcher import descargar_precios_lote, obtener_info_lote, consultar_info_yahoo
+
+# Índice de referencia para beta y métricas de riesgo del universo
+INDICE_MERCADO = '^GSPC'
+
+# Métricas de riesgo del universo que se guardan en cada acción y se pueden filtrar
+CAMPOS_RIESGO_SCREENER = ['Sharpe Ratio', 'Drawdown Máximo']
 
 # LISTA COMPLETA DEL S&P 500 (actualizada 2024)
 SP500_SYMBOLS = [
@@ -88,71 +108,149 @@ def obtener_lista_sp500_estatica():
     """Lista estática del S&P500 que cambia poco"""
     return SP500_SYMBOLS
 
-@st.cache_data(ttl=3600, show_spinner=False, max_entries=50)
 def obtener_datos_sp500_precalculados():
-    """Precalcula datos del S&P500 una vez por hora"""
+    """Datos precalculados del S&P500 (instantánea compartida, se renueva cada hora)"""
     return precalcular_datos_screener(SP500_SYMBOLS)
 
-def precalcular_datos_screener(sp500_symbols):
-    """Precalcula datos críticos para mayor velocidad"""
-    if 'datos_precalculados' in st.session_state:
-        return st.session_state.datos_precalculados
-    
+def construir_universo_screener(progreso=None):
+    """
+    Construye el universo del screener: precios, fundamentales y scoring de cada acción
+    No usa la interfaz de Streamlit; `progreso(fraccion, texto)` permite mostrar el avance.
+    """
     datos_precalculados = {}
     # Limitar a las primeras 300 acciones para mayor velocidad
-    simbolos_rapidos = sp500_symbols[:520]
+    simbolos_rapidos = SP500_SYMBOLS[:520]
+    
+    # Precios de todo el universo en pocas descargas múltiples
+    if progreso:
+        progreso(0.0, f"Descargando precios de {len(simbolos_rapidos)} acciones...")
+    panel_precios, errores_precios = descargar_precios_lote(simbolos_rapidos + [INDICE_MERCADO], periodo="6mo")
+    indicadores = _indicadores_universo(panel_precios)
+    riesgo = _riesgo_universo(panel_precios)
     
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+    # Datos fundamentales en paralelo, al ritmo que permite el limitador de Yahoo
+    def _actualizar_progreso(completados, total):
+        if progreso and (completados % 10 == 0 or completados == total):
+            progreso(completados / total, f"Precalculando: {completados}/{total} acciones")
     
-    for i, simbolo in enumerate(simbolos_rapidos):
+    infos, _ = obtener_info_lote(simbolos_rapidos, progreso=_actualizar_progreso)
+    
+    for simbolo in simbolos_rapidos:
         try:
-            datos = obtener_datos_completos_yfinance(simbolo)
+            if simbolo not in infos:
+                continue
+            datos = obtener_datos_completos_yfinance(
+                simbolo, info=infos[simbolo],
+                indicadores=indicadores.loc[simbolo] if simbolo in indicadores.index else {}
+            )
             if datos and datos.get('Empresa Valida'):
-                scoring = calcular_scoring_dinamico(datos)
-                datos['Score'] = scoring
+                datos.update(_riesgo_simbolo(riesgo, simbolo))
                 datos_precalculados[simbolo] = datos
                 
-            # Actualizar progreso cada 10 acciones
-            if i % 10 == 0:
-                progress_percent = (i + 1) / len(simbolos_rapidos)
-                progress_bar.progress(progress_percent)
-                status_text.text(f"Precalculando: {i+1}/{len(simbolos_rapidos)} acciones")
-                
         except Exception as e:
             continue
     
-    progress_bar.empty()
-    status_text.empty()
+    # Scoring de todo el universo en una sola llamada
+    scores, _ = puntuar_registros(list(datos_precalculados.values()), PERFIL_DINAMICO)
+    for datos, score in zip(datos_precalculados.values(), scores):
+        datos['Score'] = int(score)
     
-    st.session_state.datos_precalculados = datos_precalculados
-    return datos_precalculados
+    tabla = construir_tabla_screener(datos_precalculados)
+    return {
+        'acciones': datos_precalculados,
+        'tabla': tabla,
+        'indices': construir_indices_screener(tabla),
+        'riesgo': riesgo,
+        'sin_precios': sorted(errores_precios)
+    }
+
+def recalcular_scores_screener(actual, progreso=None):
+    """
+    Actualiza RSI, métricas de riesgo y Score del universo con los precios del almacén, sin volver
+    a pedir fundamentales
+    Crea diccionarios nuevos: la instantánea anterior sigue intacta para quien la esté leyendo.
+    """
+    simbolos = list(actual['acciones'].keys())
+    panel_precios, _ = descargar_precios_lote(simbolos + [INDICE_MERCADO], periodo="6mo")
+    indicadores = _indicadores_universo(panel_precios)
+    riesgo = _riesgo_universo(panel_precios)
+    
+    acciones = {}
+    for simbolo, datos in actual['acciones'].items():
+        datos = dict(datos)
+        if simbolo in indicadores.index:
+            datos['RSI'] = _rsi_o_neutral(indicadores.loc[simbolo])
+            datos['Tendencia'] = indicadores.loc[simbolo, 'Tendencia']
+        datos.update(_riesgo_simbolo(riesgo, simbolo))
+        acciones[simbolo] = datos
+    
+    scores, _ = puntuar_registros(list(acciones.values()), PERFIL_DINAMICO)
+    for datos, score in zip(acciones.values(), scores):
+        datos['Score'] = int(score)
+    
+    tabla = construir_tabla_screener(acciones)
+    return dict(actual, acciones=acciones, tabla=tabla, indices=construir_indices_screener(tabla), riesgo=riesgo)
+
+registrar_instantanea("screener", construir_universo_screener, CACHE_CONFIG["datos_fundamentales"])
+
+# Tareas del actualizador en segundo plano: precios, fundamentales y scores con cadencias propias
+registrar_tarea("screener_precios",
+                lambda: descargar_precios_lote(SP500_SYMBOLS[:520] + [INDICE_MERCADO], periodo="6mo"),
+                CACHE_CONFIG["datos_precios"])
+registrar_tarea("screener_fundamentales",
+                lambda: reconstruir_instantanea("screener"),
+                CACHE_CONFIG["datos_fundamentales"])
+registrar_tarea("screener_scores",
+                lambda: reconstruir_instantanea("screener", recalcular_scores_screener),
+                CACHE_CONFIG["scoring"], inmediata=False)
 
-def obtener_datos_completos_yfinance(simbolo):
-    """Obtiene datos fundamentales y técnicos de yFinance para cualquier símbolo"""
+def precalcular_datos_screener(sp500_symbols):
+    """
+    Precalcula datos críticos para mayor velocidad
+    El universo es una instantánea compartida entre sesiones: solo la primera petición
+    del proceso espera a que se construya.
+    """
+    if not estado_instantanea("screener")["disponible"]:
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+        
+        def _mostrar_progreso(fraccion, texto):
+            progress_bar.progress(fraccion)
+            status_text.text(texto)
+        
+        instantanea = obtener_instantanea("screener", progreso=_mostrar_progreso)
+        progress_bar.empty()
+        status_text.empty()
+    else:
+        instantanea = obtener_instantanea("screener")
+    
+    if not instantanea:
+        return {}
+    
+    if instantanea['sin_precios']:
+        st.caption(f"⚠️ Sin precios para {len(instantanea['sin_precios'])} símbolos: {', '.join(instantanea['sin_precios'])}")
+    
+    return instantanea['acciones']
+
+def obtener_datos_completos_yfinance(simbolo, datos_historicos=None, info=None, indicadores=None):
+    """
+    Obtiene datos fundamentales y técnicos de yFinance para cualquier símbolo
+    `indicadores` son los últimos valores del símbolo calculados sobre el panel de todo el universo.
+    """
     try:
-        ticker = yf.Ticker(simbolo)
-        info = ticker.info
+        if info is None:
+            info = consultar_info_yahoo(simbolo)
         
         # Verificar que el símbolo es válido
         if not info or 'currentPrice' not in info or info.get('currentPrice') is None:
             return None
         
-        # Obtener datos históricos para calcular RSI
-        datos_historicos = yf.download(simbolo, period="6mo", interval="1d", progress=False)
-        
-        # Calcular RSI si hay datos históricos
-        rsi = 50
-        if not datos_historicos.empty and 'Close' in datos_historicos.columns:
-            try:
-                delta = datos_historicos['Close'].diff()
-                gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-                loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-                rs = gain / loss
-                rsi_calculado = 100 - (100 / (1 + rs))
-                rsi = rsi_calculado.iloc[-1] if not rsi_calculado.empty and not pd.isna(rsi_calculado.iloc[-1]) else 50
-            except:
-                rsi = 50
+        # Indicadores técnicos (si no vienen ya calculados para todo el universo)
+        if indicadores is None:
+            if datos_historicos is None:
+                datos_historicos = obtener_precios(simbolo, periodo="6mo", intervalo="1d")
+            indicadores = _indicadores_actuales(datos_historicos)
+        rsi = _rsi_o_neutral(indicadores)
         
         # Datos completos
         datos = {
@@ -171,6 +269,7 @@ def obtener_datos_completos_yfinance(simbolo):
             'Crecimiento Ingresos': info.get('revenueGrowth', 0),
             'Beta': info.get('beta', 1),
             'RSI': rsi,
+            'Tendencia': indicadores.get('Tendencia', 'N/A'),
             'Empresa Valida': True
         }
         
@@ -179,161 +278,67 @@ def obtener_datos_completos_yfinance(simbolo):
     except Exception as e:
         return None
 
-def calcular_scoring_dinamico(datos):
-    """Calcula scoring basado en datos fundamentales"""
-    if not datos:
-        return 0
-    
-    score = 0
-    max_score = 100
-    
+def _indicadores_universo(panel_precios):
+    """Últimos indicadores técnicos de todos los símbolos del panel en una sola pasada"""
+    if panel_precios is None or panel_precios.empty or 'Close' not in panel_precios.columns.get_level_values(0):
+        return pd.DataFrame()
     try:
-        # P/E Ratio (20 puntos) - MÁS FLEXIBLE
-        pe = datos.get('P/E', 0)
-        if pe and pe > 0:
-            if pe < 15:
-                score += 20
-            elif pe < 25:
-                score += 15
-            elif pe < 35:
-                score += 10
-            else:
-                score += 5
-        
-        # ROE (20 puntos) - MÁS FLEXIBLE
-        roe = datos.get('ROE', 0)
-        if roe and roe > 0:
-            if roe > 0.20:
-                score += 20
-            elif roe > 0.15:
-                score += 16
-            elif roe > 0.10:
-                score += 12
-            elif roe > 0.05:
-                score += 8
-            else:
-                score += 4
-        
-        # Margen Beneficio (15 puntos) - MÁS FLEXIBLE
-        margen = datos.get('Margen Beneficio', 0)
-        if margen and margen > 0:
-            if margen > 0.20:
-                score += 15
-            elif margen > 0.15:
-                score += 12
-            elif margen > 0.10:
-                score += 9
-            elif margen > 0.05:
-                score += 6
-            else:
-                score += 3
-        
-        # Deuda/Equity (15 puntos) - MÁS FLEXIBLE
-        deuda_eq = datos.get('Deuda/Equity', 0)
-        if deuda_eq and deuda_eq >= 0:
-            if deuda_eq < 0.5:
-                score += 15
-            elif deuda_eq < 1.0:
-                score += 12
-            elif deuda_eq < 1.5:
-                score += 9
-            elif deuda_eq < 2.0:
-                score += 6
-            else:
-                score += 3
-        
-        # Crecimiento Ingresos (20 puntos) - MÁS FLEXIBLE
-        crecimiento = datos.get('Crecimiento Ingresos', 0)
-        if crecimiento:
-            if crecimiento > 0.20:
-                score += 20
-            elif crecimiento > 0.15:
-                score += 16
-            elif crecimiento > 0.10:
-                score += 12
-            elif crecimiento > 0.05:
-                score += 8
-            elif crecimiento > 0:
-                score += 4
-        
-        # Beta (10 puntos) - MÁS FLEXIBLE
-        beta = datos.get('Beta', 1)
-        if beta and beta > 0:
-            if beta < 0.8:
-                score += 10
-            elif beta < 1.2:
-                score += 8
-            elif beta < 1.5:
-                score += 6
-            elif beta < 2.0:
-                score += 4
-            else:
-                score += 2
-        
-        return min(score, max_score)
-        
-    except Exception as e:
-        return 0
-
-def aplicar_filtros_rapidos(datos, filtros):
-    """Aplica filtros de manera optimizada usando operaciones vectorizadas"""
+        return ultimos_indicadores_panel(panel_precios['Close'])
+    except Exception:
+        return pd.DataFrame()
+
+def _riesgo_universo(panel_precios):
+    """Tabla de métricas de riesgo de todos los símbolos del panel frente al S&P500"""
+    if panel_precios is None or panel_precios.empty or 'Close' not in panel_precios.columns.get_level_values(0):
+        return pd.DataFrame()
+    cierres = panel_precios['Close']
+    if INDICE_MERCADO not in cierres.columns:
+        return pd.DataFrame()
     try:
-        # Filtro P/E
-        pe = datos.get('P/E', 0)
-        if filtros['pe_min'] > 0 and (pe == 0 or pe < filtros['pe_min']):
-            return False
-        if filtros['pe_max'] < 1000 and pe > filtros['pe_max']:
-            return False
-        
-        # Solo los filtros más importantes para velocidad
-        roe = datos.get('ROE', 0)
-        if filtros['roe_min'] > 0 and roe < (filtros['roe_min'] / 100):
-            return False
-            
-        # Filtro Margen Beneficio
-        margen = datos.get('Margen Beneficio', 0)
-        if filtros['profit_margin_min'] > 0 and margen < (filtros['profit_margin_min'] / 100):
-            return False
-        
-        # Filtro Deuda/Equity
-        deuda_eq = datos.get('Deuda/Equity', 0)
-        if filtros['debt_equity_max'] < 10 and deuda_eq > filtros['debt_equity_max']:
-            return False
-        
-        # Filtro Beta
-        beta = datos.get('Beta', 1)
-        if filtros['beta_max'] < 5 and beta > filtros['beta_max']:
-            return False
-        
-        # Filtro RSI
-        rsi = datos.get('RSI', 50)
-        if rsi < filtros['rsi_min'] or rsi > filtros['rsi_max']:
-            return False
-            
-        return True
-    except:
-        return False
+        return tabla_riesgo_universo(cierres.drop(columns=INDICE_MERCADO), cierres[INDICE_MERCADO])
+    except Exception:
+        return pd.DataFrame()
+
+def _riesgo_simbolo(riesgo, simbolo):
+    """Métricas de riesgo que filtra el screener para un símbolo (None si no hay datos)"""
+    datos = {}
+    for campo in CAMPOS_RIESGO_SCREENER:
+        valor = riesgo.at[simbolo, campo] if simbolo in riesgo.index else np.nan
+        datos[campo] = None if pd.isna(valor) else float(valor)
+    return datos
+
+def _indicadores_actuales(datos_historicos):
+    """Últimos indicadores técnicos de un único histórico ({} si no hay datos)"""
+    if datos_historicos is None or datos_historicos.empty or 'Close' not in datos_historicos.columns:
+        return {}
+    try:
+        ultimos = ultimos_indicadores_panel(datos_historicos[['Close']])
+        return ultimos.iloc[0] if not ultimos.empty else {}
+    except Exception:
+        return {}
+
+def _rsi_o_neutral(indicadores):
+    """RSI de 14 sesiones de la última barra (50 si no hay datos suficientes)"""
+    rsi = indicadores.get('RSI')
+    return 50 if rsi is None or pd.isna(rsi) else float(rsi)
+
+def calcular_scoring_dinamico(datos):
+    """Calcula scoring basado en datos fundamentales (motor vectorizado de utils.scoring)"""
+    return puntuar_registro(datos, PERFIL_DINAMICO)[0]
 
 def buscar_simbolos_sp500_optimizado(filtros, max_acciones=50):
     """Versión optimizada con carga progresiva"""
-    # Cargar primero datos precalculados si existen
-    datos_precalculados = st.session_state.get('datos_precalculados', {})
-    
-    if not datos_precalculados:
-        with st.spinner('🔄 Precalculando datos del S&P500 para búsquedas ultra rápidas...'):
-            datos_precalculados = precalcular_datos_screener(SP500_SYMBOLS)
-            st.session_state.datos_precalculados = datos_precalculados
-    
-    # Aplicar filtros sobre datos precalculados (MUCHO más rápido)
-    acciones_encontradas = []
+    # Datos precalculados compartidos (solo se calculan si el proceso aún no los tiene)
+    with st.spinner('🔄 Precalculando datos del S&P500 para búsquedas ultra rápidas...'):
+        datos_precalculados = precalcular_datos_screener(SP500_SYMBOLS)
     
-    for simbolo, datos in datos_precalculados.items():
-        if len(acciones_encontradas) >= max_acciones:
-            break
-        if aplicar_filtros_rapidos(datos, filtros):
-            acciones_encontradas.append(datos)
+    instantanea = obtener_instantanea("screener")
+    if not instantanea:
+        return []
     
-    return acciones_encontradas
+    # Filtros como rangos sobre índices ordenados; resultados ya ordenados por Score
+    simbolos = filtrar_tabla_screener(instantanea['tabla'], filtros, max_acciones, instantanea.get('indices'))
+    return [instantanea['acciones'][simbolo] for simbolo in simbolos]
 
 def crear_comparacion_grafica(accion_seleccionada, periodo_comparacion):
     """Crea gráfica de comparación con S&P500"""
@@ -352,8 +357,8 @@ def crear_comparacion_grafica(accion_seleccionada, periodo_comparacion):
         start_date = datetime.today() - timedelta(days=dias)
         
         # Obtener datos de la acción seleccionada
-        data_accion = yf.download(accion_seleccionada, start=start_date, progress=False)
-        data_sp500 = yf.download('^GSPC', start=start_date, progress=False)
+        data_accion = obtener_precios(accion_seleccionada, intervalo='1d', inicio=start_date)
+        data_sp500 = obtener_precios('^GSPC', intervalo='1d', inicio=start_date)
         
         if not data_accion.empty and not data_sp500.empty:
             # Obtener precios de cierre
@@ -440,7 +445,6 @@ def mostrar(datos_accion):
     if 'precalc_iniciado' not in st.session_state:
         with st.spinner('🔄 Precargando datos del S&P 500 para búsquedas instantáneas...'):
             datos_precalculados = precalcular_datos_screener(SP500_SYMBOLS)
-            st.session_state.datos_precalculados = datos_precalculados
             st.session_state.precalc_iniciado = True
             st.success(f"✅ Pre-cálculo completado: {len(datos_precalculados)} acciones listas")
 
@@ -476,6 +480,10 @@ def mostrar(datos_accion):
         st.write("**📊 Volatilidad:**")
         beta_max = st.number_input("Beta Máximo", value=2.5, min_value=0.1, max_value=5.0, step=0.1,
                                 help="5 = Sin filtro. Valores típicos: 0.8-1.5")
+        sharpe_min = st.number_input("Sharpe Mínimo (6 meses)", value=-5.0, min_value=-5.0, max_value=5.0, step=0.1,
+                                help="-5 = Sin filtro. Valores típicos: 0.5-1.5")
+        drawdown_min = st.number_input("Drawdown Máximo Tolerado (%)", value=-100.0, min_value=-100.0, max_value=0.0, step=1.0,
+                                    help="-100 = Sin filtro. Ej.: -20 descarta acciones con caídas mayores al 20%")
         
         st.write("**🚀 Crecimiento:**")
         revenue_growth_min = st.number_input("Crecimiento Ingresos Mínimo (%)", value=0.0, min_value=-50.0, max_value=200.0, step=1.0,
@@ -503,8 +511,8 @@ def mostrar(datos_accion):
                             help="Número máximo de acciones a mostrar")
 
     # Indicador de estado del cache
-    if 'datos_precalculados' in st.session_state:
-        st.success(f"✅ **Datos precalculados listos:** {len(st.session_state.datos_precalculados)} acciones cargadas en caché")
+    if estado_instantanea("screener")["disponible"]:
+        st.success(f"✅ **Datos precalculados listos:** {len(obtener_instantanea('screener')['acciones'])} acciones cargadas en caché")
     else:
         st.info("🔄 **Sistema optimizado:** Los datos se precalcularán en la primera búsqueda para máxima velocidad")
 
@@ -518,6 +526,8 @@ def mostrar(datos_accion):
             'revenue_growth_min': revenue_growth_min,
             'debt_equity_max': debt_equity_max,
             'beta_max': beta_max,
+            'sharpe_min': sharpe_min,
+            'drawdown_min': drawdown_min,
             'rsi_min': rsi_min,
             'rsi_max': rsi_max
         }
@@ -535,9 +545,10 @@ def mostrar(datos_accion):
             
             # Formatear columnas para mostrar
             columnas_mostrar = ['Símbolo', 'Nombre', 'Sector', 'P/E', 'Precio Actual', 
-                            'ROE', 'Margen Beneficio', 'Deuda/Equity', 'Beta', 'RSI', 'Score']
+                            'ROE', 'Margen Beneficio', 'Deuda/Equity', 'Beta', 'RSI',
+                            'Sharpe Ratio', 'Drawdown Máximo', 'Score']
             
-            df_display = df_resultados[columnas_mostrar].copy()
+            df_display = df_resultados.reindex(columns=columnas_mostrar).copy()
             
             # Formatear valores
             df_display['P/E'] = df_display['P/E'].apply(lambda x: f"{x:.1f}" if x > 0 else "N/A")
@@ -547,6 +558,8 @@ def mostrar(datos_accion):
             df_display['Deuda/Equity'] = df_display['Deuda/Equity'].apply(lambda x: f"{x:.2f}" if x >= 0 else "N/A")
             df_display['Beta'] = df_display['Beta'].apply(lambda x: f"{x:.2f}" if x > 0 else "N/A")
             df_display['RSI'] = df_display['RSI'].apply(lambda x: f"{x:.1f}")
+            df_display['Sharpe Ratio'] = df_display['Sharpe Ratio'].apply(lambda x: f"{x:.2f}" if pd.notna(x) else "N/A")
+            df_display['Drawdown Máximo'] = df_display['Drawdown Máximo'].apply(lambda x: f"{x*100:.1f}%" if pd.notna(x) else "N/A")
             df_display['Score'] = df_display['Score'].apply(lambda x: f"{x:.0f}")
             
             # GUARDAR ESTADO DE BÚSQUEDA
@@ -748,8 +761,8 @@ def mostrar(datos_accion):
 
     # ESTADÍSTICAS DEL SISTEMA OPTIMIZADO
     with st.expander("🚀 Estadísticas del Sistema Optimizado"):
-        if 'datos_precalculados' in st.session_state:
-            datos_precalculados = st.session_state.datos_precalculados
+        if estado_instantanea("screener")["disponible"]:
+            datos_precalculados = obtener_instantanea("screener")['acciones']
             st.markdown(f"""
             **📊 Estado del Sistema de Caché:**
             - **Acciones precalculadas:** {len(datos_precalculados)}
@@ -768,8 +781,9 @@ def mostrar(datos_accion):
 
     # BOTÓN PARA LIMPIAR CACHÉ (útil para desarrollo)
     if st.button("🗑️ Limpiar Caché de Datos", type="secondary"):
+        invalidar_instantanea("screener")
         keys_to_remove = [
-            'datos_precalculados', 'precalc_iniciado', 'acciones_encontradas',
+            'precalc_iniciado', 'acciones_encontradas',
             'df_resultados', 'resultados_busqueda', 'search_results',
             'show_search_results', 'show_comparison', 'comparison_data'
         ]
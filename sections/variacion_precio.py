@@ -5,6 +5,7 @@ import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 from utils.technical_analysis import analizar_tendencias, calcular_indicadores_tecnicos
+from utils.almacen_precios import obtener_precios
 
 def mostrar_seccion_variacion_precio(datos_accion):
     """
@@ -54,8 +55,7 @@ def _descargar_datos_accion(ticker, start_date, end_date):
     Descarga datos de la acción y limpia las columnas
     """
     try:
-        data = yf.download(ticker, start=start_date.strftime('%Y-%m-%d'), 
-                          end=end_date.strftime('%Y-%m-%d'), interval='1d')
+        data = obtener_precios(ticker, intervalo='1d', inicio=start_date, fin=end_date)
         
         if data.empty:
             return pd.DataFrame()
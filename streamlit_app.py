@@ -8,6 +8,10 @@ import requests
 import google.generativeai as genai
 from dotenv import load_dotenv
 import os
+from utils.almacen_precios import obtener_precios
+from utils.data_fetcher import consultar_info_yahoo
+from utils.vuelo_unico import ejecutar_unico
+from utils.actualizador import iniciar_actualizador
 
 # Importar todas las secciones
 from sections import (
@@ -31,6 +35,10 @@ GOOGLE_KEY = os.getenv("AP")
 if GOOGLE_KEY:
     genai.configure(api_key=GOOGLE_KEY)
 
+# Actualizador en segundo plano: mantiene precios, fundamentales y scores al día
+# (arranca una sola vez por proceso aunque el script se vuelva a ejecutar)
+iniciar_actualizador()
+
 # CSS personalizado mejorado
 st.markdown("""
 <style>
@@ -139,21 +147,28 @@ def inicializar_session_state():
         st.session_state.cache_lock = st.empty()
 
 # Función para obtener datos básicos de la acción
+def _cargar_datos_basicos(ticker):
+    """Info y último mes de precios (sin interfaz: la comparten las sesiones que esperan)"""
+    info = consultar_info_yahoo(ticker)
+    datos = obtener_precios(ticker, periodo="1mo", intervalo="1d")
+    
+    return {
+        'ticker': ticker,
+        'info': info,
+        'datos': datos,
+        'nombre': info.get("longName", "Empresa no encontrada"),
+        'descripcion': info.get("longBusinessSummary", "No hay descripción disponible")
+    }
+
 @st.cache_data(ttl=300, show_spinner=False)
+def _datos_basicos_compartidos(ticker):
+    """Carga cacheada; un error se propaga para que no quede guardado en la caché"""
+    return ejecutar_unico(("datos_basicos", ticker.upper()), _cargar_datos_basicos, ticker)
+
 def obtener_datos_basicos(ticker):
-    """Obtiene datos básicos de la acción"""
+    """Obtiene datos básicos de la acción (una sola carga aunque varias sesiones la pidan a la vez)"""
     try:
-        ticker_obj = yf.Ticker(ticker)
-        info = ticker_obj.info
-        datos = yf.download(ticker, period="1mo", progress=False)
-        
-        return {
-            'ticker': ticker,
-            'info': info,
-            'datos': datos,
-            'nombre': info.get("longName", "Empresa no encontrada"),
-            'descripcion': info.get("longBusinessSummary", "No hay descripción disponible")
-        }
+        return _datos_basicos_compartidos(ticker)
     except Exception as e:
         st.error(f"Error al cargar datos de {ticker}: {str(e)}")
         return None
@@ -0,0 +1,75 @@
+# utils/actualizador.py
+"""
+Actualizador en segundo plano
+Un hilo demonio por proceso que ejecuta las tareas registradas (precios, fundamentales, scores)
+cada una con su cadencia de CACHE_CONFIG, para que ningún usuario pague la actualización.
+"""
+
+import time
+import traceback
+from threading import Thread, Lock
+
+from utils.config import ACTUALIZADOR_CONFIG
+from utils.instantaneas import activar_refresco_en_segundo_plano
+
+_tareas = {}
+_candado = Lock()
+_hilo = None
+
+def registrar_tarea(nombre, funcion, cadencia, inmediata=True):
+    """
+    Registra una tarea periódica (`funcion()` sin argumentos, `cadencia` en segundos)
+    Las tareas se ejecutan en orden de registro; con `inmediata` la primera ronda se lanza al arrancar.
+    """
+    with _candado:
+        anterior = _tareas.get(nombre, {})
+        _tareas[nombre] = {
+            "funcion": funcion,
+            "cadencia": cadencia,
+            "ultima": anterior.get("ultima", 0.0 if inmediata else time.time()),
+            "error": anterior.get("error")
+        }
+
+def iniciar_actualizador():
+    """Arranca el hilo demonio una sola vez por proceso (se puede llamar en cada rerun)"""
+    global _hilo
+
+    if not ACTUALIZADOR_CONFIG["activo"]:
+        return False
+
+    with _candado:
+        if _hilo is not None and _hilo.is_alive():
+            return True
+        _hilo = Thread(target=_bucle, name="actualizador-mercado", daemon=True)
+        _hilo.start()
+
+    activar_refresco_en_segundo_plano()
+    return True
+
+def estado_tareas():
+    """Última ejecución y último error de cada tarea"""
+    with _candado:
+        return {
+            nombre: {"ultima": tarea["ultima"] or None, "error": tarea["error"]}
+            for nombre, tarea in _tareas.items()
+        }
+
+def _bucle():
+    """Revisa periódicamente qué tareas toca ejecutar"""
+    while True:
+        with _candado:
+            pendientes = [
+                (nombre, tarea) for nombre, tarea in _tareas.items()
+                if time.time() - tarea["ultima"] >= tarea["cadencia"]
+            ]
+
+        for nombre, tarea in pendientes:
+            try:
+                tarea["funcion"]()
+                tarea["error"] = None
+            except Exception:
+                # Un fallo no detiene el actualizador; se reintenta en la siguiente cadencia
+                tarea["error"] = traceback.format_exc(limit=3)
+            tarea["ultima"] = time.time()
+
+        time.sleep(ACTUALIZADOR_CONFIG["intervalo_revision"])
@@ -0,0 +1,387 @@
+# utils/almacen_precios.py
+"""
+Almacén local de precios OHLCV
+Guarda un archivo Parquet por ticker e intervalo que persiste entre procesos y reinicios.
+En cada consulta solo se descargan de Yahoo las barras posteriores a la última guardada.
+"""
+
+import os
+import re
+import json
+import logging
+import time
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from utils.config import ALMACEN_PRECIOS_CONFIG, CACHE_CONFIG
+from utils.limitador_peticiones import obtener_limitador
+
+_log = logging.getLogger(__name__)
+
+# Días aproximados de cada período de yfinance
+_DIAS_PERIODO = {
+    "1d": 1,
+    "5d": 5,
+    "1mo": 31,
+    "3mo": 92,
+    "6mo": 183,
+    "1y": 366,
+    "2y": 731,
+    "5y": 5 * 366,
+    "10y": 10 * 366
+}
+
+# Intervalos que no se descargan: se derivan del histórico diario guardado. Regla de remuestreo
+# (etiqueta al inicio del período, como las barras semanales y mensuales de Yahoo) y período
+# equivalente para redondear la fecha de inicio
+_REGLAS_REMUESTREO = {
+    "1wk": ("W-MON", "W-SUN"),
+    "1mo": ("MS", "M")
+}
+
+# Agregación de cada columna al pasar de barras diarias a semanales o mensuales
+_AGREGACION_OHLCV = {
+    "Open": "first",
+    "High": "max",
+    "Low": "min",
+    "Close": "last",
+    "Adj Close": "last",
+    "Volume": "sum",
+    "Dividends": "sum"
+}
+
+# Un candado por (ticker, intervalo) para que dos hilos no escriban el mismo archivo
+_candados = {}
+_candado_global = Lock()
+
+# Identificador barato de un histórico para usarlo como clave de caché en lugar del DataFrame:
+# la versión del almacén cambia al reajustar la serie y la firma cubre las últimas barras, que
+# son las únicas que se reescriben al completar el histórico
+HuellaPrecios = namedtuple(
+    "HuellaPrecios", ["ticker", "intervalo", "desde", "hasta", "barras", "version", "firma"]
+)
+
+def obtener_precios(ticker, periodo="1y", intervalo="1d", inicio=None, fin=None):
+    """
+    Devuelve el histórico OHLCV de un ticker usando el almacén local
+    Si faltan barras recientes las descarga y las añade; si falta historia anterior la completa.
+    Columnas planas (Open, High, Low, Close, Volume) con índice de fechas 'Date'.
+    """
+    return _obtener_con_meta(ticker, periodo, intervalo, inicio, fin)[0]
+
+def obtener_precios_con_huella(ticker, periodo="1y", intervalo="1d", inicio=None, fin=None):
+    """
+    Igual que obtener_precios pero devuelve también su HuellaPrecios
+    Las funciones con st.cache_data reciben la huella como clave y el DataFrame como `_data`.
+    Retorna: (DataFrame, HuellaPrecios)
+    """
+    datos, meta = _obtener_con_meta(ticker, periodo, intervalo, inicio, fin)
+    return datos, huella_precios(ticker, intervalo, datos, meta.get("version"))
+
+def huella_precios(ticker, intervalo, datos, version=None):
+    """Calcula la HuellaPrecios de un histórico (rango, número de barras, versión y firma)"""
+    if datos is None or datos.empty:
+        return HuellaPrecios(ticker.upper(), intervalo, None, None, 0, version, 0)
+
+    recientes = datos.iloc[-ALMACEN_PRECIOS_CONFIG["barras_solapamiento"]:]
+    valores = recientes.select_dtypes("number").to_numpy(dtype="float64")
+    firma = zlib.crc32(np.ascontiguousarray(valores).tobytes())
+    return HuellaPrecios(
+        ticker.upper(), intervalo, datos.index[0].isoformat(), datos.index[-1].isoformat(),
+        len(datos), version, firma
+    )
+
+def _obtener_con_meta(ticker, periodo, intervalo, inicio, fin):
+    """Implementación de obtener_precios que devuelve también los metadatos guardados"""
+    if inicio is None:
+        inicio = inicio_periodo(periodo)
+
+    if intervalo in _REGLAS_REMUESTREO:
+        # Desde el inicio del período que contiene `inicio` para que la primera barra esté completa
+        if inicio is not None:
+            inicio = pd.Timestamp(inicio).normalize().to_period(_REGLAS_REMUESTREO[intervalo][1]).start_time
+        diarios, meta = _obtener_con_meta(ticker, periodo, "1d", inicio, fin)
+        return remuestrear_ohlcv(diarios, intervalo), meta
+
+    with _candado_para(ticker, intervalo):
+        datos, meta = leer_precios(ticker, intervalo)
+
+        if datos is None or datos.empty or _requiere_historia_previa(meta, inicio):
+            datos = _descargar(ticker, intervalo, inicio)
+            if datos.empty:
+                return pd.DataFrame(), meta
+            meta = {
+                "desde": inicio.strftime('%Y-%m-%d') if inicio is not None else "max",
+                "version": meta.get("version", 0) + 1
+            }
+            guardar_precios(ticker, intervalo, datos, meta)
+
+        elif _esta_desactualizado(meta):
+            datos, meta, cambiado = _completar_barras(ticker, intervalo, datos, meta)
+            if cambiado:
+                # Sin descarga no se guarda: 'actualizado' no debe marcar como vigentes barras viejas
+                guardar_precios(ticker, intervalo, datos, meta)
+
+    return _recortar(datos, inicio, fin), meta
+
+def precios_vigentes(ticker, intervalo="1d", inicio=None, fin=None):
+    """
+    Devuelve el histórico guardado si cubre `inicio` y no ha vencido su TTL; si no, None
+    Sirve para que las descargas por lotes solo pidan los símbolos que faltan.
+    """
+    with _candado_para(ticker, intervalo):
+        datos, meta = leer_precios(ticker, intervalo)
+    if datos is None or datos.empty or _requiere_historia_previa(meta, inicio) or _esta_desactualizado(meta):
+        return None
+    return _recortar(datos, inicio, fin)
+
+def incorporar_precios(ticker, intervalo, nuevos, inicio=None):
+    """
+    Añade al almacén un histórico descargado fuera de obtener_precios (p. ej. en lote)
+    Se conserva la historia guardada anterior a `inicio` salvo que la serie se haya reajustado.
+    """
+    if nuevos is None or nuevos.empty:
+        return
+
+    with _candado_para(ticker, intervalo):
+        datos, meta = leer_precios(ticker, intervalo)
+        desde = inicio.strftime('%Y-%m-%d') if inicio is not None else "max"
+
+        if datos is not None and not datos.empty and not _serie_reajustada(datos, nuevos):
+            if not _requiere_historia_previa(meta, inicio):
+                desde = meta["desde"]
+            nuevos = pd.concat([datos[datos.index < nuevos.index[0]], nuevos])
+            nuevos = nuevos[~nuevos.index.duplicated(keep="last")].sort_index()
+            version = meta.get("version", 1)
+        else:
+            version = meta.get("version", 0) + 1
+
+        guardar_precios(ticker, intervalo, nuevos, {"desde": desde, "version": version})
+
+def leer_precios(ticker, intervalo="1d"):
+    """
+    Lee del disco el histórico guardado y sus metadatos
+    Retorna: (DataFrame o None, dict de metadatos)
+    """
+    ruta_datos, _ = _rutas(ticker, intervalo)
+    meta = leer_meta_precios(ticker, intervalo)
+
+    if not os.path.exists(ruta_datos):
+        return None, meta
+
+    try:
+        return pd.read_parquet(ruta_datos), meta
+    except Exception:
+        # Archivo corrupto o de otra versión: se descarga de nuevo
+        return None, meta
+
+def leer_meta_precios(ticker, intervalo="1d"):
+    """Metadatos del histórico guardado (versión, 'desde', 'actualizado', 'ultima_fecha') sin leer las barras"""
+    _, ruta_meta = _rutas(ticker, intervalo)
+    if not os.path.exists(ruta_meta):
+        return {}
+    try:
+        with open(ruta_meta, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def guardar_precios(ticker, intervalo, datos, meta):
+    """
+    Escribe el histórico y sus metadatos de forma atómica (archivo temporal + reemplazo)
+    Un fallo de escritura (disco lleno o de solo lectura, sin motor Parquet) no se propaga: los
+    datos ya descargados se siguen sirviendo y se volverán a pedir en la próxima consulta.
+    Retorna: True si se guardó
+    """
+    ruta_datos, ruta_meta = _rutas(ticker, intervalo)
+    temporal = f"{ruta_datos}.{os.getpid()}.tmp"
+    temporal_meta = f"{ruta_meta}.{os.getpid()}.tmp"
+
+    meta = dict(meta)
+    meta["actualizado"] = time.time()
+    meta["ultima_fecha"] = datos.index[-1].isoformat() if not datos.empty else None
+
+    try:
+        os.makedirs(os.path.dirname(ruta_datos), exist_ok=True)
+        datos.to_parquet(temporal)
+        os.replace(temporal, ruta_datos)
+
+        with open(temporal_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(temporal_meta, ruta_meta)
+        return True
+    except Exception as e:
+        _log.warning("No se pudo guardar el histórico de %s (%s): %s", ticker, intervalo, e)
+        for ruta in (temporal, temporal_meta):
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+        return False
+
+def remuestrear_ohlcv(datos, intervalo):
+    """
+    Agrega barras diarias a semanales ('1wk') o mensuales ('1mo')
+    Open es la primera apertura, High/Low los extremos, Close el último cierre y Volume la suma.
+    El histórico diario ya está ajustado por splits y dividendos (y se recarga entero cuando Yahoo
+    lo reajusta), así que las barras derivadas heredan el ajuste. Las barras de splits se agregan
+    multiplicando los factores.
+    """
+    if datos is None or datos.empty or intervalo not in _REGLAS_REMUESTREO:
+        return datos
+
+    agregacion = {columna: funcion for columna, funcion in _AGREGACION_OHLCV.items() if columna in datos.columns}
+    remuestreo = datos.resample(_REGLAS_REMUESTREO[intervalo][0], label="left", closed="left")
+    barras = remuestreo.agg(agregacion)
+    if "Stock Splits" in datos.columns:
+        barras["Stock Splits"] = remuestreo["Stock Splits"].agg(
+            lambda factores: factores[factores > 0].prod() if (factores > 0).any() else 0.0
+        )
+
+    # Períodos sin ninguna sesión (p. ej. semanas festivas completas)
+    barras = barras.dropna(subset=["Close"] if "Close" in barras.columns else None, how="all")
+    barras.index.name = "Date"
+    return barras[[columna for columna in datos.columns if columna in barras.columns]]
+
+def normalizar_ohlcv(data, ticker):
+    """
+    Convierte la salida de yf.download a columnas planas y un índice de fechas ordenado
+    """
+    if data is None or data.empty:
+        return pd.DataFrame()
+
+    data = data.copy()
+
+    # yfinance devuelve columnas MultiIndex (campo, ticker) en versiones recientes
+    if isinstance(data.columns, pd.MultiIndex):
+        if ticker in data.columns.get_level_values(-1):
+            data = data.xs(ticker, axis=1, level=-1)
+        else:
+            data.columns = data.columns.get_level_values(0)
+
+    if data.index.tz is not None:
+        data.index = data.index.tz_localize(None)
+    data.index.name = "Date"
+
+    data = data.dropna(how="all")
+    data = data[~data.index.duplicated(keep="last")].sort_index()
+    return data
+
+def _descargar(ticker, intervalo, inicio=None):
+    """Descarga de Yahoo desde `inicio` (o todo el histórico si es None)"""
+    obtener_limitador("yahoo").adquirir()
+    try:
+        if inicio is None:
+            data = yf.download(ticker, period="max", interval=intervalo, progress=False)
+        else:
+            data = yf.download(ticker, start=inicio.strftime('%Y-%m-%d'),
+                               interval=intervalo, progress=False)
+        return normalizar_ohlcv(data, ticker)
+    except Exception:
+        return pd.DataFrame()
+
+def _completar_barras(ticker, intervalo, datos, meta):
+    """
+    Descarga solo las últimas barras y las añade al histórico guardado
+    Las primeras barras descargadas se solapan con las guardadas: si sus cierres no coinciden
+    (split o dividendo que reajusta la serie) se recarga el histórico completo.
+    Retorna: (datos, meta, True si hay datos descargados que guardar)
+    """
+    solapamiento = min(ALMACEN_PRECIOS_CONFIG["barras_solapamiento"], len(datos))
+    desde = datos.index[-solapamiento]
+
+    nuevos = _descargar(ticker, intervalo, desde)
+    if nuevos.empty:
+        # Sin conexión o limitado: se mantiene lo guardado y se reintenta en la siguiente consulta
+        return datos, meta, False
+
+    if _serie_reajustada(datos, nuevos):
+        inicio = None if meta.get("desde", "max") == "max" else pd.Timestamp(meta["desde"])
+        completos = _descargar(ticker, intervalo, inicio)
+        if completos.empty:
+            # No se mezclan barras reajustadas con el histórico sin reajustar
+            return datos, meta, False
+        meta = dict(meta, version=meta.get("version", 0) + 1)
+        return completos, meta, True
+
+    datos = pd.concat([datos[datos.index < nuevos.index[0]], nuevos])
+    datos = datos[~datos.index.duplicated(keep="last")].sort_index()
+    return datos, meta, True
+
+def _serie_reajustada(datos, nuevos):
+    """Compara los cierres solapados, excepto la última barra guardada (puede ser parcial)"""
+    if 'Close' not in datos.columns or 'Close' not in nuevos.columns or len(datos) < 2:
+        return False
+
+    comunes = datos.index[:-1].intersection(nuevos.index)
+    if len(comunes) == 0:
+        return False
+
+    guardado = datos.loc[comunes, 'Close']
+    descargado = nuevos.loc[comunes, 'Close']
+    diferencia = ((descargado - guardado).abs() / guardado.abs()).max()
+    return bool(diferencia > ALMACEN_PRECIOS_CONFIG["tolerancia_ajuste"])
+
+def _requiere_historia_previa(meta, inicio):
+    """Indica si el histórico guardado no cubre la fecha de inicio pedida"""
+    desde = meta.get("desde")
+    if desde is None:
+        return True
+    if desde == "max":
+        return False
+    if inicio is None:
+        return True
+    return pd.Timestamp(inicio).normalize() < pd.Timestamp(desde)
+
+def _esta_desactualizado(meta):
+    """El histórico se completa como mucho una vez por cada TTL de precios"""
+    actualizado = meta.get("actualizado", 0)
+    return (time.time() - actualizado) > CACHE_CONFIG["datos_precios"]
+
+def _recortar(datos, inicio, fin):
+    """Recorta el histórico al rango pedido"""
+    if datos is None or datos.empty:
+        return pd.DataFrame()
+    if inicio is not None:
+        datos = datos[datos.index >= pd.Timestamp(inicio).normalize()]
+    if fin is not None:
+        datos = datos[datos.index <= pd.Timestamp(fin)]
+    return datos
+
+def inicio_periodo(periodo):
+    """Convierte un período de yfinance ('1y', '6mo', 'max'...) en fecha de inicio"""
+    hoy = datetime.today()
+    if periodo == "max":
+        return None
+    if periodo == "ytd":
+        return datetime(hoy.year, 1, 1)
+    dias = _DIAS_PERIODO.get(periodo, 366)
+    return (hoy - timedelta(days=dias)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+def ruta_complemento(ticker, intervalo, extension):
+    """Ruta de un archivo auxiliar guardado junto al histórico (p. ej. 'indicadores.json')"""
+    return f"{_base_ruta(ticker, intervalo)}.{extension}"
+
+def _rutas(ticker, intervalo):
+    """Rutas del archivo de datos y de metadatos para un ticker e intervalo"""
+    base = _base_ruta(ticker, intervalo)
+    return f"{base}.parquet", f"{base}.json"
+
+def _base_ruta(ticker, intervalo):
+    """Ruta base (sin extensión) de los archivos de un ticker e intervalo"""
+    nombre = re.sub(r'[^A-Za-z0-9._-]', '_', ticker.upper())
+    return os.path.join(ALMACEN_PRECIOS_CONFIG["directorio"], intervalo, nombre)
+
+def _candado_para(ticker, intervalo):
+    """Obtiene (o crea) el candado de un ticker e intervalo"""
+    clave = (ticker.upper(), intervalo)
+    with _candado_global:
+        if clave not in _candados:
+            _candados[clave] = Lock()
+        return _candados[clave]
@@ -0,0 +1,90 @@
+# utils/capm.py
+"""
+Regresión CAPM de muchas acciones contra un índice en un solo cálculo
+Los cierres semanales y mensuales son las barras '1wk' y '1mo' del almacén local, que se derivan
+del histórico diario guardado (no se vuelve a descargar con otro intervalo). Beta, alfa, R² y
+volatilidad residual de todas las columnas salen de las ecuaciones normales de mínimos cuadrados
+resueltas en bloque: las sumas de cada acción sobre sus fechas con dato se obtienen con productos
+matriciales.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Intervalo del almacén de precios y períodos por año de cada frecuencia
+FRECUENCIAS_CAPM = {
+    "Diario": ("1d", 252),
+    "Semanal": ("1wk", 52),
+    "Mensual": ("1mo", 12)
+}
+
+COLUMNAS_CAPM = ['Beta', 'Alfa', 'Alfa Anual', 'R²', 'Correlación', 'Volatilidad Residual Anual',
+                 'Rendimiento Promedio', 'Volatilidad', 'Observaciones']
+
+def regresion_capm(rendimientos, rendimiento_mercado, periodos_año=252, minimo_observaciones=5):
+    """
+    Regresión r_i = alfa + beta · r_m de todas las columnas de `rendimientos` a la vez
+    Cada acción usa solo las fechas en que tiene dato (igual que alinear pareja a pareja).
+    Retorna: DataFrame indexado por 'Símbolo' con las COLUMNAS_CAPM (NaN con menos de
+    `minimo_observaciones` fechas)
+    """
+    rendimiento_mercado = rendimiento_mercado.reindex(rendimientos.index)
+    y = rendimientos.to_numpy(dtype='float64')
+    x = rendimiento_mercado.to_numpy(dtype='float64')
+
+    validos = ~np.isnan(y) & ~np.isnan(x)[:, None]
+    m = validos.astype('float64')
+    y0 = np.where(validos, y, 0.0)
+    x0 = np.nan_to_num(x)
+
+    # Sumas por columna sobre sus fechas válidas: [1, x, x²]ᵀ·M y columnas de y, y², x·y
+    n, suma_x, suma_xx = np.vstack([np.ones_like(x0), x0, x0 * x0]) @ m
+    suma_y = y0.sum(axis=0)
+    suma_yy = (y0 * y0).sum(axis=0)
+    suma_xy = x0 @ y0
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sxx = suma_xx - suma_x ** 2 / n
+        syy = suma_yy - suma_y ** 2 / n
+        sxy = suma_xy - suma_x * suma_y / n
+
+        beta = sxy / sxx
+        alfa = (suma_y - beta * suma_x) / n
+        r_cuadrado = sxy ** 2 / (sxx * syy)
+        correlacion = sxy / np.sqrt(sxx * syy)
+        residual = np.sqrt(np.maximum(syy - beta * sxy, 0.0) / (n - 2))
+        media = suma_y / n
+        volatilidad = np.sqrt(syy / (n - 1))
+
+    tabla = pd.DataFrame({
+        'Beta': beta,
+        'Alfa': alfa,
+        'Alfa Anual': alfa * periodos_año,
+        'R²': r_cuadrado,
+        'Correlación': correlacion,
+        'Volatilidad Residual Anual': residual * np.sqrt(periodos_año),
+        'Rendimiento Promedio': media,
+        'Volatilidad': volatilidad,
+        'Observaciones': n.astype(np.int64)
+    }, index=pd.Index(rendimientos.columns, name='Símbolo'))
+    tabla.loc[n < minimo_observaciones, COLUMNAS_CAPM[:-1]] = np.nan
+    return tabla
+
+def calcular_capm(cierres, cierre_mercado, frecuencia="Diario", minimo_observaciones=5):
+    """
+    CAPM de un panel de cierres (fechas x tickers) contra los cierres del índice
+    Los cierres deben tener la frecuencia indicada: obtener_precios con el intervalo de
+    FRECUENCIAS_CAPM[frecuencia][0].
+    Retorna: (tabla de regresion_capm, rendimientos de las acciones, rendimientos del índice)
+    con los rendimientos en las fechas del índice
+    """
+    periodos_año = FRECUENCIAS_CAPM[frecuencia][1]
+    if isinstance(cierres, pd.Series):
+        cierres = cierres.to_frame()
+    cierres = cierres.sort_index()
+    cierre_mercado = cierre_mercado.sort_index().dropna()
+
+    rendimiento_mercado = cierre_mercado.pct_change().iloc[1:]
+    rendimientos = cierres.reindex(cierre_mercado.index).pct_change(fill_method=None).iloc[1:]
+    tabla = regresion_capm(rendimientos, rendimiento_mercado, periodos_año, minimo_observaciones)
+    return tabla, rendimientos, rendimiento_mercado
@@ -37,7 +37,7 @@ PERIODOS_DISponibles = {
     "Máximo": None
 }
 
-# Intervalos de datos
+# Intervalos de datos (semanal y mensual se derivan del histórico diario del almacén)
 INTERVALOS_DISPONIBLES = {
     "Diario": "1d",
     "Semanal": "1wk",
@@ -56,7 +56,14 @@ CACHE_CONFIG = {
     "datos_macro": 10800,         # 3 horas
     "analisis_ia": 1800,          # 30 minutos
     "noticias": 900,              # 15 minutos
-    "datos_worldbank": 43200      # 12 horas
+    "datos_worldbank": 43200,     # 12 horas
+    "scoring": 900                # 15 minutos (scores derivados del screener)
+}
+
+# Actualizador en segundo plano (mantiene las instantáneas al día sin esperar a los usuarios)
+ACTUALIZADOR_CONFIG = {
+    "activo": os.getenv("BACKGROUND_REFRESH", "1") == "1",
+    "intervalo_revision": 30      # segundos entre revisiones de tareas pendientes
 }
 
 # Límites de caché
@@ -67,6 +74,54 @@ CACHE_LIMITS = {
     "max_entries_analisis": 30
 }
 
+# Almacén persistente de precios OHLCV (un archivo por ticker e intervalo)
+ALMACEN_PRECIOS_CONFIG = {
+    "directorio": os.getenv("PRICE_STORE_DIR", os.path.join(".cache", "precios")),
+    "barras_solapamiento": 5,      # barras que se vuelven a descargar para validar la serie guardada
+    "tolerancia_ajuste": 0.005,    # 0.5% de diferencia en el cierre => recarga completa (splits/dividendos)
+    "tamano_lote": 100             # símbolos por llamada de descarga múltiple
+}
+
+# Presupuesto de peticiones por proveedor (cubeta de fichas compartida por todo el proceso)
+LIMITES_PETICIONES = {
+    "yahoo": {
+        "tasa": 5.0,           # peticiones por segundo en régimen normal
+        "capacidad": 10,       # ráfaga máxima
+        "concurrencia": 8,     # hilos simultáneos para consultas .info
+        "pausa_429": 10        # segundos sin peticiones tras un "Too Many Requests"
+    },
+    "fmp": {
+        "tasa": 4.0,
+        "capacidad": 4,
+        "concurrencia": 4,
+        "pausa_429": 30
+    },
+    "alpha_vantage": {
+        "tasa": 5 / 60,        # plan gratuito: 5 peticiones por minuto
+        "capacidad": 5,
+        "concurrencia": 1,
+        "pausa_429": 60
+    }
+}
+
+# Carga concurrente de la página de mercados globales
+MERCADOS_CONFIG = {
+    "presupuesto": 8.0,        # segundos máximos de carga de la página; se muestra lo recibido
+    "timeout": 6,              # segundos por petición HTTP
+    "conexiones": 32           # hilos y conexiones HTTP reutilizables simultáneas
+}
+
+# Salud de proveedores: cortacircuitos y peticiones de cobertura (hedging)
+SALUD_PROVEEDORES_CONFIG = {
+    "fallos_apertura": 3,          # fallos seguidos que abren el circuito del proveedor
+    "enfriamiento": 60,            # segundos con el circuito abierto antes de una petición de prueba
+    "muestras": 200,               # latencias recientes guardadas por proveedor
+    "muestras_minimas": 10,        # por debajo se usa la espera de cobertura por defecto
+    "percentil_cobertura": 95,     # tras este percentil de latencia se lanza el siguiente proveedor
+    "cobertura_por_defecto": 2.0,  # segundos
+    "cobertura_minima": 0.2        # segundos (evita duplicar peticiones de proveedores muy rápidos)
+}
+
 # =============================================
 # CONFIGURACIÓN DE RIESGO
 # =============================================
@@ -80,6 +135,50 @@ PARAMETROS_RIESGO = {
     "ventana_volatilidad": 252  # días trading anual
 }
 
+# Simulación Monte Carlo de rendimientos (VaR/CVaR a varios horizontes)
+SIMULACION_CONFIG = {
+    "trayectorias": 100_000,
+    "horizontes": (1, 10, 21, 63),     # días hábiles: 1 día, 2 semanas, 1 mes, 1 trimestre
+    "niveles": (0.95, 0.99),
+    "tamano_bloque": 10_000,           # trayectorias por bloque (acota la memoria de cada paso)
+    "procesos": min(4, os.cpu_count() or 1),   # solo en medir_rendimiento; la interfaz simula en su proceso
+    "semilla": 20240101                # semilla por defecto: resultados reproducibles entre ejecuciones
+}
+
+# Eventos de estrés históricos que se reproducen sobre el panel de precios (fechas inclusivas)
+EVENTOS_ESTRES = [
+    {"id": "2018_q4", "evento": "Venta masiva 4T 2018", "inicio": "2018-10-01", "fin": "2018-12-24",
+     "descripcion": "Subidas de tipos de la Fed y guerra comercial con China"},
+    {"id": "covid_2020", "evento": "COVID-19", "inicio": "2020-02-19", "fin": "2020-03-23",
+     "descripcion": "Caída más rápida del S&P 500 desde máximos históricos"},
+    {"id": "fed_2022", "evento": "Subida de tipos Fed 2022", "inicio": "2022-01-03", "fin": "2022-10-12",
+     "descripcion": "Inflación y endurecimiento monetario; mercado bajista en tecnología"},
+    {"id": "bancos_2023", "evento": "Crisis bancaria 2023", "inicio": "2023-03-08", "fin": "2023-03-31",
+     "descripcion": "Quiebra de Silicon Valley Bank y contagio a bancos regionales"}
+]
+
+# Reproducción de eventos de estrés: período descargado (debe cubrir el evento más antiguo)
+ESTRES_CONFIG = {
+    "periodo": "10y",
+    "indice": "^GSPC"
+}
+
+# Carteras (equiponderadas) cuyo comportamiento se reproduce en cada evento de estrés
+CARTERAS_ESTRES = {
+    "Tecnología": ["AAPL", "MSFT", "GOOGL", "AMZN", "META", "NVDA", "AVGO", "ADBE", "CRM", "ORCL"],
+    "Salud": ["JNJ", "UNH", "PFE", "ABBV", "MRK", "TMO", "LLY", "DHR", "ABT", "BMY"],
+    "Financiero": ["JPM", "BAC", "WFC", "GS", "MS", "SCHW", "BLK", "AXP", "V", "MA"],
+    "Consumo": ["HD", "MCD", "NKE", "LOW", "SBUX", "TJX", "TGT", "BKNG", "ORLY", "AZO"],
+    "Defensiva": ["WMT", "PG", "KO", "PEP", "COST", "JNJ", "XOM", "CVX", "BRK-B", "UPS"]
+}
+
+# Correlación del universo en la comparación: ventanas de cálculo y filtro de cobertura
+CORRELACION_UNIVERSO_CONFIG = {
+    "ventanas": {"6 meses": "6mo", "1 año": "1y", "2 años": "2y", "5 años": "5y"},
+    "cobertura_minima": 0.9,           # fracción mínima de días con cierre para entrar en la matriz
+    "anotar_hasta": 15                 # con más instrumentos el mapa de calor no muestra los valores
+}
+
 # Umbrales de alerta de riesgo
 UMBRALES_RIESGO = {
     "drawdown_critico": 0.25,    # 25%
@@ -129,6 +228,18 @@ RANGOS_SCORING = {
         "bueno": 1.0,
         "regular": 1.5,
         "maximo": 2.0
+    },
+    "crecimiento_ingresos": {
+        "excelente": 0.20,
+        "bueno": 0.15,
+        "regular": 0.10,
+        "minimo": 0.05
+    },
+    "beta": {
+        "excelente": 0.8,
+        "bueno": 1.2,
+        "regular": 1.5,
+        "maximo": 2.0
     }
 }
 
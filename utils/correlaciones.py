@@ -0,0 +1,194 @@
+# utils/correlaciones.py
+"""
+Motor de correlaciones y covarianzas entre varios instrumentos
+Parte de un único panel alineado de rendimientos logarítmicos (fechas x tickers) y obtiene cada
+matriz completa con productos matriciales en lugar de un Series.corr por pareja:
+- 'pearson' y 'spearman': solo las fechas en que cotizan todos los instrumentos (listwise)
+- 'pareada': Pearson con todas las fechas comunes de cada pareja (pairwise-complete); todas las
+  sumas por pareja salen de un único producto matricial
+"""
+
+import numpy as np
+import pandas as pd
+
+METODOS_CORRELACION = ('pearson', 'spearman', 'pareada')
+
+def matriz_log_rendimientos(cierres):
+    """
+    Rendimientos logarítmicos diarios alineados por fecha a partir de un panel o dict de cierres
+    Un día sin cierre (o sin cierre previo) de un ticker queda como NaN solo para ese ticker.
+    """
+    if isinstance(cierres, dict):
+        cierres = pd.DataFrame(cierres)
+    if cierres is None or cierres.empty:
+        return pd.DataFrame()
+    cierres = cierres.sort_index().astype('float64')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rendimientos = np.log(cierres / cierres.shift(1))
+    return rendimientos.iloc[1:].replace([np.inf, -np.inf], np.nan)
+
+def _correlacion_completa(valores):
+    """Pearson de columnas sin NaN: columnas estandarizadas y un único producto Z^T Z"""
+    centrados = valores - valores.mean(axis=0)
+    normas = np.sqrt((centrados ** 2).sum(axis=0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        estandarizados = centrados / normas
+    return estandarizados.T @ estandarizados
+
+def correlacion_pareada(valores, minimo_observaciones=10):
+    """
+    Pearson pairwise-complete de todas las columnas con un único producto matricial
+    Con X (NaN -> 0) y la máscara M de datos válidos, [X, X², M]^T @ [X, M] contiene para cada
+    pareja el número de fechas comunes y las sumas de x, x² e x·y sobre esas fechas.
+    Retorna: (matriz de correlación, matriz de observaciones comunes)
+    """
+    validos = ~np.isnan(valores)
+    x = np.where(validos, valores, 0.0)
+    m = validos.astype('float64')
+    k = valores.shape[1]
+
+    # Centrar cada columna mejora la precisión de las sumas de cuadrados
+    x = np.where(validos, x - np.nanmean(np.where(validos, valores, np.nan), axis=0), 0.0)
+
+    gram = np.hstack([x, x * x, m]).T @ np.hstack([x, m])
+    suma_xy = gram[:k, :k]                 # Σ x_i·x_j sobre fechas comunes
+    suma_x = gram[:k, k:]                  # Σ x_i sobre las fechas en que también hay j
+    suma_xx = gram[k:2 * k, k:]            # Σ x_i² sobre las fechas en que también hay j
+    comunes = gram[2 * k:, k:]             # fechas con datos de i y j
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covarianza = suma_xy - suma_x * suma_x.T / comunes
+        varianza = suma_xx - suma_x ** 2 / comunes
+        correlacion = covarianza / np.sqrt(varianza * varianza.T)
+
+    correlacion[comunes < minimo_observaciones] = np.nan
+    return np.clip(correlacion, -1.0, 1.0), comunes.astype(np.int64)
+
+def calcular_correlaciones(rendimientos, minimo_observaciones=10, periodos_año=252):
+    """
+    Matrices de correlación (Pearson, Spearman y pareada), covarianza anualizada y fechas comunes
+    `rendimientos` es el DataFrame de matriz_log_rendimientos.
+    Retorna: dict de DataFrames con los tickers como índice y columnas
+    """
+    tickers = list(rendimientos.columns)
+    if len(tickers) == 0:
+        return {}
+
+    valores = rendimientos.to_numpy(dtype='float64')
+    completas = rendimientos.dropna()
+
+    pareada, comunes = correlacion_pareada(valores, minimo_observaciones)
+
+    if len(completas) >= minimo_observaciones:
+        # Pearson y Spearman en un solo producto: columnas [rendimientos, rangos] estandarizadas
+        rangos = completas.rank(method='average').to_numpy()
+        conjunta = _correlacion_completa(np.hstack([completas.to_numpy(), rangos]))
+        k = len(tickers)
+        pearson, spearman = conjunta[:k, :k], conjunta[k:, k:]
+        covarianza = np.cov(completas.to_numpy(), rowvar=False, ddof=1).reshape(k, k) * periodos_año
+    else:
+        pearson = spearman = covarianza = np.full((len(tickers), len(tickers)), np.nan)
+
+    a_tabla = lambda matriz: pd.DataFrame(matriz, index=tickers, columns=tickers)
+    resultado = {
+        'pearson': a_tabla(np.clip(pearson, -1.0, 1.0)),
+        'spearman': a_tabla(np.clip(spearman, -1.0, 1.0)),
+        'pareada': a_tabla(pareada),
+        'covarianza': a_tabla(covarianza),
+        'observaciones': a_tabla(comunes),
+        'fechas_completas': len(completas)
+    }
+    for metodo in METODOS_CORRELACION:
+        matriz = resultado[metodo].to_numpy(copy=True)
+        np.fill_diagonal(matriz, np.where(np.isnan(np.diag(matriz)), np.nan, 1.0))
+        resultado[metodo] = a_tabla(matriz)
+    return resultado
+
+def covarianza_ledoit_wolf(valores):
+    """
+    Covarianza con contracción de Ledoit-Wolf hacia la identidad escalada (mu·I)
+    `valores` no debe tener NaN (fechas x instrumentos). La intensidad óptima se estima de los
+    propios datos, así que la matriz es invertible aunque haya más instrumentos que fechas.
+    Retorna: (covarianza contraída, intensidad entre 0 y 1)
+    """
+    n, k = valores.shape
+    x = valores - valores.mean(axis=0)
+    muestral = x.T @ x / n
+    mu = np.trace(muestral) / k
+
+    # Distancia de la muestral al objetivo y varianza de su estimación (normas de Frobenius / k)
+    delta = ((muestral - mu * np.eye(k)) ** 2).sum() / k
+    cuartas = ((x ** 2).sum(axis=1) ** 2).sum()
+    beta = (cuartas / n - (muestral ** 2).sum()) / (n * k)
+    intensidad = float(np.clip(beta / delta, 0.0, 1.0)) if delta > 0 else 1.0
+
+    contraida = (1 - intensidad) * muestral
+    contraida[np.diag_indices(k)] += intensidad * mu
+    return contraida, intensidad
+
+def correlacion_desde_covarianza(covarianza):
+    """Matriz de correlación de una covarianza"""
+    desviaciones = np.sqrt(np.diag(covarianza))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlacion = covarianza / np.outer(desviaciones, desviaciones)
+    np.fill_diagonal(correlacion, 1.0)
+    return np.clip(correlacion, -1.0, 1.0)
+
+def orden_jerarquico(correlacion):
+    """
+    Orden de las hojas de un clustering jerárquico (enlace promedio) sobre la distancia
+    sqrt((1 - ρ) / 2); los instrumentos que se mueven juntos quedan contiguos en el mapa de calor
+    Cada fusión actualiza las distancias con la fórmula de Lance-Williams, sin recalcular la matriz.
+    Retorna: array de posiciones
+    """
+    k = correlacion.shape[0]
+    distancias = np.sqrt(np.clip((1 - np.asarray(correlacion, dtype='float64')) / 2, 0.0, 1.0))
+    distancias = np.where(np.isnan(distancias), 1.0, distancias)
+    np.fill_diagonal(distancias, np.inf)
+    tamanos = np.ones(k)
+    miembros = [[i] for i in range(k)]
+
+    for _ in range(k - 1):
+        i, j = np.unravel_index(np.argmin(distancias), distancias.shape)
+        i, j = min(i, j), max(i, j)
+        fusion = (tamanos[i] * distancias[i] + tamanos[j] * distancias[j]) / (tamanos[i] + tamanos[j])
+        distancias[i, :] = fusion
+        distancias[:, i] = fusion
+        distancias[i, i] = np.inf
+        distancias[j, :] = np.inf
+        distancias[:, j] = np.inf
+        tamanos[i] += tamanos[j]
+        miembros[i] = miembros[i] + miembros[j]
+        miembros[j] = []
+
+    return np.array(miembros[0] if k else [], dtype=np.int64)
+
+def correlacion_universo(cierres, cobertura_minima=0.9, periodos_año=252):
+    """
+    Correlación de un universo grande (cientos de instrumentos) a partir de la covarianza de
+    Ledoit-Wolf, ordenada por clustering jerárquico
+    Solo entran los instrumentos con cierre en al menos `cobertura_minima` de las fechas y se
+    usan las fechas en que cotizan todos ellos.
+    Retorna: dict con 'correlacion' y 'covarianza' (anualizada) ya ordenadas, 'intensidad' y
+    'fechas', o {} si no hay datos suficientes
+    """
+    if cierres is None or cierres.empty:
+        return {}
+    cobertura = cierres.notna().mean()
+    cierres = cierres.loc[:, cobertura >= cobertura_minima]
+    rendimientos = matriz_log_rendimientos(cierres).dropna()
+    rendimientos = rendimientos.loc[:, rendimientos.std() > 0]
+    if rendimientos.shape[1] < 2 or len(rendimientos) < 10:
+        return {}
+
+    covarianza, intensidad = covarianza_ledoit_wolf(rendimientos.to_numpy(dtype='float64'))
+    correlacion = correlacion_desde_covarianza(covarianza)
+    orden = orden_jerarquico(correlacion)
+    tickers = rendimientos.columns[orden]
+
+    return {
+        'correlacion': pd.DataFrame(correlacion[np.ix_(orden, orden)], index=tickers, columns=tickers),
+        'covarianza': pd.DataFrame(covarianza[np.ix_(orden, orden)] * periodos_año, index=tickers, columns=tickers),
+        'intensidad': intensidad,
+        'fechas': len(rendimientos)
+    }
@@ -7,10 +7,20 @@ import google.generativeai as genai
 from datetime import datetime, timedelta
 import time
 import random
+import re
+import logging
 import numpy as np
 from bs4 import BeautifulSoup
 import concurrent.futures
 from threading import Lock
+from utils.almacen_precios import (
+    obtener_precios, precios_vigentes, incorporar_precios, normalizar_ohlcv, inicio_periodo
+)
+from utils.config import ALMACEN_PRECIOS_CONFIG, LIMITES_PETICIONES
+from utils.limitador_peticiones import obtener_limitador, es_limite_excedido
+from utils.vuelo_unico import vuelo_unico
+from utils.scoring import puntuar_registro, PERFIL_DINAMICO
+from utils.technical_analysis import ultimos_indicadores_panel
 
 @st.cache_data(ttl=3600, show_spinner=False, max_entries=50)
 def obtener_rating_analistas(ticker):
@@ -179,20 +189,67 @@ def _limpiar_formato_wikipedia(texto):
     
     return '\n\n'.join(lineas_limpias)
 
+@vuelo_unico
+def consultar_info_yahoo(ticker, max_intentos=3):
+    """
+    Consulta yf.Ticker(ticker).info respetando el limitador compartido de Yahoo
+    Ante un 'Too Many Requests' pausa a todos los hilos y reintenta. Las consultas simultáneas
+    del mismo ticker (varias sesiones abriendo la misma acción) comparten una sola petición.
+    """
+    limitador = obtener_limitador("yahoo")
+    for intento in range(max_intentos):
+        limitador.adquirir()
+        try:
+            info = yf.Ticker(ticker).info
+            limitador.registrar_exito()
+            return info
+        except Exception as e:
+            if es_limite_excedido(e) and intento < max_intentos - 1:
+                limitador.penalizar()
+                continue
+            raise
+
+def obtener_info_lote(tickers, max_workers=None, progreso=None):
+    """
+    Obtiene .info de muchos símbolos en paralelo dentro del presupuesto del limitador de Yahoo
+    `progreso(completados, total)` se llama desde el hilo que invoca (seguro para Streamlit).
+    Retorna: (dict {ticker: info}, dict {ticker: motivo} con los que fallaron)
+    """
+    max_workers = max_workers or LIMITES_PETICIONES["yahoo"]["concurrencia"]
+    infos = {}
+    errores = {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuros = {executor.submit(consultar_info_yahoo, ticker): ticker for ticker in dict.fromkeys(tickers)}
+        for completados, futuro in enumerate(concurrent.futures.as_completed(futuros), start=1):
+            if progreso is not None:
+                progreso(completados, len(futuros))
+            ticker = futuros[futuro]
+            try:
+                info = futuro.result()
+                if info:
+                    infos[ticker] = info
+                else:
+                    errores[ticker] = "Sin información"
+            except Exception as e:
+                errores[ticker] = str(e)
+
+    return infos, errores
+
 @st.cache_data(ttl=3600, show_spinner=False, max_entries=100)
 def obtener_info_completa(ticker):
     """Obtiene información completa de la acción"""
     try:
-        return yf.Ticker(ticker).info
+        return consultar_info_yahoo(ticker)
     except Exception as e:
         st.error(f"Error obteniendo información de {ticker}: {str(e)}")
         return {}
 
 @st.cache_data(ttl=1800, show_spinner=False, max_entries=200)
 def obtener_datos_accion(ticker, periodo="1y"):
-    """Obtiene datos históricos de la acción"""
+    """Obtiene datos históricos de la acción (almacén local + barras nuevas de Yahoo)"""
     try:
-        return yf.download(ticker, period=periodo, progress=False, interval="1d")
+        return obtener_precios(ticker, periodo=periodo, intervalo="1d")
     except Exception as e:
         st.error(f"Error descargando datos de {ticker}: {str(e)}")
         return pd.DataFrame()
@@ -218,7 +275,7 @@ if __name__ == "__main__":
 def obtener_datos_sp500():
     """Obtiene datos del índice S&P 500"""
     try:
-        return yf.download("^GSPC", period="1y", progress=False, interval="1d")
+        return obtener_precios("^GSPC", periodo="1y", intervalo="1d")
     except Exception as e:
         st.error(f"Error obteniendo datos S&P 500: {str(e)}")
         return pd.DataFrame()
@@ -254,15 +311,113 @@ def obtener_datos_yahoo_directo(ticker):
 def obtener_datos_accion_optimizado(ticker):
     """Obtiene datos de acciones optimizado para paralelismo"""
     try:
-        return yf.download(ticker, period="6mo", progress=False, interval="1d")
+        return obtener_precios(ticker, periodo="6mo", intervalo="1d")
     except:
         return pd.DataFrame()
 
+def descargar_precios_lote(tickers, periodo="1y", intervalo="1d", tamano_lote=None):
+    """
+    Descarga precios de muchos símbolos con llamadas múltiples a yf.download por bloques
+    Los símbolos con histórico vigente en el almacén local no se vuelven a pedir.
+    Retorna: (panel con columnas MultiIndex (campo, ticker) alineado por fecha,
+              dict {ticker: motivo} con los símbolos que no se pudieron obtener)
+    """
+    tamano_lote = tamano_lote or ALMACEN_PRECIOS_CONFIG["tamano_lote"]
+    inicio = inicio_periodo(periodo)
+    tickers = list(dict.fromkeys(tickers))
+
+    series = {}
+    errores = {}
+    pendientes = []
+
+    for ticker in tickers:
+        guardados = precios_vigentes(ticker, intervalo, inicio)
+        if guardados is not None and not guardados.empty:
+            series[ticker] = guardados
+        else:
+            pendientes.append(ticker)
+
+    for i in range(0, len(pendientes), tamano_lote):
+        lote = pendientes[i:i + tamano_lote]
+        captura = _CapturaErroresYahoo(lote)
+        logging.getLogger("yfinance").addHandler(captura)
+        obtener_limitador("yahoo").adquirir()
+        try:
+            if inicio is None:
+                data = yf.download(lote, period="max", interval=intervalo,
+                                   group_by="column", threads=True, progress=False)
+            else:
+                data = yf.download(lote, start=inicio.strftime('%Y-%m-%d'), interval=intervalo,
+                                   group_by="column", threads=True, progress=False)
+        except Exception as e:
+            for ticker in lote:
+                errores[ticker] = str(e)
+            continue
+        finally:
+            logging.getLogger("yfinance").removeHandler(captura)
+
+        errores_yahoo = captura.errores
+
+        for ticker in lote:
+            datos = normalizar_ohlcv(data, ticker) if data is not None and not data.empty else pd.DataFrame()
+            if not datos.empty and 'Close' in datos.columns:
+                datos = datos.dropna(subset=['Close'])
+
+            if datos.empty:
+                errores[ticker] = errores_yahoo.get(ticker, "Sin datos de precios")
+                continue
+
+            series[ticker] = datos
+            try:
+                incorporar_precios(ticker, intervalo, datos, inicio)
+            except Exception:
+                # No poder escribir en disco no invalida los datos descargados
+                pass
+
+    if not series:
+        return pd.DataFrame(), errores
+
+    panel = pd.concat(series, axis=1, names=["Ticker", "Campo"]).swaplevel(axis=1)
+    orden = [t for t in tickers if t in series]
+    panel = panel.reindex(columns=pd.MultiIndex.from_product(
+        [panel.columns.get_level_values(0).unique(), orden], names=["Campo", "Ticker"]))
+    return panel, errores
+
+class _CapturaErroresYahoo(logging.Handler):
+    """
+    Recoge el resumen "['AAPL', 'MSFT']: motivo" que yfinance registra tras una descarga múltiple
+    El logger de yfinance es global: solo se anotan los símbolos del propio bloque para no recoger
+    los fallos de otras descargas simultáneas.
+    """
+
+    _PATRON = re.compile(r"^\[(.+?)\]: (.+)$")
+
+    def __init__(self, tickers):
+        super().__init__(level=logging.ERROR)
+        self.tickers = set(tickers)
+        self.errores = {}
+
+    def emit(self, record):
+        try:
+            coincidencia = self._PATRON.match(record.getMessage().strip())
+        except Exception:
+            return
+        if coincidencia:
+            for ticker in re.findall(r"'([^']+)'", coincidencia.group(1)):
+                if ticker in self.tickers:
+                    self.errores[ticker] = coincidencia.group(2)
+
+def extraer_ticker_lote(panel, ticker):
+    """Extrae del panel de descargar_precios_lote el OHLCV de un símbolo con columnas planas"""
+    if panel is None or panel.empty or ticker not in panel.columns.get_level_values(1):
+        return pd.DataFrame()
+    return panel.xs(ticker, axis=1, level=1).dropna(how="all")
+
 @st.cache_data(ttl=7200, show_spinner=False, max_entries=50)
 def obtener_info_completa_optimizada(ticker):
     """Obtiene información completa con caching extendido"""
     try:
-        return yf.Ticker(ticker).info
+        return consultar_info_yahoo(ticker)
     except:
         return {}
 
@@ -278,9 +433,22 @@ def precalcular_datos_screener():
         'PEP', 'T', 'ABT', 'TMO', 'COST', 'AVGO', 'TXN', 'LLY', 'HON', 'AMGN'
     ]
     
+    infos, _ = obtener_info_lote(SP500_SYMBOLS[:30])
+    
+    # RSI real de los 30 símbolos en una sola pasada sobre el panel de cierres
+    panel_precios, _ = descargar_precios_lote(SP500_SYMBOLS[:30], periodo="6mo")
+    indicadores = pd.DataFrame()
+    if not panel_precios.empty:
+        indicadores = ultimos_indicadores_panel(panel_precios['Close'])
+    
     for simbolo in SP500_SYMBOLS[:30]:
         try:
-            datos = obtener_datos_completos_yfinance(simbolo)
+            if simbolo not in infos:
+                continue
+            datos = obtener_datos_completos_yfinance(
+                simbolo, infos[simbolo],
+                indicadores.loc[simbolo] if simbolo in indicadores.index else None
+            )
             if datos and datos.get('Empresa Valida'):
                 scoring = calcular_scoring_dinamico(datos)
                 datos['Score'] = scoring
@@ -290,168 +458,55 @@ def precalcular_datos_screener():
     
     return datos_precalculados
 
-def obtener_datos_completos_yfinance(simbolo):
-    """Obtiene datos fundamentales - CON PROTECCIÓN ANTI-RATE LIMITING"""
+def obtener_datos_completos_yfinance(simbolo, info=None, indicadores=None):
+    """
+    Obtiene datos fundamentales - el ritmo de peticiones lo controla el limitador compartido
+    `indicadores`: últimos valores técnicos del símbolo (ultimos_indicadores_panel); sin ellos RSI = 50
+    """
     try:
-        # ✅ PAUSA ALEATORIA PARA EVITAR RATE LIMITING
-        time.sleep(random.uniform(0.5, 1.5))
+        if info is None:
+            info = consultar_info_yahoo(simbolo)
         
-        ticker = yf.Ticker(simbolo)
+        # Verificar datos válidos
+        if (not info or 'currentPrice' not in info or 
+            info.get('currentPrice') is None or info.get('currentPrice') == 0):
+            return None
         
-        # ✅ INTENTAR MÚLTIPLES VECES CON RECUPERACIÓN DE ERRORES
-        max_intentos = 2
-        for intento in range(max_intentos):
-            try:
-                info = ticker.info
-                
-                # Verificar datos válidos
-                if (not info or 'currentPrice' not in info or 
-                    info.get('currentPrice') is None or info.get('currentPrice') == 0):
-                    if intento < max_intentos - 1:
-                        time.sleep(1)
-                        continue
-                    return None
-                
-                # ✅ DATOS MÍNIMOS PARA EVITAR TIMEouts
-                try:
-                    datos_historicos = yf.download(simbolo, period="1mo", interval="1d", 
-                                                  progress=False, timeout=5)
-                except:
-                    datos_historicos = pd.DataFrame()
-                
-                # Construir datos
-                datos = {
-                    'Símbolo': simbolo,
-                    'Nombre': info.get('longName', simbolo),
-                    'Sector': info.get('sector', 'N/A'),
-                    'Industria': info.get('industry', 'N/A'),
-                    'Market Cap': info.get('marketCap', 0),
-                    'P/E': info.get('trailingPE', 0),
-                    'Precio Actual': info.get('currentPrice', 0),
-                    'Cambio %': info.get('regularMarketChangePercent', 0),
-                    'Volumen': info.get('volume', 0),
-                    'ROE': info.get('returnOnEquity', 0),
-                    'Margen Beneficio': info.get('profitMargins', 0),
-                    'Deuda/Equity': info.get('debtToEquity', 0),
-                    'Crecimiento Ingresos': info.get('revenueGrowth', 0),
-                    'Beta': info.get('beta', 1),
-                    'RSI': 50,
-                    'Empresa Valida': True
-                }
-                
-                return datos
-                
-            except Exception as e:
-                if "Too Many Requests" in str(e):
-                    wait_time = (intento + 1) * 3
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    if intento < max_intentos - 1:
-                        time.sleep(1)
-                        continue
-                    return None
-                    
-        return None
+        # Construir datos
+        datos = {
+            'Símbolo': simbolo,
+            'Nombre': info.get('longName', simbolo),
+            'Sector': info.get('sector', 'N/A'),
+            'Industria': info.get('industry', 'N/A'),
+            'Market Cap': info.get('marketCap', 0),
+            'P/E': info.get('trailingPE', 0),
+            'Precio Actual': info.get('currentPrice', 0),
+            'Cambio %': info.get('regularMarketChangePercent', 0),
+            'Volumen': info.get('volume', 0),
+            'ROE': info.get('returnOnEquity', 0),
+            'Margen Beneficio': info.get('profitMargins', 0),
+            'Deuda/Equity': info.get('debtToEquity', 0),
+            'Crecimiento Ingresos': info.get('revenueGrowth', 0),
+            'Beta': info.get('beta', 1),
+            'RSI': _rsi_indicadores(indicadores),
+            'Empresa Valida': True
+        }
+        
+        return datos
         
     except Exception as e:
         return None
 
+def _rsi_indicadores(indicadores):
+    """RSI de los indicadores calculados (50 si no hay datos suficientes)"""
+    if indicadores is None:
+        return 50
+    rsi = indicadores.get('RSI')
+    return 50 if rsi is None or pd.isna(rsi) else float(rsi)
+
 def calcular_scoring_dinamico(datos):
-    """Calcula scoring basado en datos fundamentales"""
-    if not datos:
-        return 0
-    
-    score = 0
-    max_score = 100
-    
-    try:
-        # P/E Ratio (20 puntos)
-        pe = datos.get('P/E', 0)
-        if pe and pe > 0:
-            if pe < 15:
-                score += 20
-            elif pe < 25:
-                score += 15
-            elif pe < 35:
-                score += 10
-            else:
-                score += 5
-        
-        # ROE (20 puntos)
-        roe = datos.get('ROE', 0)
-        if roe and roe > 0:
-            if roe > 0.20:
-                score += 20
-            elif roe > 0.15:
-                score += 16
-            elif roe > 0.10:
-                score += 12
-            elif roe > 0.05:
-                score += 8
-            else:
-                score += 4
-        
-        # Margen Beneficio (15 puntos)
-        margen = datos.get('Margen Beneficio', 0)
-        if margen and margen > 0:
-            if margen > 0.20:
-                score += 15
-            elif margen > 0.15:
-                score += 12
-            elif margen > 0.10:
-                score += 9
-            elif margen > 0.05:
-                score += 6
-            else:
-                score += 3
-        
-        # Deuda/Equity (15 puntos)
-        deuda_eq = datos.get('Deuda/Equity', 0)
-        if deuda_eq and deuda_eq >= 0:
-            if deuda_eq < 0.5:
-                score += 15
-            elif deuda_eq < 1.0:
-                score += 12
-            elif deuda_eq < 1.5:
-                score += 9
-            elif deuda_eq < 2.0:
-                score += 6
-            else:
-                score += 3
-        
-        # Crecimiento Ingresos (20 puntos)
-        crecimiento = datos.get('Crecimiento Ingresos', 0)
-        if crecimiento:
-            if crecimiento > 0.20:
-                score += 20
-            elif crecimiento > 0.15:
-                score += 16
-            elif crecimiento > 0.10:
-                score += 12
-            elif crecimiento > 0.05:
-                score += 8
-            elif crecimiento > 0:
-                score += 4
-        
-        # Beta (10 puntos)
-        beta = datos.get('Beta', 1)
-        if beta and beta > 0:
-            if beta < 0.8:
-                score += 10
-            elif beta < 1.2:
-                score += 8
-            elif beta < 1.5:
-                score += 6
-            elif beta < 2.0:
-                score += 4
-            else:
-                score += 2
-        
-        return min(score, max_score)
-        
-    except Exception as e:
-        return 0
+    """Calcula scoring basado en datos fundamentales (motor vectorizado de utils.scoring)"""
+    return puntuar_registro(datos, PERFIL_DINAMICO)[0]
 
 @st.cache_data(ttl=1800, show_spinner=False, max_entries=50)
 def obtener_datos_tiempo_real(ticker):
@@ -0,0 +1,151 @@
+# utils/estres.py
+"""
+Reproducción de eventos de estrés históricos sobre un panel de cierres
+Las ventanas de todos los eventos se recogen en un único array (eventos x días x tickers)
+rellenado con NaN, así que rendimiento, drawdown pico-valle y su duración se calculan para
+todos los tickers y todos los eventos en una sola pasada de NumPy. Las carteras se valoran
+como compra-y-mantén desde el primer día del evento con un producto matricial de pesos.
+"""
+
+import numpy as np
+import pandas as pd
+
+from utils.config import EVENTOS_ESTRES
+
+# Columnas de las tablas de resultados
+COLUMNAS_ESTRES = ['Rendimiento', 'Drawdown Máximo', 'Días Pico a Valle', 'Fecha Pico', 'Fecha Valle']
+
+def _ventanas(indice, eventos):
+    """
+    Posiciones de las filas de cada evento en `indice`, rellenadas con -1 hasta la ventana más larga
+    Retorna: array (eventos x días) de posiciones
+    """
+    fechas = pd.DatetimeIndex(indice)
+    posiciones = []
+    for evento in eventos:
+        dentro = (fechas >= pd.Timestamp(evento['inicio'])) & (fechas <= pd.Timestamp(evento['fin']))
+        posiciones.append(np.flatnonzero(dentro))
+
+    largo = max([len(filas) for filas in posiciones] + [1])
+    ventanas = np.full((len(eventos), largo), -1, dtype=np.int64)
+    for i, filas in enumerate(posiciones):
+        ventanas[i, :len(filas)] = filas
+    return ventanas
+
+def _recoger(valores, ventanas):
+    """Array (eventos x días x columnas) con las filas de cada ventana (NaN en el relleno)"""
+    con_relleno = np.vstack([valores, np.full((1, valores.shape[1]), np.nan)])
+    return con_relleno[ventanas]
+
+def _metricas_ventanas(precios, ventanas, indice):
+    """
+    Métricas de estrés sobre precios agrupados por evento (eventos x días x columnas)
+    Retorna: dict de arrays (eventos x columnas)
+    """
+    eventos, dias, columnas = precios.shape
+    validos = ~np.isnan(precios)
+    hay_datos = validos.sum(axis=1) >= 2
+
+    # Primer y último precio válido de cada ventana
+    primero = np.argmax(validos, axis=1)
+    ultimo = dias - 1 - np.argmax(validos[:, ::-1], axis=1)
+    e, c = np.meshgrid(np.arange(eventos), np.arange(columnas), indexing='ij')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rendimiento = precios[e, ultimo, c] / precios[e, primero, c] - 1
+
+        # Drawdown pico-valle: máximo acumulado que ignora los NaN
+        pico = np.fmax.accumulate(precios, axis=1)
+        drawdown = precios / pico - 1
+    fila_valle = np.argmin(np.where(validos, drawdown, np.inf), axis=1)
+    drawdown_maximo = drawdown[e, fila_valle, c]
+
+    # Último día en que se marcó el máximo antes del valle
+    dia = np.arange(dias)[None, :, None]
+    fila_pico = np.maximum.accumulate(np.where(validos & (precios >= pico), dia, -1), axis=1)[e, fila_valle, c]
+    fila_pico = np.maximum(fila_pico, 0)
+
+    fechas = pd.DatetimeIndex(indice).to_numpy()
+    posicion_pico = ventanas[e, fila_pico]
+    posicion_valle = ventanas[e, fila_valle]
+
+    return {
+        'Rendimiento': np.where(hay_datos, rendimiento, np.nan),
+        'Drawdown Máximo': np.where(hay_datos, drawdown_maximo, np.nan),
+        'Días Pico a Valle': np.where(hay_datos, (fila_valle - fila_pico).astype('float64'), np.nan),
+        'Fecha Pico': np.where(hay_datos, fechas[np.maximum(posicion_pico, 0)], np.datetime64('NaT')),
+        'Fecha Valle': np.where(hay_datos, fechas[np.maximum(posicion_valle, 0)], np.datetime64('NaT'))
+    }
+
+def _a_tabla(metricas, eventos, nombres, etiqueta):
+    """Tabla larga indexada por (evento, nombre) a partir de arrays (eventos x columnas)"""
+    indice = pd.MultiIndex.from_product([[evento['id'] for evento in eventos], list(nombres)],
+                                        names=['Evento', etiqueta])
+    return pd.DataFrame({columna: metricas[columna].reshape(-1) for columna in COLUMNAS_ESTRES}, index=indice)
+
+def reproducir_eventos(cierres, eventos=None):
+    """
+    Rendimiento, drawdown pico-valle y su duración de cada ticker del panel en cada evento
+    Retorna: DataFrame indexado por (Evento, Símbolo)
+    """
+    eventos = eventos or EVENTOS_ESTRES
+    if cierres is None or cierres.empty:
+        return pd.DataFrame(columns=COLUMNAS_ESTRES)
+
+    ventanas = _ventanas(cierres.index, eventos)
+    precios = _recoger(cierres.to_numpy(dtype='float64'), ventanas)
+    return _a_tabla(_metricas_ventanas(precios, ventanas, cierres.index), eventos, cierres.columns, 'Símbolo')
+
+def reproducir_carteras(cierres, carteras, eventos=None):
+    """
+    Las mismas métricas para carteras equiponderadas ({nombre: [tickers]}) o con pesos
+    ({nombre: {ticker: peso}}) compradas el primer día del evento
+    Los tickers sin precio ese día se excluyen y el resto de pesos se reescala.
+    Retorna: DataFrame indexado por (Evento, Cartera)
+    """
+    eventos = eventos or EVENTOS_ESTRES
+    if cierres is None or cierres.empty or not carteras:
+        return pd.DataFrame(columns=COLUMNAS_ESTRES)
+
+    columnas = {ticker: i for i, ticker in enumerate(cierres.columns)}
+    pesos = np.zeros((len(columnas), len(carteras)))
+    for j, composicion in enumerate(carteras.values()):
+        if not isinstance(composicion, dict):
+            composicion = {ticker: 1.0 for ticker in composicion}
+        for ticker, peso in composicion.items():
+            if ticker in columnas:
+                pesos[columnas[ticker], j] += peso
+
+    ventanas = _ventanas(cierres.index, eventos)
+    precios = _recoger(cierres.to_numpy(dtype='float64'), ventanas)
+
+    # Precios normalizados al primer día del evento, arrastrando el último dato conocido
+    dias = np.arange(precios.shape[1])[None, :, None]
+    ultimo_valido = np.maximum.accumulate(np.where(~np.isnan(precios), dias, 0), axis=1)
+    arrastrados = np.take_along_axis(precios, ultimo_valido, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        normalizados = arrastrados / arrastrados[:, :1, :]
+    con_inicio = ~np.isnan(normalizados[:, 0, :])
+
+    # Pesos por evento: solo tickers con precio el primer día, reescalados a 1
+    pesos_evento = np.where(con_inicio[:, :, None], pesos[None, :, :], 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pesos_evento = pesos_evento / pesos_evento.sum(axis=1, keepdims=True)
+    valor = np.einsum('edk,ekc->edc', np.nan_to_num(normalizados), np.nan_to_num(pesos_evento))
+    valor[ventanas < 0] = np.nan
+    # Carteras sin ningún ticker con precio al inicio del evento
+    sin_datos = ~np.isfinite(pesos_evento).all(axis=1)
+    valor = np.where(sin_datos[:, None, :], np.nan, valor)
+
+    return _a_tabla(_metricas_ventanas(valor, ventanas, cierres.index), eventos, carteras.keys(), 'Cartera')
+
+def construir_tabla_estres(cierres, carteras=None, eventos=None):
+    """
+    Tabla de consulta con los resultados de todos los tickers y carteras en todos los eventos
+    Retorna: dict con 'eventos', 'acciones' y 'carteras'
+    """
+    eventos = eventos or EVENTOS_ESTRES
+    return {
+        'eventos': eventos,
+        'acciones': reproducir_eventos(cierres, eventos),
+        'carteras': reproducir_carteras(cierres, carteras, eventos)
+    }
@@ -0,0 +1,522 @@
+# utils/indicadores_incrementales.py
+"""
+Motor incremental de indicadores técnicos
+Guarda entre llamadas las sumas móviles, los estados de las EMA y las medias de Wilder, así que
+añadir una barra nueva (diaria o intradía) cuesta tiempo constante. El estado se serializa en JSON
+junto al histórico del almacén de precios y se reconstruye si el histórico cambia de versión; la
+serie de indicadores va en un Parquet que solo se reescribe cada _FILAS_COLA barras nuevas (las
+intermedias se añaden al JSON) y se conserva en memoria mientras el histórico no cambie.
+Los valores coinciden con los de utils/technical_analysis (RSI por media simple, EMA con adjust=False,
+desviación estándar muestral en las bandas de Bollinger).
+"""
+
+import os
+import json
+import logging
+import math
+from collections import deque
+from threading import Lock
+
+import pandas as pd
+
+from utils.config import PARAMETROS_TECNICOS
+from utils.almacen_precios import leer_precios, leer_meta_precios, ruta_complemento
+
+_log = logging.getLogger(__name__)
+
+# Cada cuántas barras se recalculan las sumas móviles desde cero para no acumular error de redondeo
+_BARRAS_RESINCRONIZAR = 1000
+
+# Filas nuevas de la serie que se guardan en el JSON del estado antes de reescribir el Parquet
+_FILAS_COLA = 250
+
+# Motores y series en memoria por (ticker, intervalo), con la clave de metadatos del histórico
+_MAX_MEMORIA = 64
+_memoria = {}
+
+_candados = {}
+_candado_global = Lock()
+
+class MotorIndicadores:
+    """
+    Estado incremental de RSI, MACD, Bandas de Bollinger, SMA y EMA
+    `agregar(cierre, fecha)` procesa una barra; si la fecha coincide con la última se trata como
+    una revisión de esa barra (vela intradía todavía abierta) y se recalcula sin duplicarla.
+    `suavizado_rsi`: 'simple' (media móvil, como _calcular_rsi) o 'wilder'.
+    """
+
+    def __init__(self, parametros=None, suavizado_rsi='simple'):
+        self.parametros = dict(PARAMETROS_TECNICOS, **(parametros or {}))
+        self.suavizado_rsi = suavizado_rsi
+        p = self.parametros
+        self._ventanas_sma = sorted({p['sma_short'], p['sma_medium'], p['sma_long']})
+        self._ventanas = sorted(set(self._ventanas_sma) | {p['bb_period']})
+        self._alfas = {
+            'rapida': 2 / (p['macd_fast'] + 1),
+            'lenta': 2 / (p['macd_slow'] + 1),
+            'senal': 2 / (p['macd_signal'] + 1)
+        }
+        self._reiniciar()
+
+    def _reiniciar(self):
+        """Estado vacío (ninguna barra procesada)"""
+        self.barras = 0
+        self.ultima_fecha = None
+        self.ultimo_cierre = None
+        self._cierres = deque(maxlen=max(self._ventanas))
+        self._sumas = {ventana: 0.0 for ventana in self._ventanas}
+        self._ganancias = deque(maxlen=self.parametros['rsi_period'])
+        self._perdidas = deque(maxlen=self.parametros['rsi_period'])
+        self._suma_ganancias = 0.0
+        self._suma_perdidas = 0.0
+        self._media_ganancias = None
+        self._media_perdidas = None
+        self._referencia_bb = None
+        self._suma_bb = 0.0
+        self._suma_cuadrados_bb = 0.0
+        self._iguales = 0
+        self._ema_rapida = None
+        self._ema_lenta = None
+        self._senal = None
+        self._previo = None
+
+    def agregar(self, cierre, fecha=None):
+        """
+        Procesa una barra en tiempo constante y devuelve los indicadores de esa barra
+        Barras sin cierre (NaN) no modifican el estado.
+        """
+        fecha = _a_iso(fecha)
+        if fecha is not None and self.ultima_fecha is not None:
+            if fecha == self.ultima_fecha and self._previo is not None:
+                # Revisión de la última barra: se parte del estado anterior a ella
+                self._restaurar(self._previo)
+            elif fecha < self.ultima_fecha:
+                raise ValueError(f"Barra anterior a la última procesada: {fecha}")
+
+        if cierre is None or math.isnan(cierre):
+            return self.valores()
+
+        previo = self._estado()
+        self._aplicar(float(cierre))
+        self._previo = previo
+        self.ultima_fecha = fecha if fecha is not None else self.ultima_fecha
+        return self.valores()
+
+    def procesar(self, datos):
+        """
+        Procesa en orden todas las barras de un DataFrame con columna 'Close'
+        Retorna: DataFrame de indicadores con el mismo índice
+        """
+        filas = [self.agregar(cierre, fecha) for fecha, cierre in datos['Close'].items()]
+        return pd.DataFrame(filas, index=datos.index, columns=self.columnas())
+
+    def columnas(self):
+        """Nombres de las columnas que produce el motor (los de calcular_indicadores_tecnicos)"""
+        p = self.parametros
+        return (['RSI', 'MACD', 'MACD_Signal', 'MACD_Histogram',
+                 'BB_Middle', 'BB_Upper', 'BB_Lower', 'BB_Width']
+                + [f'SMA_{ventana}' for ventana in self._ventanas_sma]
+                + [f"EMA_{p['macd_fast']}", f"EMA_{p['macd_slow']}"])
+
+    def valores(self):
+        """Indicadores de la última barra procesada (NaN mientras no haya barras suficientes)"""
+        p = self.parametros
+        nan = float('nan')
+        llenas = len(self._cierres)
+
+        valores = {'RSI': self._rsi()}
+
+        if self._ema_rapida is None:
+            valores.update(MACD=nan, MACD_Signal=nan, MACD_Histogram=nan)
+        else:
+            macd = self._ema_rapida - self._ema_lenta
+            valores.update(MACD=macd, MACD_Signal=self._senal, MACD_Histogram=macd - self._senal)
+
+        n = p['bb_period']
+        if self.barras >= n and llenas >= n and n > 1:
+            media = self._sumas[n] / n
+            varianza = (self._suma_cuadrados_bb - self._suma_bb ** 2 / n) / (n - 1)
+            if self._iguales >= n:
+                # Ventana plana: la varianza es exactamente 0 aunque las sumas arrastren redondeo
+                varianza = 0.0
+            desviacion = math.sqrt(max(varianza, 0.0))
+            superior = media + desviacion * p['bb_std']
+            inferior = media - desviacion * p['bb_std']
+            ancho = (superior - inferior) / media if media != 0 else nan
+            valores.update(BB_Middle=media, BB_Upper=superior, BB_Lower=inferior, BB_Width=ancho)
+        else:
+            valores.update(BB_Middle=nan, BB_Upper=nan, BB_Lower=nan, BB_Width=nan)
+
+        for ventana in self._ventanas_sma:
+            valores[f'SMA_{ventana}'] = self._sumas[ventana] / ventana if self.barras >= ventana else nan
+
+        valores[f"EMA_{p['macd_fast']}"] = nan if self._ema_rapida is None else self._ema_rapida
+        valores[f"EMA_{p['macd_slow']}"] = nan if self._ema_lenta is None else self._ema_lenta
+        return valores
+
+    def _aplicar(self, cierre):
+        """Actualiza todas las sumas y estados con un nuevo cierre"""
+        n_rsi = self.parametros['rsi_period']
+
+        # RSI: la primera barra cuenta como variación 0, igual que delta.where(delta > 0, 0)
+        delta = 0.0 if self.ultimo_cierre is None else cierre - self.ultimo_cierre
+        ganancia = delta if delta > 0 else 0.0
+        perdida = -delta if delta < 0 else 0.0
+        if len(self._ganancias) == n_rsi:
+            self._suma_ganancias -= self._ganancias[0]
+            self._suma_perdidas -= self._perdidas[0]
+        self._ganancias.append(ganancia)
+        self._perdidas.append(perdida)
+        self._suma_ganancias += ganancia
+        self._suma_perdidas += perdida
+
+        # Wilder: se inicia con la media simple de las primeras n variaciones reales
+        if self.barras == n_rsi:
+            self._media_ganancias = self._suma_ganancias / n_rsi
+            self._media_perdidas = self._suma_perdidas / n_rsi
+        elif self.barras > n_rsi:
+            self._media_ganancias = (self._media_ganancias * (n_rsi - 1) + ganancia) / n_rsi
+            self._media_perdidas = (self._media_perdidas * (n_rsi - 1) + perdida) / n_rsi
+
+        # Sumas móviles de las SMA y de las bandas (desplazadas a una referencia para la varianza)
+        if self._referencia_bb is None:
+            self._referencia_bb = cierre
+        n_bb = self.parametros['bb_period']
+        for ventana in self._ventanas:
+            if len(self._cierres) >= ventana:
+                saliente = self._cierres[-ventana]
+                self._sumas[ventana] -= saliente
+                if ventana == n_bb:
+                    self._suma_bb -= saliente - self._referencia_bb
+                    self._suma_cuadrados_bb -= (saliente - self._referencia_bb) ** 2
+            self._sumas[ventana] += cierre
+        self._suma_bb += cierre - self._referencia_bb
+        self._suma_cuadrados_bb += (cierre - self._referencia_bb) ** 2
+        self._iguales = self._iguales + 1 if cierre == self.ultimo_cierre else 1
+        self._cierres.append(cierre)
+
+        # EMA y MACD (adjust=False: la primera barra inicializa la media)
+        if self._ema_rapida is None:
+            self._ema_rapida = self._ema_lenta = cierre
+            self._senal = 0.0
+        else:
+            a_rapida, a_lenta = self._alfas['rapida'], self._alfas['lenta']
+            self._ema_rapida = (1 - a_rapida) * self._ema_rapida + a_rapida * cierre
+            self._ema_lenta = (1 - a_lenta) * self._ema_lenta + a_lenta * cierre
+            a_senal = self._alfas['senal']
+            self._senal = (1 - a_senal) * self._senal + a_senal * (self._ema_rapida - self._ema_lenta)
+
+        self.ultimo_cierre = cierre
+        self.barras += 1
+        if self.barras % _BARRAS_RESINCRONIZAR == 0:
+            self._resincronizar()
+
+    def _rsi(self):
+        """RSI de la última barra según el suavizado elegido"""
+        n = self.parametros['rsi_period']
+        if self.suavizado_rsi == 'wilder':
+            if self._media_ganancias is None:
+                return float('nan')
+            ganancia, perdida = self._media_ganancias, self._media_perdidas
+        else:
+            if len(self._ganancias) < n:
+                return float('nan')
+            # Las ventanas sin subidas o sin bajadas se detectan sin depender del redondeo de las sumas
+            ganancia = max(self._suma_ganancias, 0.0) / n if any(self._ganancias) else 0.0
+            perdida = max(self._suma_perdidas, 0.0) / n if any(self._perdidas) else 0.0
+
+        if perdida == 0:
+            return 100.0 if ganancia > 0 else float('nan')
+        return 100 - (100 / (1 + ganancia / perdida))
+
+    def _resincronizar(self):
+        """Recalcula las sumas móviles a partir de las ventanas guardadas"""
+        cierres = list(self._cierres)
+        for ventana in self._ventanas:
+            self._sumas[ventana] = math.fsum(cierres[-ventana:])
+        self._suma_ganancias = math.fsum(self._ganancias)
+        self._suma_perdidas = math.fsum(self._perdidas)
+
+        n_bb = self.parametros['bb_period']
+        ventana_bb = cierres[-n_bb:]
+        self._referencia_bb = ventana_bb[-1]
+        self._suma_bb = math.fsum(c - self._referencia_bb for c in ventana_bb)
+        self._suma_cuadrados_bb = math.fsum((c - self._referencia_bb) ** 2 for c in ventana_bb)
+
+    def _estado(self):
+        """Estado serializable sin la barra previa"""
+        return {
+            'barras': self.barras,
+            'ultima_fecha': self.ultima_fecha,
+            'ultimo_cierre': self.ultimo_cierre,
+            'cierres': list(self._cierres),
+            'sumas': {str(ventana): suma for ventana, suma in self._sumas.items()},
+            'ganancias': list(self._ganancias),
+            'perdidas': list(self._perdidas),
+            'suma_ganancias': self._suma_ganancias,
+            'suma_perdidas': self._suma_perdidas,
+            'media_ganancias': self._media_ganancias,
+            'media_perdidas': self._media_perdidas,
+            'referencia_bb': self._referencia_bb,
+            'suma_bb': self._suma_bb,
+            'suma_cuadrados_bb': self._suma_cuadrados_bb,
+            'iguales': self._iguales,
+            'ema_rapida': self._ema_rapida,
+            'ema_lenta': self._ema_lenta,
+            'senal': self._senal
+        }
+
+    def _restaurar(self, estado):
+        """Carga un estado producido por _estado"""
+        self.barras = estado['barras']
+        self.ultima_fecha = estado['ultima_fecha']
+        self.ultimo_cierre = estado['ultimo_cierre']
+        self._cierres = deque(estado['cierres'], maxlen=max(self._ventanas))
+        self._sumas = {int(ventana): suma for ventana, suma in estado['sumas'].items()}
+        self._ganancias = deque(estado['ganancias'], maxlen=self.parametros['rsi_period'])
+        self._perdidas = deque(estado['perdidas'], maxlen=self.parametros['rsi_period'])
+        self._suma_ganancias = estado['suma_ganancias']
+        self._suma_perdidas = estado['suma_perdidas']
+        self._media_ganancias = estado['media_ganancias']
+        self._media_perdidas = estado['media_perdidas']
+        self._referencia_bb = estado['referencia_bb']
+        self._suma_bb = estado['suma_bb']
+        self._suma_cuadrados_bb = estado['suma_cuadrados_bb']
+        self._iguales = estado['iguales']
+        self._ema_rapida = estado['ema_rapida']
+        self._ema_lenta = estado['ema_lenta']
+        self._senal = estado['senal']
+
+    def a_dict(self):
+        """Estado completo (incluida la barra previa para poder revisar la última) en un dict JSON"""
+        return {
+            'parametros': self.parametros,
+            'suavizado_rsi': self.suavizado_rsi,
+            'estado': self._estado(),
+            'previo': self._previo
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        """Reconstruye un motor serializado con a_dict"""
+        motor = cls(datos['parametros'], datos.get('suavizado_rsi', 'simple'))
+        motor._restaurar(datos['estado'])
+        motor._previo = datos.get('previo')
+        return motor
+
+def indicadores_almacenados(ticker, datos, intervalo="1d"):
+    """
+    Indicadores técnicos de `datos` (recorte de obtener_precios) usando el estado guardado
+    Solo se procesan las barras del almacén posteriores a la última vista (y se revisa esa última);
+    el estado y la serie de indicadores se guardan junto al histórico del ticker.
+    Si el histórico no está en el almacén se calcula todo con un motor nuevo sin guardar nada.
+    """
+    if datos is None or datos.empty or 'Close' not in datos.columns:
+        return datos
+
+    _, _, serie = _sincronizar(ticker, datos, intervalo)
+    return datos.join(serie.reindex(datos.index))
+
+def ultimos_indicadores_almacenados(ticker, datos, intervalo="1d"):
+    """
+    Indicadores de la última barra de `datos` a partir del estado guardado (tiempo constante
+    cuando el estado ya está al día). Retorna: Series con 'Close' y las columnas del motor.
+    """
+    if datos is None or datos.empty or 'Close' not in datos.columns:
+        return pd.Series(dtype='float64')
+
+    ultima_fecha, valores, serie = _sincronizar(ticker, datos, intervalo)
+    if ultima_fecha == _a_iso(datos.index[-1]):
+        ultimo = pd.Series(valores)
+    else:
+        ultimo = serie.reindex(datos.index).iloc[-1]
+    return pd.concat([pd.Series({'Close': float(datos['Close'].iloc[-1])}), ultimo])
+
+def _sincronizar(ticker, datos, intervalo):
+    """
+    Pone al día el motor con las barras nuevas del almacén
+    El motor y la serie se conservan en memoria mientras no cambien los metadatos del histórico
+    (se reescriben con cada barra nueva o reajuste), así que una consulta sin barras nuevas no lee
+    ningún Parquet. Las barras nuevas se toman de `datos` si cubre el final del histórico y la
+    ventana del motor; si no, se lee el histórico guardado.
+    Retorna: (última fecha procesada, indicadores de esa barra, serie de todo el histórico guardado)
+    """
+    clave_ticker = (ticker.upper(), intervalo)
+    with _candado_para(ticker, intervalo):
+        meta = leer_meta_precios(ticker, intervalo)
+        clave_meta = (meta.get("version"), meta.get("desde"), meta.get("actualizado"))
+        memoria = _memoria.get(clave_ticker)
+
+        if memoria is None or memoria["clave"] != clave_meta:
+            if memoria is not None and memoria["clave"][:2] == clave_meta[:2]:
+                # Mismo histórico con barras nuevas: se sigue desde lo que hay en memoria
+                motor, serie, en_parquet = memoria["motor"], memoria["serie"], memoria["en_parquet"]
+            else:
+                motor, serie, en_parquet = cargar_indicadores(ticker, intervalo, meta)
+            memoria = _poner_al_dia(ticker, intervalo, meta, datos, motor, serie, en_parquet)
+            if memoria is not None:
+                memoria["clave"] = clave_meta
+                _memoria.pop(clave_ticker, None)
+                _memoria[clave_ticker] = memoria
+                while len(_memoria) > _MAX_MEMORIA:
+                    _memoria.pop(next(iter(_memoria)))
+
+        if memoria is None or not datos.index.isin(memoria["serie"].index).all():
+            # Datos que no salen del almacén: se calculan aparte sin guardar nada
+            motor = MotorIndicadores()
+            serie = motor.procesar(datos)
+            return motor.ultima_fecha, motor.valores(), serie
+
+        motor = memoria["motor"]
+        return motor.ultima_fecha, motor.valores(), memoria["serie"]
+
+def _poner_al_dia(ticker, intervalo, meta, datos, motor, serie, en_parquet):
+    """
+    Procesa las barras posteriores a la última vista y guarda el resultado
+    Retorna: dict {motor, serie, en_parquet} o None si el ticker no está en el almacén
+    """
+    ultima_guardada = meta.get("ultima_fecha")
+    desde = None
+    fuente = datos
+    if ultima_guardada is not None and _a_iso(datos.index[-1]) == ultima_guardada:
+        desde = _posicion_reanudar(motor, serie, datos)
+    if desde is None:
+        historico, meta = leer_precios(ticker, intervalo)
+        if historico is None or historico.empty:
+            return None
+        fuente = historico
+        desde = _posicion_reanudar(motor, serie, historico)
+
+    if desde is None:
+        motor = MotorIndicadores()
+        serie = motor.procesar(fuente)
+        en_parquet = len(serie) if guardar_indicadores(ticker, intervalo, motor, serie, meta) else 0
+    elif desde < len(fuente):
+        nuevos = motor.procesar(fuente.iloc[desde:])
+        serie = pd.concat([serie[serie.index < nuevos.index[0]], nuevos])
+        # La última fila del Parquet puede haberse revisado: la cola empieza en ella
+        cola = serie.iloc[max(en_parquet - 1, 0):]
+        if len(cola) > _FILAS_COLA or en_parquet == 0:
+            if guardar_indicadores(ticker, intervalo, motor, serie, meta):
+                en_parquet = len(serie)
+        else:
+            guardar_indicadores(ticker, intervalo, motor, serie, meta, cola=cola, en_parquet=en_parquet)
+
+    return {"motor": motor, "serie": serie, "en_parquet": en_parquet}
+
+def cargar_indicadores(ticker, intervalo, meta):
+    """
+    Lee el motor y la serie de indicadores guardados (Parquet más la cola de filas del JSON)
+    Retorna: (motor, serie, filas de la serie que están en el Parquet), o (None, None, 0) si no
+    existen o corresponden a otra versión del histórico.
+    """
+    ruta_estado = ruta_complemento(ticker, intervalo, "indicadores.json")
+    ruta_serie = ruta_complemento(ticker, intervalo, "indicadores.parquet")
+    if not os.path.exists(ruta_estado) or not os.path.exists(ruta_serie):
+        return None, None, 0
+
+    try:
+        with open(ruta_estado, "r", encoding="utf-8") as f:
+            guardado = json.load(f)
+        if guardado.get("version") != meta.get("version") or guardado.get("desde") != meta.get("desde"):
+            return None, None, 0
+        motor = MotorIndicadores.desde_dict(guardado["motor"])
+        if motor.parametros != PARAMETROS_TECNICOS:
+            return None, None, 0
+
+        serie = pd.read_parquet(ruta_serie)
+        if len(serie) != guardado.get("filas_parquet"):
+            # El Parquet no es el que acompaña a este estado (escritura interrumpida)
+            return None, None, 0
+        en_parquet = len(serie)
+        cola = guardado.get("cola")
+        if cola and cola["indice"]:
+            filas = pd.DataFrame(cola["filas"], index=pd.DatetimeIndex(cola["indice"], name=serie.index.name),
+                                 columns=serie.columns, dtype='float64')
+            serie = pd.concat([serie[serie.index < filas.index[0]], filas])
+        return motor, serie, en_parquet
+    except Exception:
+        # Estado corrupto o de otra versión: se recalcula
+        return None, None, 0
+
+def guardar_indicadores(ticker, intervalo, motor, serie, meta, cola=None, en_parquet=None):
+    """
+    Escribe el estado del motor y la serie de indicadores de forma atómica
+    Con `cola` (últimas filas de la serie) solo se reescribe el JSON del estado con esas filas y el
+    Parquet, de `en_parquet` filas, queda como está. Un fallo de escritura se registra y no se
+    propaga. Retorna: True si se guardó
+    """
+    ruta_estado = ruta_complemento(ticker, intervalo, "indicadores.json")
+    ruta_serie = ruta_complemento(ticker, intervalo, "indicadores.parquet")
+    temporal = f"{ruta_serie}.{os.getpid()}.tmp"
+    temporal_estado = f"{ruta_estado}.{os.getpid()}.tmp"
+
+    guardado = {
+        "version": meta.get("version"),
+        "desde": meta.get("desde"),
+        "motor": motor.a_dict(),
+        "filas_parquet": len(serie) if cola is None else en_parquet,
+        "cola": None if cola is None else {
+            "indice": [_a_iso(fecha) for fecha in cola.index],
+            "filas": [[None if pd.isna(valor) else float(valor) for valor in fila]
+                      for fila in cola.itertuples(index=False)]
+        }
+    }
+
+    try:
+        os.makedirs(os.path.dirname(ruta_estado), exist_ok=True)
+        if cola is None:
+            serie.to_parquet(temporal)
+            os.replace(temporal, ruta_serie)
+
+        with open(temporal_estado, "w", encoding="utf-8") as f:
+            json.dump(guardado, f)
+        os.replace(temporal_estado, ruta_estado)
+        return True
+    except Exception as e:
+        _log.warning("No se pudieron guardar los indicadores de %s (%s): %s", ticker, intervalo, e)
+        for ruta in (temporal, temporal_estado):
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+        return False
+
+def _posicion_reanudar(motor, serie, historico):
+    """
+    Posición del histórico desde la que seguir procesando (la de la última barra vista, que se revisa)
+    Retorna None si el estado no encaja con el histórico y hay que recalcular desde el principio.
+    """
+    if motor is None or serie is None or motor.ultima_fecha is None or serie.empty:
+        return None
+
+    ultima = pd.Timestamp(motor.ultima_fecha)
+    if ultima not in historico.index or serie.index[-1] != ultima:
+        return None
+
+    posicion = historico.index.get_loc(ultima)
+    if not isinstance(posicion, int):
+        return None
+
+    # Los cierres de la ventana guardada (salvo la última barra, que puede ser parcial) deben coincidir
+    previos = list(motor._cierres)[:-1]
+    if previos:
+        guardados = historico['Close'].iloc[max(0, posicion - len(previos)):posicion].tolist()
+        if guardados != previos:
+            return None
+
+    return posicion
+
+def _a_iso(fecha):
+    """Fecha de la barra como texto ISO (None si no se indica)"""
+    if fecha is None:
+        return None
+    return pd.Timestamp(fecha).isoformat()
+
+def _candado_para(ticker, intervalo):
+    """Obtiene (o crea) el candado de los indicadores de un ticker e intervalo"""
+    clave = (ticker.upper(), intervalo)
+    with _candado_global:
+        if clave not in _candados:
+            _candados[clave] = Lock()
+        return _candados[clave]
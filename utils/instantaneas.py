@@ -0,0 +1,141 @@
+# utils/instantaneas.py
+"""
+Instantáneas de mercado compartidas por todo el proceso
+Cada instantánea (universo del screener, datos de Inicio...) se construye una sola vez y la leen
+todas las sesiones de Streamlit sin copiarla. Al vencer su TTL la reconstruye el primero que la
+pide mientras el resto sigue recibiendo la versión anterior.
+Si el actualizador en segundo plano está activo, las lecturas nunca reconstruyen: se sirve la
+versión anterior hasta que el actualizador publica la nueva (salvo que lleve dos TTL vencida).
+Los datos devueltos son compartidos: las secciones solo deben leerlos, nunca modificarlos.
+"""
+
+import time
+from threading import Lock
+
+_instantaneas = {}
+_candado_registro = Lock()
+_refresco_en_segundo_plano = False
+
+def registrar_instantanea(nombre, constructor, ttl):
+    """
+    Registra el constructor de una instantánea
+    `constructor(progreso=None)` devuelve los datos; `progreso(fraccion, texto)` es opcional.
+    """
+    with _candado_registro:
+        if nombre in _instantaneas:
+            # Streamlit vuelve a importar las secciones al recargar: se conservan los datos
+            _instantaneas[nombre].update(constructor=constructor, ttl=ttl)
+            return
+        _instantaneas[nombre] = {
+            "constructor": constructor,
+            "ttl": ttl,
+            "datos": None,
+            "actualizado": 0.0,
+            "actualizado_parcial": None,
+            "version": 0,
+            "construyendo": False,
+            "error": None,
+            "candado": Lock()
+        }
+
+def obtener_instantanea(nombre, progreso=None):
+    """
+    Devuelve los datos de una instantánea (None si nunca se pudo construir)
+    Solo bloquea cuando todavía no existe ninguna versión.
+    """
+    entrada = _entrada(nombre)
+
+    if entrada["datos"] is not None:
+        if _debe_refrescar_lector(entrada) and entrada["candado"].acquire(blocking=False):
+            try:
+                if _debe_refrescar_lector(entrada):
+                    _construir(entrada, progreso)
+            finally:
+                entrada["candado"].release()
+        return entrada["datos"]
+
+    with entrada["candado"]:
+        if entrada["datos"] is None:
+            _construir(entrada, progreso)
+    return entrada["datos"]
+
+def reconstruir_instantanea(nombre, constructor=None):
+    """
+    Reconstruye la instantánea aunque no haya vencido (la usa el actualizador en segundo plano)
+    Mientras tanto los lectores siguen recibiendo la versión anterior.
+    `constructor(actual, progreso=None)` permite una actualización parcial a partir de los datos
+    actuales; no renueva 'actualizado', así que no retrasa la reconstrucción completa al vencer.
+    Si la reconstrucción falla se conserva la versión anterior y se relanza la excepción.
+    """
+    entrada = _entrada(nombre)
+    error = None
+    with entrada["candado"]:
+        if constructor is None:
+            error = _construir(entrada)
+        elif entrada["datos"] is not None:
+            actual = entrada["datos"]
+            error = _construir(entrada, constructor=lambda progreso=None: constructor(actual, progreso=progreso),
+                               parcial=True)
+    if error is not None:
+        raise error
+    return entrada["datos"]
+
+def activar_refresco_en_segundo_plano():
+    """A partir de ahora las lecturas no reconstruyen instantáneas vencidas"""
+    global _refresco_en_segundo_plano
+    _refresco_en_segundo_plano = True
+
+def invalidar_instantanea(nombre):
+    """Marca la instantánea como vencida; se reconstruye en la siguiente lectura"""
+    entrada = _entrada(nombre)
+    entrada["actualizado"] = 0.0
+
+def estado_instantanea(nombre):
+    """Resumen del estado de una instantánea para mostrarlo en la interfaz"""
+    entrada = _entrada(nombre)
+    return {
+        "disponible": entrada["datos"] is not None,
+        "actualizado": entrada["actualizado"] or None,
+        "actualizado_parcial": entrada["actualizado_parcial"],
+        "version": entrada["version"],
+        "construyendo": entrada["construyendo"],
+        "error": entrada["error"]
+    }
+
+def _construir(entrada, progreso=None, constructor=None, parcial=False):
+    """
+    Ejecuta el constructor; si falla se conserva la versión anterior
+    Una actualización parcial solo marca 'actualizado_parcial'.
+    Retorna: la excepción si falló, None si no
+    """
+    entrada["construyendo"] = True
+    try:
+        datos = (constructor or entrada["constructor"])(progreso=progreso)
+        entrada["datos"] = datos
+        entrada["actualizado_parcial" if parcial else "actualizado"] = time.time()
+        entrada["version"] += 1
+        entrada["error"] = None
+    except Exception as e:
+        entrada["error"] = str(e)
+        return e
+    finally:
+        entrada["construyendo"] = False
+    return None
+
+def _vencida(entrada, factor=1):
+    """Indica si la instantánea superó `factor` veces su TTL"""
+    return (time.time() - entrada["actualizado"]) > entrada["ttl"] * factor
+
+def _debe_refrescar_lector(entrada):
+    """Un lector solo reconstruye si no hay actualizador o si este lleva demasiado retraso"""
+    if entrada["actualizado"] == 0.0:
+        # Invalidada a mano: se reconstruye en la siguiente lectura
+        return True
+    return _vencida(entrada, factor=2 if _refresco_en_segundo_plano else 1)
+
+def _entrada(nombre):
+    """Obtiene el registro de una instantánea"""
+    with _candado_registro:
+        if nombre not in _instantaneas:
+            raise KeyError(f"Instantánea no registrada: {nombre}")
+        return _instantaneas[nombre]
@@ -0,0 +1,89 @@
+# utils/limitador_peticiones.py
+"""
+Limitador de peticiones por proveedor (cubeta de fichas)
+Un único limitador por proveedor para todo el proceso: lo comparten hilos y sesiones de Streamlit.
+Tras un "Too Many Requests" se pausa el proveedor y se reduce la tasa, que se recupera poco a poco.
+"""
+
+import time
+from threading import Lock
+
+from utils.config import LIMITES_PETICIONES
+
+_limitadores = {}
+_candado_limitadores = Lock()
+
+class LimitadorPeticiones:
+    """Cubeta de fichas con tasa adaptativa (baja a la mitad con cada 429 y sube con los éxitos)"""
+
+    def __init__(self, tasa, capacidad, pausa_429=10):
+        self.tasa_maxima = float(tasa)
+        self.tasa = float(tasa)
+        self.capacidad = float(capacidad)
+        self.pausa_429 = pausa_429
+        self._fichas = float(capacidad)
+        self._ultimo = time.monotonic()
+        self._pausa_hasta = 0.0
+        self._candado = Lock()
+
+    def adquirir(self, timeout=None):
+        """
+        Espera hasta disponer de una ficha
+        Retorna False si se supera `timeout` (segundos) sin conseguirla.
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self._candado:
+                ahora = time.monotonic()
+                self._rellenar(ahora)
+
+                if ahora < self._pausa_hasta:
+                    espera = self._pausa_hasta - ahora
+                elif self._fichas >= 1:
+                    self._fichas -= 1
+                    return True
+                else:
+                    espera = (1 - self._fichas) / self.tasa
+
+            if limite is not None and time.monotonic() + espera > limite:
+                return False
+            time.sleep(espera)
+
+    def registrar_exito(self):
+        """Recupera la tasa de forma gradual tras una penalización"""
+        with self._candado:
+            if self.tasa < self.tasa_maxima:
+                self.tasa = min(self.tasa_maxima, self.tasa + self.tasa_maxima * 0.05)
+
+    def penalizar(self, segundos=None):
+        """Pausa el proveedor y reduce la tasa a la mitad tras un 'Too Many Requests'"""
+        with self._candado:
+            ahora = time.monotonic()
+            self._pausa_hasta = max(self._pausa_hasta, ahora + (segundos or self.pausa_429))
+            self._fichas = 0.0
+            self._ultimo = ahora
+            self.tasa = max(self.tasa_maxima * 0.1, self.tasa / 2)
+
+    def _rellenar(self, ahora):
+        """Añade las fichas generadas desde la última consulta"""
+        if ahora > self._ultimo:
+            self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.tasa)
+            self._ultimo = ahora
+
+def obtener_limitador(proveedor):
+    """Devuelve el limitador compartido de un proveedor (se crea la primera vez)"""
+    with _candado_limitadores:
+        if proveedor not in _limitadores:
+            config = LIMITES_PETICIONES.get(proveedor, LIMITES_PETICIONES["yahoo"])
+            _limitadores[proveedor] = LimitadorPeticiones(
+                config["tasa"], config["capacidad"], config.get("pausa_429", 10)
+            )
+        return _limitadores[proveedor]
+
+def es_limite_excedido(error):
+    """Indica si una excepción corresponde a un 'Too Many Requests' (HTTP 429)"""
+    if type(error).__name__ == "YFRateLimitError":
+        return True
+    mensaje = str(error)
+    return "Too Many Requests" in mensaje or "429" in mensaje or "Rate limited" in mensaje
@@ -0,0 +1,294 @@
+# utils/metricas_riesgo.py
+"""
+Métricas de riesgo vectorizadas (solo NumPy)
+Todas las funciones aceptan rendimientos simples en un array 1-D (una acción) o 2-D con una fila
+por fecha y una columna por ticker, así que un panel de cientos de acciones se resuelve en una
+sola llamada. Los NaN (p. ej. antes de que cotice un ticker) se ignoran columna a columna.
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+
+# Niveles de confianza por defecto para VaR/CVaR
+NIVELES_VAR = (0.95, 0.99)
+
+# Puntos de la cola con los que se integra el CVaR de Cornish-Fisher
+_PUNTOS_COLA = 64
+
+_NORMAL = NormalDist()
+
+def _como_matriz(rendimientos):
+    """Array float 2-D (fechas x tickers) y si la entrada era 1-D"""
+    valores = np.asarray(rendimientos, dtype='float64')
+    if valores.ndim == 1:
+        return valores[:, None], True
+    return valores, False
+
+def _salida(resultado, vector):
+    """Deshace la columna añadida a las entradas 1-D"""
+    if vector:
+        return resultado[..., 0] if np.ndim(resultado) > 1 else resultado[0]
+    return resultado
+
+def rachas_maximas(rendimientos):
+    """
+    Máximas rachas de días positivos y negativos consecutivos (codificación por tramos)
+    Como el bucle original, un día sin variación (o NaN) no suma ni corta la racha.
+    Retorna: (rachas positivas, rachas negativas) por columna
+    """
+    valores, vector = _como_matriz(rendimientos)
+    rachas = []
+    for suma, corta in ((valores > 0, valores < 0), (valores < 0, valores > 0)):
+        acumulado = np.cumsum(suma, axis=0)
+        # Acumulado en el último día que cortó la racha (0 si aún no hubo ninguno)
+        base = np.maximum.accumulate(np.where(corta, acumulado, 0), axis=0)
+        maximo = (acumulado - base).max(axis=0) if len(valores) else np.zeros(valores.shape[1], dtype=np.int64)
+        rachas.append(_salida(maximo, vector))
+    return rachas[0], rachas[1]
+
+def serie_drawdown(rendimientos):
+    """
+    Caída desde el máximo acumulado de cada columna ((riqueza - máximo) / máximo)
+    Los días NaN no mueven la riqueza y quedan como NaN en el resultado.
+    """
+    valores, vector = _como_matriz(rendimientos)
+    nulos = np.isnan(valores)
+    riqueza = np.cumprod(1 + np.where(nulos, 0.0, valores), axis=0)
+    # El máximo arranca en el primer día con dato (como expanding().max() sobre la serie sin NaN)
+    maximo = np.maximum.accumulate(np.where(nulos, -np.inf, riqueza), axis=0)
+    with np.errstate(invalid='ignore'):
+        drawdown = (riqueza - maximo) / maximo
+    drawdown[nulos] = np.nan
+    return _salida(drawdown, vector)
+
+def drawdown_maximo(drawdown):
+    """
+    Drawdown máximo de cada columna de una matriz de drawdown
+    Retorna: (mínimo, fila del mínimo, fila del último máximo previo o -1 si no lo hay)
+    """
+    valores, vector = _como_matriz(drawdown)
+    if not len(valores):
+        vacio = np.zeros(valores.shape[1])
+        return _salida(vacio, vector), _salida(vacio.astype(np.int64) - 1, vector), _salida(vacio.astype(np.int64) - 1, vector)
+
+    filas = np.arange(len(valores))[:, None]
+    validos = ~np.isnan(valores)
+    fila_minimo = np.where(validos.any(axis=0), np.argmin(np.where(validos, valores, np.inf), axis=0), 0)
+    minimo = valores[fila_minimo, np.arange(valores.shape[1])]
+
+    ultimo_maximo = np.maximum.accumulate(np.where(valores == 0, filas, -1), axis=0)
+    fila_inicio = ultimo_maximo[fila_minimo, np.arange(valores.shape[1])]
+    return _salida(minimo, vector), _salida(fila_minimo, vector), _salida(fila_inicio, vector)
+
+def momentos(rendimientos):
+    """
+    Media, desviación (ddof=1), asimetría y curtosis en exceso con corrección de sesgo
+    (las mismas fórmulas que Series.skew/Series.kurtosis de pandas)
+    Retorna: dict de arrays por columna
+    """
+    valores, vector = _como_matriz(rendimientos)
+    validos = ~np.isnan(valores)
+    n = validos.sum(axis=0).astype('float64')
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = np.where(validos, valores, 0.0).sum(axis=0) / n
+        desvio = np.where(validos, valores - media, 0.0)
+        m2 = (desvio ** 2).sum(axis=0)
+        m3 = (desvio ** 3).sum(axis=0)
+        m4 = (desvio ** 4).sum(axis=0)
+
+        desviacion = np.sqrt(m2 / (n - 1))
+        asimetria = (n * np.sqrt(n - 1) / (n - 2)) * m3 / m2 ** 1.5
+        curtosis = (n * (n + 1) * (n - 1) * m4 / ((n - 2) * (n - 3) * m2 ** 2)
+                    - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3)))
+
+    # Como pandas: sin varianza los momentos son 0; sin observaciones suficientes, NaN
+    plano = m2 <= 1e-14 * np.maximum(1.0, (media ** 2) * n)
+    asimetria = np.where(n < 3, np.nan, np.where(plano, 0.0, asimetria))
+    curtosis = np.where(n < 4, np.nan, np.where(plano, 0.0, curtosis))
+
+    return {
+        'media': _salida(media, vector),
+        'desviacion': _salida(desviacion, vector),
+        'asimetria': _salida(asimetria, vector),
+        'curtosis': _salida(curtosis, vector),
+        'observaciones': _salida(n.astype(np.int64), vector)
+    }
+
+def _z_cornish_fisher(z, asimetria, curtosis):
+    """Cuantil normal ajustado por asimetría y curtosis en exceso (expansión de Cornish-Fisher)"""
+    return (z
+            + (z ** 2 - 1) * asimetria / 6
+            + (z ** 3 - 3 * z) * curtosis / 24
+            - (2 * z ** 3 - 5 * z) * asimetria ** 2 / 36)
+
+def var_cvar(rendimientos, niveles=NIVELES_VAR, estadisticos=None):
+    """
+    VaR y CVaR diarios (rendimientos, negativos en pérdidas) histórico, paramétrico normal y de
+    Cornish-Fisher en una pasada: un único ordenamiento por columna para los históricos y los
+    momentos de la muestra para los otros dos.
+    - histórico: percentil con interpolación lineal (np.percentile) y media de los días <= VaR
+    - paramétrico: media + z * desviación; CVaR = media - desviación * φ(z) / α
+    - Cornish-Fisher: cuantil ajustado; el CVaR integra ese cuantil sobre la cola
+    Retorna: {nivel: {'historico'|'parametrico'|'cornish_fisher': {'var', 'cvar'}}}
+    """
+    valores, vector = _como_matriz(rendimientos)
+    stats = estadisticos or momentos(valores)
+    media = np.atleast_1d(stats['media'])
+    desviacion = np.atleast_1d(stats['desviacion'])
+    asimetria = np.nan_to_num(np.atleast_1d(stats['asimetria']))
+    curtosis = np.nan_to_num(np.atleast_1d(stats['curtosis']))
+
+    ordenados = np.sort(valores, axis=0)  # los NaN quedan al final
+    n = (~np.isnan(valores)).sum(axis=0)
+    acumulados = np.cumsum(np.nan_to_num(ordenados), axis=0)
+    columnas = np.arange(valores.shape[1])
+    vacias = n == 0
+
+    resultado = {}
+    for nivel in niveles:
+        alfa = 1 - nivel
+
+        # Histórico
+        if len(valores):
+            posicion = np.maximum(n - 1, 0) * alfa
+            abajo = np.floor(posicion).astype(np.int64)
+            arriba = np.minimum(abajo + 1, np.maximum(n - 1, 0))
+            peso = posicion - abajo
+            var_historico = ((1 - peso) * ordenados[abajo, columnas] + peso * ordenados[arriba, columnas])
+            en_cola = np.maximum((ordenados <= var_historico).sum(axis=0), 1)
+            cvar_historico = acumulados[en_cola - 1, columnas] / en_cola
+        else:
+            var_historico = cvar_historico = np.full(valores.shape[1], np.nan)
+        var_historico = np.where(vacias, np.nan, var_historico)
+        cvar_historico = np.where(vacias, np.nan, cvar_historico)
+
+        # Paramétrico normal
+        z = _NORMAL.inv_cdf(alfa)
+        var_parametrico = media + z * desviacion
+        cvar_parametrico = media - desviacion * _NORMAL.pdf(z) / alfa
+
+        # Cornish-Fisher (CVaR por regla del punto medio sobre (0, α))
+        var_cf = media + _z_cornish_fisher(z, asimetria, curtosis) * desviacion
+        cola = np.array([_NORMAL.inv_cdf(alfa * (i + 0.5) / _PUNTOS_COLA) for i in range(_PUNTOS_COLA)])
+        z_cola = _z_cornish_fisher(cola[:, None], asimetria, curtosis)
+        cvar_cf = media + z_cola.mean(axis=0) * desviacion
+
+        resultado[nivel] = {
+            'historico': {'var': _salida(var_historico, vector), 'cvar': _salida(cvar_historico, vector)},
+            'parametrico': {'var': _salida(var_parametrico, vector), 'cvar': _salida(cvar_parametrico, vector)},
+            'cornish_fisher': {'var': _salida(var_cf, vector), 'cvar': _salida(cvar_cf, vector)}
+        }
+
+    return resultado
+
+def resumen_riesgo(rendimientos, niveles=NIVELES_VAR, periodos_año=252):
+    """
+    Todas las métricas de riesgo sin mercado de referencia en una llamada (para paneles)
+    Retorna: dict de arrays por columna (volatilidad anual, drawdown máximo, rachas, momentos,
+    probabilidad de pérdida y VaR/CVaR de cada método y nivel)
+    """
+    valores, vector = _como_matriz(rendimientos)
+    stats = momentos(valores)
+    colas = var_cvar(valores, niveles, stats)
+    positivas, negativas = rachas_maximas(valores)
+    minimo, _, _ = drawdown_maximo(serie_drawdown(valores))
+
+    validos = ~np.isnan(valores)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        prob_perdida = (valores < 0).sum(axis=0) / validos.sum(axis=0) * 100
+
+    resumen = {
+        'volatilidad_anual': stats['desviacion'] * np.sqrt(periodos_año),
+        'drawdown_maximo': minimo,
+        'racha_positiva': positivas,
+        'racha_negativa': negativas,
+        'asimetria': stats['asimetria'],
+        'curtosis': stats['curtosis'],
+        'prob_perdida': prob_perdida
+    }
+    for nivel, metodos in colas.items():
+        for metodo, medidas in metodos.items():
+            for medida, valor in medidas.items():
+                resumen[f'{medida}_{metodo}_{int(round(nivel * 100))}'] = valor
+
+    return {clave: _salida(valor, vector) if np.ndim(valor) else valor for clave, valor in resumen.items()}
+
+def _sumas_moviles(valores, ventana):
+    """
+    Sumas sobre las últimas `ventana` filas por diferencia de sumas acumuladas (O(n) por columna)
+    La fila i contiene la suma de las filas i-ventana+1..i (0 en las primeras ventana-1 filas).
+    """
+    acumulado = np.cumsum(valores, axis=0)
+    sumas = acumulado.copy()
+    sumas[ventana:] -= acumulado[:-ventana]
+    return sumas
+
+def _maximo_movil(valores, ventana):
+    """
+    Máximo de las últimas `ventana` filas de cada columna en O(n) (algoritmo de van Herk/Gil-Werman):
+    máximos acumulados hacia delante y hacia atrás dentro de bloques de tamaño `ventana`.
+    """
+    n, k = valores.shape
+    bloques = -(-n // ventana)
+    relleno = np.full((bloques * ventana, k), -np.inf)
+    relleno[:n] = valores
+    por_bloque = relleno.reshape(bloques, ventana, k)
+
+    hacia_delante = np.maximum.accumulate(por_bloque, axis=1).reshape(-1, k)
+    hacia_atras = np.maximum.accumulate(por_bloque[:, ::-1], axis=1)[:, ::-1].reshape(-1, k)
+
+    maximo = np.full((n, k), np.nan)
+    if n >= ventana:
+        maximo[ventana - 1:] = np.maximum(hacia_atras[:n - ventana + 1], hacia_delante[ventana - 1:n])
+    return maximo
+
+def metricas_moviles(rendimientos, rend_mercado, ventana, tasa_libre=0.02, periodos_año=252):
+    """
+    Beta, volatilidad anual, Sharpe y drawdown en ventanas móviles de `ventana` días
+    Todo sale de sumas acumuladas de x, m, x², m² y x·m (covarianza online) y el drawdown del
+    máximo móvil de la riqueza, así que el coste es O(n) sea cual sea la ventana. Una ventana con
+    algún día sin dato de la acción o del mercado queda en NaN.
+    Retorna: dict de arrays ('beta', 'volatilidad', 'sharpe', 'drawdown') con la forma de la entrada
+    """
+    valores, vector = _como_matriz(rendimientos)
+    mercado = np.asarray(rend_mercado, dtype='float64').reshape(len(valores), -1)
+
+    validos = ~np.isnan(valores) & ~np.isnan(mercado)
+    # Centrar por columna reduce la cancelación numérica de las sumas de cuadrados
+    centro_x = np.nanmean(np.where(validos, valores, np.nan), axis=0) if validos.any() else np.zeros(valores.shape[1])
+    centro_m = np.nanmean(np.where(validos, mercado, np.nan), axis=0) if validos.any() else np.zeros(mercado.shape[1])
+    x = np.where(validos, valores - np.nan_to_num(centro_x), 0.0)
+    m = np.where(validos, mercado - np.nan_to_num(centro_m), 0.0)
+
+    cuenta = _sumas_moviles(validos.astype('float64'), ventana)
+    suma_x = _sumas_moviles(x, ventana)
+    suma_m = _sumas_moviles(m, ventana)
+    suma_xx = _sumas_moviles(x * x, ventana)
+    suma_mm = _sumas_moviles(m * m, ventana)
+    suma_xm = _sumas_moviles(x * m, ventana)
+
+    completas = cuenta >= ventana - 0.5
+    completas[:ventana - 1] = False
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media_x = suma_x / ventana
+        var_x = np.maximum(suma_xx / ventana - media_x ** 2, 0.0)
+        var_m = np.maximum(suma_mm / ventana - (suma_m / ventana) ** 2, 0.0)
+        cov = suma_xm / ventana - media_x * suma_m / ventana
+
+        beta = np.where(var_m > 0, cov / var_m, np.nan)
+        volatilidad = np.sqrt(var_x) * np.sqrt(periodos_año)
+        exceso = media_x + np.nan_to_num(centro_x) - tasa_libre / periodos_año
+        sharpe = np.where(var_x > 0, exceso / np.sqrt(var_x) * np.sqrt(periodos_año), np.nan)
+
+    # Drawdown desde el máximo de la riqueza en la ventana
+    riqueza = np.cumprod(1 + np.nan_to_num(valores), axis=0)
+    drawdown = riqueza / _maximo_movil(riqueza, ventana) - 1
+
+    resultado = {}
+    for clave, serie in (('beta', beta), ('volatilidad', volatilidad), ('sharpe', sharpe), ('drawdown', drawdown)):
+        serie = np.where(completas, serie, np.nan)
+        resultado[clave] = _salida(serie, vector)
+    return resultado
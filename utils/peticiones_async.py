@@ -0,0 +1,205 @@
+# utils/peticiones_async.py
+"""
+Capa asíncrona de peticiones para cargar muchos símbolos de varios proveedores a la vez
+Las llamadas bloqueantes (requests, yfinance) se ejecutan en un grupo de hilos compartido desde
+un bucle de asyncio, con una sesión HTTP que reutiliza conexiones. Cada símbolo recorre su propia
+cadena de proveedores (el primero que responde gana) y todas las cadenas van en paralelo; al
+agotarse el presupuesto de tiempo se devuelve lo que haya llegado. Cada llamada pasa por el
+cortacircuitos de su proveedor (utils/salud_proveedores) y alimenta sus percentiles de latencia.
+"""
+
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.config import MERCADOS_CONFIG
+from utils.limitador_peticiones import obtener_limitador
+from utils.salud_proveedores import obtener_salud
+
+# Respuestas 200 que son en realidad errores del proveedor:
+# (claves de aviso de límite de peticiones, claves de error de cuota o API key)
+_RESPUESTAS_ERROR = {
+    "alpha_vantage": (("Note", "Information"), ("Error Message",)),
+    "fmp": ((), ("Error Message",))
+}
+
+_sesion = None
+_executor = None
+_candado_recursos = Lock()
+
+def _recursos():
+    """Sesión HTTP con conexiones reutilizables y grupo de hilos (se crean la primera vez)"""
+    global _sesion, _executor
+    with _candado_recursos:
+        if _sesion is None:
+            conexiones = MERCADOS_CONFIG["conexiones"]
+            _sesion = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=conexiones, pool_maxsize=conexiones)
+            _sesion.mount("https://", adaptador)
+            _sesion.mount("http://", adaptador)
+            _executor = ThreadPoolExecutor(max_workers=conexiones, thread_name_prefix="peticiones")
+        return _sesion, _executor
+
+async def en_hilo(funcion, *args, **kwargs):
+    """Ejecuta una función bloqueante en el grupo de hilos sin bloquear el bucle"""
+    _, executor = _recursos()
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(funcion, *args, **kwargs))
+
+async def adquirir(proveedor, limite=None):
+    """
+    Espera una ficha del limitador del proveedor sin ocupar un hilo del grupo
+    Retorna False si no la consigue antes de `limite` (time.monotonic()).
+    """
+    limitador = obtener_limitador(proveedor)
+    while not limitador.adquirir(timeout=0):
+        if limite is not None and time.monotonic() >= limite:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+def _get_json(url, proveedor):
+    """
+    GET bloqueante; una respuesta distinta de 200 es un fallo del proveedor (un 429 además lo pausa)
+    También lo son los avisos de límite o cuota que algunos proveedores devuelven con un 200.
+    """
+    sesion, _ = _recursos()
+    respuesta = sesion.get(url, timeout=MERCADOS_CONFIG["timeout"])
+    limitador = obtener_limitador(proveedor)
+    if respuesta.status_code == 429:
+        limitador.penalizar()
+    respuesta.raise_for_status()
+    if respuesta.status_code != 200:
+        raise requests.HTTPError(f"{proveedor}: respuesta {respuesta.status_code}")
+
+    data = respuesta.json()
+    if isinstance(data, dict) and proveedor in _RESPUESTAS_ERROR:
+        claves_limite, claves_error = _RESPUESTAS_ERROR[proveedor]
+        for clave in claves_limite:
+            if clave in data:
+                limitador.penalizar()
+                raise requests.HTTPError(f"{proveedor}: {data[clave]}")
+        for clave in claves_error:
+            if clave in data:
+                raise requests.HTTPError(f"{proveedor}: {data[clave]}")
+    limitador.registrar_exito()
+    return data
+
+def _medido(salud, funcion, *args):
+    """
+    Ejecuta la llamada bloqueante y anota su resultado y latencia en la salud del proveedor
+    Se anota en el propio hilo: cuenta aunque quien esperaba ya se haya ido por el presupuesto.
+    """
+    inicio = time.monotonic()
+    try:
+        resultado = funcion(*args)
+    except Exception:
+        salud.registrar(False, time.monotonic() - inicio)
+        raise
+    salud.registrar(True, time.monotonic() - inicio)
+    return resultado
+
+async def llamar(proveedor, funcion, *args, limite=None):
+    """
+    Llamada bloqueante a un proveedor con cortacircuitos, limitador y medición de latencia
+    Retorna None al instante si el circuito está abierto, si no hay ficha antes de `limite`
+    (time.monotonic()) o si la llamada falla.
+    """
+    salud = obtener_salud(proveedor)
+    if not salud.permitir():
+        return None
+    try:
+        ficha = await adquirir(proveedor, limite)
+    except BaseException:
+        # Cancelada mientras esperaba ficha (cobertura ganada o presupuesto agotado): sin llamada
+        salud.liberar_prueba()
+        raise
+    if not ficha:
+        salud.liberar_prueba()
+        return None
+    try:
+        return await en_hilo(_medido, salud, funcion, *args)
+    except Exception:
+        return None
+
+async def obtener_json(url, proveedor, limite=None):
+    """JSON de una URL o None si el proveedor falla, tiene el circuito abierto o no hay ficha a tiempo"""
+    return await llamar(proveedor, _get_json, url, proveedor, limite=limite)
+
+async def resolver_cadena(fuentes):
+    """
+    Prueba las fuentes ([(proveedor, función async sin argumentos)]) en orden y devuelve el primer
+    resultado distinto de None
+    Petición de cobertura: si la fuente en curso no ha respondido cuando pasa el p95 de latencia de
+    su proveedor, se lanza también la siguiente y gana la primera que responda con datos.
+    """
+    en_curso = {}
+    siguiente = 0
+    lanzar = True
+    try:
+        while True:
+            if lanzar and siguiente < len(fuentes):
+                proveedor, fuente = fuentes[siguiente]
+                siguiente += 1
+                en_curso[asyncio.ensure_future(fuente())] = proveedor
+                lanzar = False
+            if not en_curso:
+                return None
+
+            espera = None
+            if siguiente < len(fuentes):
+                espera = obtener_salud(fuentes[siguiente - 1][0]).espera_cobertura()
+            terminadas, _ = await asyncio.wait(en_curso, timeout=espera, return_when=asyncio.FIRST_COMPLETED)
+
+            # Sin respuesta dentro del p95: se lanza la siguiente sin cancelar la que va en curso
+            lanzar = True
+            for tarea in terminadas:
+                del en_curso[tarea]
+                if not tarea.cancelled() and tarea.exception() is None and tarea.result() is not None:
+                    return tarea.result()
+    finally:
+        for tarea in en_curso:
+            tarea.cancel()
+
+def compartida(corutina_factoria):
+    """
+    Envuelve una petición que sirve a muchos símbolos (p. ej. todas las divisas en una llamada)
+    para que se lance una sola vez y todas las cadenas que la usan esperen el mismo resultado
+    Se crea una envoltura por carga de página: el resultado no se reutiliza entre cargas.
+    """
+    tarea = []
+
+    async def envoltura():
+        if not tarea:
+            tarea.append(asyncio.ensure_future(corutina_factoria()))
+        return await asyncio.shield(tarea[0])
+    return envoltura
+
+def recoger(cadenas, presupuesto=None):
+    """
+    Resuelve todas las cadenas ({clave: función async sin argumentos}) en paralelo
+    Retorna: (dict {clave: resultado} con las que llegaron a tiempo y no fueron None,
+              lista de claves que no terminaron dentro del presupuesto)
+    """
+    presupuesto = MERCADOS_CONFIG["presupuesto"] if presupuesto is None else presupuesto
+
+    async def _principal():
+        tareas = {asyncio.ensure_future(cadena()): clave for clave, cadena in cadenas.items()}
+        if not tareas:
+            return {}, []
+        terminadas, pendientes = await asyncio.wait(tareas, timeout=presupuesto)
+        for tarea in pendientes:
+            tarea.cancel()
+
+        resultados = {}
+        for tarea in terminadas:
+            if not tarea.cancelled() and tarea.exception() is None and tarea.result() is not None:
+                resultados[tareas[tarea]] = tarea.result()
+        return resultados, [tareas[tarea] for tarea in pendientes]
+
+    # Streamlit ejecuta el script en un hilo sin bucle de eventos propio
+    return asyncio.run(_principal())
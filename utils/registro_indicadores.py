@@ -0,0 +1,166 @@
+# utils/registro_indicadores.py
+"""
+Registro de indicadores técnicos con dependencias declaradas
+Cada indicador declara las columnas que produce y de qué indicadores depende (la señal del MACD
+necesita el MACD, que a su vez necesita las EMA; el ancho de Bollinger necesita las bandas y
+estas la media). Solo se calcula lo que pide la selección y cada resultado se memoriza por
+(huella del histórico, indicador, parámetros) sin hashear el DataFrame.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+from utils.config import PARAMETROS_TECNICOS
+
+# Resultados memorizados: (huella, indicador, parámetros) -> {columna: Series}
+_MAX_MEMORIA = 256
+_memoria = OrderedDict()
+_candado_memoria = Lock()
+
+_INDICADORES = {}
+
+def registrar_indicador(nombre, columnas, depende=()):
+    """
+    Decorador que registra la función de cálculo de un indicador
+    La función recibe (data, parametros) con las columnas de sus dependencias ya calculadas en
+    `data` y devuelve un dict {columna: Series}.
+    """
+    def decorador(funcion):
+        _INDICADORES[nombre] = {
+            'columnas': columnas,
+            'depende': list(depende),
+            'calcular': funcion
+        }
+        return funcion
+    return decorador
+
+def resolver_dependencias(nombres):
+    """Lista de indicadores a calcular (dependencias incluidas) en orden de cálculo"""
+    orden = []
+    visitados = set()
+
+    def _visitar(nombre, pila):
+        if nombre in visitados:
+            return
+        if nombre not in _INDICADORES:
+            raise KeyError(f"Indicador no registrado: {nombre}")
+        if nombre in pila:
+            raise ValueError(f"Dependencia circular en el indicador: {nombre}")
+        for dependencia in _INDICADORES[nombre]['depende']:
+            _visitar(dependencia, pila | {nombre})
+        visitados.add(nombre)
+        orden.append(nombre)
+
+    for nombre in nombres:
+        _visitar(nombre, frozenset())
+    return orden
+
+def columnas_indicadores(nombres, parametros=None):
+    """Columnas que producen los indicadores pedidos (sin sus dependencias)"""
+    p = dict(PARAMETROS_TECNICOS, **(parametros or {}))
+    columnas = []
+    for nombre in nombres:
+        columnas.extend(_INDICADORES[nombre]['columnas'](p))
+    return columnas
+
+def calcular_indicadores(data, nombres, huella=None, parametros=None):
+    """
+    Añade a una copia de `data` las columnas de los indicadores pedidos y de sus dependencias
+    Con `huella` (almacen_precios.HuellaPrecios de `data`) cada indicador se memoriza y no se
+    recalcula en los siguientes reruns mientras el histórico no cambie.
+    """
+    if data is None or data.empty or 'Close' not in data.columns:
+        return data
+
+    p = dict(PARAMETROS_TECNICOS, **(parametros or {}))
+    firma = tuple(sorted(p.items()))
+    data_tech = data.copy()
+
+    for nombre in resolver_dependencias(nombres):
+        memoria = None
+        if huella is not None:
+            memoria = (huella, nombre, firma)
+            with _candado_memoria:
+                resultado = _memoria.get(memoria)
+                if resultado is not None:
+                    _memoria.move_to_end(memoria)
+        else:
+            resultado = None
+
+        if resultado is None:
+            resultado = _INDICADORES[nombre]['calcular'](data_tech, p)
+            if memoria is not None:
+                with _candado_memoria:
+                    _memoria[memoria] = resultado
+                    while len(_memoria) > _MAX_MEMORIA:
+                        _memoria.popitem(last=False)
+
+        for columna, serie in resultado.items():
+            data_tech[columna] = serie
+
+    return data_tech
+
+def limpiar_memoria_indicadores():
+    """Vacía los resultados memorizados"""
+    with _candado_memoria:
+        _memoria.clear()
+
+# Indicadores que necesita generar_senales_tecnicas (RSI, MACD con su señal y bandas de Bollinger)
+INDICADORES_SENALES = ['RSI', 'MACD_Signal', 'BB']
+
+@registrar_indicador('RSI', lambda p: ['RSI'])
+def _rsi(data, p):
+    """RSI por media simple de subidas y bajadas (como _calcular_rsi)"""
+    delta = data['Close'].diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=p['rsi_period']).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=p['rsi_period']).mean()
+    return {'RSI': 100 - (100 / (1 + gain / loss))}
+
+@registrar_indicador('EMA', lambda p: [f"EMA_{p['macd_fast']}", f"EMA_{p['macd_slow']}"])
+def _ema(data, p):
+    """Medias exponenciales rápida y lenta del MACD"""
+    return {
+        f"EMA_{p['macd_fast']}": data['Close'].ewm(span=p['macd_fast'], adjust=False).mean(),
+        f"EMA_{p['macd_slow']}": data['Close'].ewm(span=p['macd_slow'], adjust=False).mean()
+    }
+
+@registrar_indicador('MACD', lambda p: ['MACD'], depende=['EMA'])
+def _macd(data, p):
+    """Línea MACD a partir de las EMA"""
+    return {'MACD': data[f"EMA_{p['macd_fast']}"] - data[f"EMA_{p['macd_slow']}"]}
+
+@registrar_indicador('MACD_Signal', lambda p: ['MACD_Signal', 'MACD_Histogram'], depende=['MACD'])
+def _macd_senal(data, p):
+    """Señal e histograma del MACD"""
+    senal = data['MACD'].ewm(span=p['macd_signal'], adjust=False).mean()
+    return {'MACD_Signal': senal, 'MACD_Histogram': data['MACD'] - senal}
+
+@registrar_indicador('BB_Middle', lambda p: ['BB_Middle'])
+def _bb_media(data, p):
+    """Banda media de Bollinger"""
+    return {'BB_Middle': data['Close'].rolling(window=p['bb_period']).mean()}
+
+@registrar_indicador('BB', lambda p: ['BB_Upper', 'BB_Lower'], depende=['BB_Middle'])
+def _bb_bandas(data, p):
+    """Bandas superior e inferior de Bollinger"""
+    bb_std = data['Close'].rolling(window=p['bb_period']).std()
+    return {
+        'BB_Upper': data['BB_Middle'] + (bb_std * p['bb_std']),
+        'BB_Lower': data['BB_Middle'] - (bb_std * p['bb_std'])
+    }
+
+@registrar_indicador('BB_Width', lambda p: ['BB_Width'], depende=['BB'])
+def _bb_ancho(data, p):
+    """Ancho relativo de las bandas de Bollinger"""
+    return {'BB_Width': (data['BB_Upper'] - data['BB_Lower']) / data['BB_Middle']}
+
+def _registrar_sma(nombre, parametro):
+    """Registra una media móvil simple cuya ventana es un parámetro técnico"""
+    @registrar_indicador(nombre, lambda p: [f'SMA_{p[parametro]}'])
+    def _sma(data, p):
+        return {f'SMA_{p[parametro]}': data['Close'].rolling(window=p[parametro]).mean()}
+    return _sma
+
+_registrar_sma('SMA_20', 'sma_short')
+_registrar_sma('SMA_50', 'sma_medium')
+_registrar_sma('SMA_200', 'sma_long')
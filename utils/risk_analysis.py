@@ -4,7 +4,18 @@ import pandas as pd
 import yfinance as yf
 from datetime import datetime, timedelta
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 import streamlit as st
+from utils.almacen_precios import obtener_precios_con_huella
+from utils.scoring import puntuar_registro, PERFIL_FUNDAMENTAL
+from utils.metricas_riesgo import (
+    rachas_maximas, serie_drawdown, drawdown_maximo, momentos, var_cvar, metricas_moviles
+)
+from utils.simulacion_riesgo import simular_montecarlo
+from utils.config import SIMULACION_CONFIG
+
+# Ventanas (días hábiles) de las métricas de riesgo móviles: trimestre, semestre y año
+VENTANAS_RIESGO_MOVIL = (63, 126, 252)
 
 def calcular_skewness_kurtosis(returns):
     """
@@ -32,254 +43,565 @@ def calcular_skewness_kurtosis(returns):
     except Exception as e:
         return 0, 0
 
+def obtener_base_riesgo(ticker_symbol, periodo_años=5):
+    """
+    Núcleo de riesgo compartido por métricas y gráficas
+    Lee una sola vez la acción y el S&P500 del almacén y calcula rendimientos, drawdown,
+    distribución y métricas, con caché por las huellas de ambos históricos y el período.
+    """
+    end_date = datetime.today()
+    start_date = end_date - timedelta(days=periodo_años * 365)
+    
+    stock_data, huella_accion = obtener_precios_con_huella(ticker_symbol, intervalo='1d', inicio=start_date, fin=end_date)
+    market_data, huella_mercado = obtener_precios_con_huella('^GSPC', intervalo='1d', inicio=start_date, fin=end_date)
+    return _construir_base_riesgo(huella_accion, huella_mercado, ticker_symbol, periodo_años, stock_data, market_data)
+
+@st.cache_data(ttl=3600, show_spinner=False, max_entries=50)
+def _construir_base_riesgo(huella_accion, huella_mercado, ticker_symbol, periodo_años, _stock_data, _market_data):
+    """
+    Calcula el intermedio compartido (los DataFrames no se hashean: la caché usa las huellas)
+    - 'rendimientos': rendimientos diarios de la acción
+    - 'rendimientos_mercado': rendimientos del S&P500 en las mismas fechas (NaN si faltan)
+    - 'drawdown': caída desde máximos de la acción
+    - 'distribucion': estadísticas de los rendimientos en % (None con menos de 30 días)
+    - 'metricas': métricas de riesgo (None si los datos no bastan, con el motivo en 'aviso')
+    - 'huella': huella del histórico de la acción (clave de cachés derivadas)
+    """
+    base = {
+        'huella': huella_accion,
+        'rendimientos': pd.Series(dtype='float64'),
+        'rendimientos_mercado': pd.Series(dtype='float64'),
+        'drawdown': pd.Series(dtype='float64'),
+        'distribucion': None,
+        'metricas': None,
+        'aviso': None
+    }
+    
+    if _stock_data.empty:
+        base['aviso'] = f"Datos insuficientes para {ticker_symbol}"
+        return base
+    
+    stock_close = _serie_cierre(_stock_data, ticker_symbol).dropna()
+    returns = stock_close.pct_change().dropna()
+    
+    # Drawdown desde máximos (lo usan la métrica y la gráfica)
+    drawdown = pd.Series(serie_drawdown(returns.to_numpy()), index=returns.index)
+    
+    base['rendimientos'] = returns
+    base['drawdown'] = drawdown
+    if len(returns) >= 30:
+        base['distribucion'] = _estadisticas_distribucion(returns * 100)
+    
+    if len(_stock_data) < 100:
+        base['aviso'] = f"Datos insuficientes para {ticker_symbol}"
+    elif _market_data.empty:
+        base['aviso'] = "No se pudieron obtener datos del mercado"
+    else:
+        market_close = _serie_cierre(_market_data, '^GSPC').dropna()
+        base['rendimientos_mercado'] = market_close.pct_change().reindex(returns.index)
+        base['metricas'], base['aviso'] = _calcular_metricas_riesgo(
+            stock_close, market_close, drawdown, periodo_años
+        )
+    return base
+
+def _serie_cierre(data, ticker_symbol):
+    """Columna de cierre de un histórico (admite columnas MultiIndex de yfinance)"""
+    if isinstance(data.columns, pd.MultiIndex):
+        return data[('Close', ticker_symbol)]
+    return data['Close']
+
+def _estadisticas_distribucion(returns):
+    """Estadísticas de la distribución de rendimientos (en %)"""
+    return {
+        'media': returns.mean(),
+        'desviacion': returns.std(),
+        'mediana': returns.median(),
+        'skewness': returns.skew(),
+        'kurtosis': returns.kurtosis(),
+        'percentiles': {
+            '1%': returns.quantile(0.01),
+            '5%': returns.quantile(0.05),
+            '25%': returns.quantile(0.25),
+            '75%': returns.quantile(0.75),
+            '95%': returns.quantile(0.95),
+            '99%': returns.quantile(0.99)
+        }
+    }
+
 def calcular_metricas_riesgo_avanzadas(ticker_symbol, periodo_años=5):
     """
-    Calcula métricas avanzadas de riesgo MEJORADAS para una acción
+    Calcula métricas avanzadas de riesgo MEJORADAS para una acción (a partir del núcleo de riesgo)
     """
     try:
-        # Descargar datos históricos
-        end_date = datetime.today()
-        start_date = end_date - timedelta(days=periodo_años * 365)
-        
         st.info(f"📊 Calculando métricas de riesgo para {ticker_symbol}...")
         
-        # Datos de la acción
-        stock_data = yf.download(ticker_symbol, start=start_date, end=end_date, interval='1d', progress=False)
-        if stock_data.empty or len(stock_data) < 100:
-            st.warning(f"Datos insuficientes para {ticker_symbol}")
-            return None
-            
-        # Datos del mercado (S&P500 como benchmark)
-        market_data = yf.download('^GSPC', start=start_date, end=end_date, interval='1d', progress=False)
-        if market_data.empty:
-            st.warning("No se pudieron obtener datos del mercado")
-            return None
-        
-        # Obtener precios de cierre
-        if isinstance(stock_data.columns, pd.MultiIndex):
-            stock_close = stock_data[('Close', ticker_symbol)]
-        else:
-            stock_close = stock_data['Close']
-            
-        if isinstance(market_data.columns, pd.MultiIndex):
-            market_close = market_data[('Close', '^GSPC')]
-        else:
-            market_close = market_data['Close']
-        
-        # Limpiar datos NaN
-        stock_close = stock_close.dropna()
-        market_close = market_close.dropna()
-        
-        if len(stock_close) < 100 or len(market_close) < 100:
-            st.warning("Datos insuficientes después de limpieza")
+        base = obtener_base_riesgo(ticker_symbol, periodo_años)
+        if base['metricas'] is None:
+            st.warning(base['aviso'])
             return None
         
-        # Calcular rendimientos
-        stock_returns = stock_close.pct_change().dropna()
-        market_returns = market_close.pct_change().dropna()
-        
-        # Alinear fechas
-        common_dates = stock_returns.index.intersection(market_returns.index)
-        if len(common_dates) < 50:
-            st.warning("No hay suficientes fechas comunes con el mercado")
-            return None
-            
-        stock_returns = stock_returns.loc[common_dates]
-        market_returns = market_returns.loc[common_dates]
+        st.success(f"✅ Métricas calculadas: {base['metricas']['Días Analizados']} días analizados")
+        return base['metricas']
         
-        if len(stock_returns) < 50:
-            st.warning("Rendimientos insuficientes para análisis")
-            return None
+    except Exception as e:
+        st.error(f"❌ Error calculando métricas de riesgo: {str(e)}")
+        st.error(f"Tipo de error: {type(e).__name__}")
+        return None
+
+def _calcular_metricas_riesgo(stock_close, market_close, drawdown, periodo_años):
+    """
+    Métricas de riesgo a partir de los cierres limpios y el drawdown del núcleo
+    Retorna: (dict de métricas, None) o (None, aviso) si los datos no son suficientes
+    """
+    if len(stock_close) < 100 or len(market_close) < 100:
+        return None, "Datos insuficientes después de limpieza"
+    
+    # Calcular rendimientos
+    stock_returns = stock_close.pct_change().dropna()
+    market_returns = market_close.pct_change().dropna()
+    
+    # Alinear fechas
+    common_dates = stock_returns.index.intersection(market_returns.index)
+    if len(common_dates) < 50:
+        return None, "No hay suficientes fechas comunes con el mercado"
         
-        # Convertir a arrays numpy
-        stock_returns_array = stock_returns.values
-        market_returns_array = market_returns.values
+    stock_returns = stock_returns.loc[common_dates]
+    market_returns = market_returns.loc[common_dates]
+    
+    if len(stock_returns) < 50:
+        return None, "Rendimientos insuficientes para análisis"
+    
+    # Convertir a arrays numpy
+    stock_returns_array = stock_returns.values
+    market_returns_array = market_returns.values
+    
+    # 1. CALCULAR BETA Y ALPHA
+    try:
+        covariance = np.cov(stock_returns_array, market_returns_array)[0, 1]
+        market_variance = np.var(market_returns_array)
+        beta = covariance / market_variance if market_variance != 0 else 1.0
+        
+        # Calcular rendimientos totales para Alpha
+        stock_total_return = (stock_close.iloc[-1] / stock_close.iloc[0] - 1)
+        market_total_return = (market_close.iloc[-1] / market_close.iloc[0] - 1)
+        alpha = stock_total_return - (beta * market_total_return)
+    except:
+        beta = 1.0
+        alpha = 0
+    
+    # 2. CALCULAR SHARPE RATIO
+    try:
+        risk_free_rate = 0.02 / 252  # Tasa libre de riesgo diaria (2% anual)
+        excess_returns = stock_returns_array - risk_free_rate
+        sharpe_ratio = (np.mean(excess_returns) / np.std(excess_returns)) * np.sqrt(252) if np.std(excess_returns) != 0 else 0
+    except:
+        sharpe_ratio = 0
+    
+    # 3. CALCULAR SORTINO RATIO (CORREGIDO)
+    try:
+        # Solo considerar rendimientos negativos para el denominador
+        negative_returns = stock_returns_array[stock_returns_array < 0]
+        downside_std = np.std(negative_returns) if len(negative_returns) > 0 else 0.001
+        
+        # Usar el mismo excess_returns que para Sharpe
+        sortino_ratio = (np.mean(excess_returns) / downside_std) * np.sqrt(252) if downside_std != 0 else 0
+    except:
+        sortino_ratio = 0
+    
+    # 4-5. VALUE AT RISK (VaR) Y EXPECTED SHORTFALL (CVaR): histórico, paramétrico y Cornish-Fisher
+    try:
+        estadisticos = momentos(stock_returns_array)
+        colas = var_cvar(stock_returns_array, (0.95, 0.99), estadisticos)
+        
+        var_95 = colas[0.95]['historico']['var']  # 5% peores rendimientos
+        var_95_annual = var_95 * np.sqrt(252)  # Anualizar
+        var_99 = colas[0.99]['historico']['var']
+        var_99_annual = var_99 * np.sqrt(252)
+        
+        # Promedio de los peores 5% rendimientos
+        cvar_95 = colas[0.95]['historico']['cvar']
+        cvar_95_annual = cvar_95 * np.sqrt(252) if not np.isnan(cvar_95) else 0
+        
+        var_95_parametrico = colas[0.95]['parametrico']['var']
+        var_95_cornish_fisher = colas[0.95]['cornish_fisher']['var']
+        cvar_95_cornish_fisher = colas[0.95]['cornish_fisher']['cvar']
+    except:
+        estadisticos = None
+        var_95 = 0
+        var_95_annual = 0
+        var_99 = 0
+        var_99_annual = 0
+        cvar_95_annual = 0
+        var_95_parametrico = 0
+        var_95_cornish_fisher = 0
+        cvar_95_cornish_fisher = 0
+    
+    # 6. CALCULAR DRAWDOWN MÁXIMO - CORREGIDO
+    try:
+        # Serie de drawdown calculada una sola vez en el núcleo
+        max_drawdown, fila_minimo, fila_inicio = drawdown_maximo(drawdown.to_numpy())
         
-        # 1. CALCULAR BETA Y ALPHA
-        try:
-            covariance = np.cov(stock_returns_array, market_returns_array)[0, 1]
-            market_variance = np.var(market_returns_array)
-            beta = covariance / market_variance if market_variance != 0 else 1.0
-            
-            # Calcular rendimientos totales para Alpha
-            stock_total_return = (stock_close.iloc[-1] / stock_close.iloc[0] - 1)
-            market_total_return = (market_close.iloc[-1] / market_close.iloc[0] - 1)
-            alpha = stock_total_return - (beta * market_total_return)
-        except:
-            beta = 1.0
-            alpha = 0
-        
-        # 2. CALCULAR SHARPE RATIO
-        try:
-            risk_free_rate = 0.02 / 252  # Tasa libre de riesgo diaria (2% anual)
-            excess_returns = stock_returns_array - risk_free_rate
-            sharpe_ratio = (np.mean(excess_returns) / np.std(excess_returns)) * np.sqrt(252) if np.std(excess_returns) != 0 else 0
-        except:
-            sharpe_ratio = 0
-        
-        # 3. CALCULAR SORTINO RATIO (CORREGIDO)
-        try:
-            # Solo considerar rendimientos negativos para el denominador
-            negative_returns = stock_returns_array[stock_returns_array < 0]
-            downside_std = np.std(negative_returns) if len(negative_returns) > 0 else 0.001
-            
-            # Usar el mismo excess_returns que para Sharpe
-            sortino_ratio = (np.mean(excess_returns) / downside_std) * np.sqrt(252) if downside_std != 0 else 0
-        except:
-            sortino_ratio = 0
-        
-        # 4. CALCULAR VALUE AT RISK (VaR) - CORREGIDO
-        try:
-            # VaR histórico (no paramétrico)
-            var_95 = np.percentile(stock_returns_array, 5)  # 5% peores rendimientos
-            var_95_annual = var_95 * np.sqrt(252)  # Anualizar
-            
-            # VaR 99%
-            var_99 = np.percentile(stock_returns_array, 1)
-            var_99_annual = var_99 * np.sqrt(252)
-        except:
-            var_95 = 0
-            var_95_annual = 0
-            var_99 = 0
-            var_99_annual = 0
-        
-        # 5. CALCULAR EXPECTED SHORTFALL (CVaR) - CORREGIDO
-        try:
-            # Promedio de los peores 5% rendimientos
-            cvar_95 = stock_returns_array[stock_returns_array <= var_95].mean()
-            cvar_95_annual = cvar_95 * np.sqrt(252) if not np.isnan(cvar_95) else 0
-        except:
-            cvar_95_annual = 0
-        
-        # 6. CALCULAR DRAWDOWN MÁXIMO - CORREGIDO
-        try:
-            # Calcular retornos acumulados
-            cumulative_returns = (1 + stock_returns).cumprod()
-            rolling_max = cumulative_returns.expanding().max()
-            drawdown = (cumulative_returns - rolling_max) / rolling_max
-            max_drawdown = drawdown.min()
-            
-            # Calcular duración del drawdown máximo
-            max_dd_idx = drawdown.idxmin()
-            # Encontrar el inicio del drawdown (último máximo antes del mínimo)
-            drawdown_period = drawdown[:max_dd_idx]
-            max_dd_start = drawdown_period[drawdown_period == 0].last_valid_index()
-            
-            if max_dd_start is not None:
-                max_dd_duration = (max_dd_idx - max_dd_start).days
-            else:
-                max_dd_duration = 0
-        except:
-            max_drawdown = 0
+        # Duración desde el último máximo antes del mínimo
+        if fila_inicio >= 0:
+            max_dd_duration = (drawdown.index[fila_minimo] - drawdown.index[fila_inicio]).days
+        else:
             max_dd_duration = 0
-        
-        # 7. CALCULAR VOLATILIDAD ANUALIZADA
-        try:
-            volatility_annual = np.std(stock_returns_array) * np.sqrt(252)
-        except:
-            volatility_annual = 0
-        
-        # 8. CALCULAR CORRELACIÓN CON S&P500
-        try:
-            correlation_sp500 = np.corrcoef(stock_returns_array, market_returns_array)[0, 1]
-            if np.isnan(correlation_sp500):
-                correlation_sp500 = 0
-        except:
+    except:
+        max_drawdown = 0
+        max_dd_duration = 0
+    
+    # 7. CALCULAR VOLATILIDAD ANUALIZADA
+    try:
+        volatility_annual = np.std(stock_returns_array) * np.sqrt(252)
+    except:
+        volatility_annual = 0
+    
+    # 8. CALCULAR CORRELACIÓN CON S&P500
+    try:
+        correlation_sp500 = np.corrcoef(stock_returns_array, market_returns_array)[0, 1]
+        if np.isnan(correlation_sp500):
             correlation_sp500 = 0
-        
-        # 9. CALCULAR MÁXIMO GANANCIA/PÉRDIDA CONSECUTIVA - CORREGIDO
-        try:
-            positive_streak = 0
-            negative_streak = 0
-            max_positive_streak = 0
-            max_negative_streak = 0
-            
-            for ret in stock_returns_array:
-                if ret > 0:
-                    positive_streak += 1
-                    negative_streak = 0
-                    max_positive_streak = max(max_positive_streak, positive_streak)
-                elif ret < 0:
-                    negative_streak += 1
-                    positive_streak = 0
-                    max_negative_streak = max(max_negative_streak, negative_streak)
-        except:
-            max_positive_streak = 0
-            max_negative_streak = 0
-        
-        # 10. CALCULAR SKEWNESS Y KURTOSIS - CORREGIDO
-        try:
-            if len(stock_returns_array) >= 4:
-                skewness = float(pd.Series(stock_returns_array).skew())
-                kurtosis = float(pd.Series(stock_returns_array).kurtosis())
-            else:
-                skewness = 0
-                kurtosis = 0
-        except:
+    except:
+        correlation_sp500 = 0
+    
+    # 9. CALCULAR MÁXIMO GANANCIA/PÉRDIDA CONSECUTIVA - CORREGIDO
+    try:
+        max_positive_streak, max_negative_streak = (int(racha) for racha in rachas_maximas(stock_returns_array))
+    except:
+        max_positive_streak = 0
+        max_negative_streak = 0
+    
+    # 10. CALCULAR SKEWNESS Y KURTOSIS - CORREGIDO
+    try:
+        if len(stock_returns_array) >= 4 and estadisticos is not None:
+            skewness = float(estadisticos['asimetria'])
+            kurtosis = float(estadisticos['curtosis'])
+        else:
             skewness = 0
             kurtosis = 0
+    except:
+        skewness = 0
+        kurtosis = 0
+    
+    # 11. CALCULAR PROBABILIDAD DE PÉRDIDA - CORREGIDO
+    try:
+        prob_loss = (np.sum(stock_returns_array < 0) / len(stock_returns_array)) * 100
+    except:
+        prob_loss = 50
+    
+    # 12. CALCULAR TREYNOR RATIO
+    try:
+        treynor_ratio = (stock_total_return - 0.02) / beta if beta != 0 else 0
+    except:
+        treynor_ratio = 0
+    
+    # 13. CALCULAR INFORMATION RATIO
+    try:
+        active_returns = stock_returns_array - market_returns_array
+        tracking_error = np.std(active_returns) * np.sqrt(252) if len(active_returns) > 0 else 0
+        information_ratio = (stock_total_return - market_total_return) / tracking_error if tracking_error != 0 else 0
+    except:
+        information_ratio = 0
+    
+    return {
+        # Métricas básicas
+        'Beta': beta,
+        'Alpha': alpha,
+        'Sharpe Ratio': sharpe_ratio,
+        'Sortino Ratio': sortino_ratio,
+        'Treynor Ratio': treynor_ratio,
+        'Information Ratio': information_ratio,
+        
+        # Métricas de riesgo
+        'VaR 95% Diario': var_95,
+        'VaR 95% Anual': var_95_annual,
+        'VaR 99% Diario': var_99,
+        'VaR 99% Anual': var_99_annual,
+        'Expected Shortfall 95%': cvar_95_annual,
+        'VaR 95% Paramétrico': var_95_parametrico,
+        'VaR 95% Cornish-Fisher': var_95_cornish_fisher,
+        'Expected Shortfall 95% Cornish-Fisher': cvar_95_cornish_fisher,
+        'Drawdown Máximo': max_drawdown,
+        'Duración Drawdown (días)': max_dd_duration,
+        'Volatilidad Anual': volatility_annual,
+        
+        # Correlaciones
+        'Correlación S&P500': correlation_sp500,
+        
+        # Estadísticas avanzadas
+        'Máxima Ganancia Consecutiva': max_positive_streak,
+        'Máxima Pérdida Consecutiva': max_negative_streak,
+        'Skewness': skewness,
+        'Kurtosis': kurtosis,
+        'Probabilidad de Pérdida (%)': prob_loss,
+        
+        # Rendimientos
+        'Rendimiento Total': stock_total_return,
+        'Rendimiento Mercado': market_total_return,
+        'Días Analizados': len(stock_returns),
+        'Período': f"{periodo_años} años"
+    }, None
+
+def tabla_riesgo_universo(cierres, cierre_mercado, tasa_libre=0.02):
+    """
+    Métricas de calcular_metricas_riesgo_avanzadas para todo un panel de cierres en una pasada
+    `cierres` tiene una columna por ticker y `cierre_mercado` es el cierre del S&P500 en las mismas
+    fechas. Beta, correlación y tracking error salen de productos matriciales contra el mercado y
+    el resto de utils.metricas_riesgo, con las mismas reglas que el cálculo individual (mínimo de
+    100 cierres y 50 días comunes con el mercado; si no, la fila queda en NaN).
+    Retorna: DataFrame indexado por ticker con una columna por métrica
+    """
+    if cierres is None or cierres.empty or cierre_mercado is None:
+        return pd.DataFrame()
+    
+    cierres = cierres.astype('float64')
+    mercado = cierre_mercado.reindex(cierres.index).astype('float64')
+    
+    # Rendimientos sobre el último cierre válido (como pct_change tras dropna, por columna)
+    rendimientos = (cierres / cierres.ffill().shift(1) - 1).to_numpy()
+    rend_mercado = (mercado / mercado.ffill().shift(1) - 1).to_numpy()
+    
+    comunes = ~np.isnan(rendimientos) & ~np.isnan(rend_mercado)[:, None]
+    n = comunes.sum(axis=0).astype('float64')
+    accion = np.where(comunes, rendimientos, np.nan)
+    x = np.nan_to_num(accion)
+    m = np.nan_to_num(rend_mercado)
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Momentos conjuntos con un único producto contra el mercado
+        suma_x = x.sum(axis=0)
+        suma_m = m @ comunes
+        media_x = suma_x / n
+        media_m = suma_m / n
+        cov = (m @ x - suma_x * suma_m / n) / (n - 1)
+        var_x = (x ** 2).sum(axis=0) / n - media_x ** 2
+        var_m = (m ** 2) @ comunes / n - media_m ** 2
+        activos = np.where(comunes, x - m[:, None], 0.0)
+        var_activa = (activos ** 2).sum(axis=0) / n - (activos.sum(axis=0) / n) ** 2
+        
+        # Beta como en el cálculo individual (np.cov con ddof=1 entre np.var con ddof=0)
+        beta = np.where(var_m != 0, cov / var_m, 1.0)
+        correlacion = np.nan_to_num(cov * (n - 1) / n / np.sqrt(var_x * var_m))
+        
+        primeros = cierres.bfill().iloc[0].to_numpy()
+        ultimos = cierres.ffill().iloc[-1].to_numpy()
+        total_accion = ultimos / primeros - 1
+        mercado_valido = mercado.dropna()
+        total_mercado = mercado_valido.iloc[-1] / mercado_valido.iloc[0] - 1 if len(mercado_valido) else np.nan
+        alpha = total_accion - beta * total_mercado
+        
+        # Sharpe y Sortino con la tasa libre de riesgo diaria
+        desviacion = np.sqrt(np.maximum(var_x, 0))
+        exceso = media_x - tasa_libre / 252
+        sharpe = np.where(desviacion != 0, exceso / desviacion * np.sqrt(252), 0.0)
+        negativos = np.where(comunes & (x < 0), x, np.nan)
+        n_negativos = (~np.isnan(negativos)).sum(axis=0)
+        media_neg = np.nansum(negativos, axis=0) / n_negativos
+        desv_neg = np.sqrt(np.nansum((negativos - media_neg) ** 2, axis=0) / n_negativos)
+        desv_neg = np.where(n_negativos > 0, desv_neg, 0.001)
+        sortino = np.where(desv_neg != 0, exceso / desv_neg * np.sqrt(252), 0.0)
+        
+        treynor = np.where(beta != 0, (total_accion - tasa_libre) / beta, 0.0)
+        tracking_error = np.sqrt(np.maximum(var_activa, 0)) * np.sqrt(252)
+        information = np.where(tracking_error != 0, (total_accion - total_mercado) / tracking_error, 0.0)
+        prob_perdida = (comunes & (x < 0)).sum(axis=0) / n * 100
+    
+    # Colas, rachas y momentos sobre los días comunes; drawdown sobre toda la serie de la acción
+    estadisticos = momentos(accion)
+    colas = var_cvar(accion, (0.95, 0.99), estadisticos)
+    positivas, negativas = rachas_maximas(accion)
+    minimo, fila_minimo, fila_inicio = drawdown_maximo(serie_drawdown(rendimientos))
+    fechas = cierres.index.to_numpy()
+    duracion = np.where(
+        fila_inicio >= 0,
+        (fechas[fila_minimo] - fechas[np.maximum(fila_inicio, 0)]) / np.timedelta64(1, 'D'),
+        0
+    )
+    
+    tabla = pd.DataFrame({
+        'Beta': beta,
+        'Alpha': alpha,
+        'Sharpe Ratio': sharpe,
+        'Sortino Ratio': sortino,
+        'Treynor Ratio': treynor,
+        'Information Ratio': information,
+        'VaR 95% Diario': colas[0.95]['historico']['var'],
+        'VaR 95% Anual': colas[0.95]['historico']['var'] * np.sqrt(252),
+        'VaR 99% Diario': colas[0.99]['historico']['var'],
+        'VaR 99% Anual': colas[0.99]['historico']['var'] * np.sqrt(252),
+        'Expected Shortfall 95%': colas[0.95]['historico']['cvar'] * np.sqrt(252),
+        'VaR 95% Paramétrico': colas[0.95]['parametrico']['var'],
+        'VaR 95% Cornish-Fisher': colas[0.95]['cornish_fisher']['var'],
+        'Expected Shortfall 95% Cornish-Fisher': colas[0.95]['cornish_fisher']['cvar'],
+        'Drawdown Máximo': minimo,
+        'Duración Drawdown (días)': duracion,
+        'Volatilidad Anual': desviacion * np.sqrt(252),
+        'Correlación S&P500': correlacion,
+        'Máxima Ganancia Consecutiva': positivas,
+        'Máxima Pérdida Consecutiva': negativas,
+        'Skewness': np.nan_to_num(estadisticos['asimetria']),
+        'Kurtosis': np.nan_to_num(estadisticos['curtosis']),
+        'Probabilidad de Pérdida (%)': prob_perdida,
+        'Rendimiento Total': total_accion,
+        'Rendimiento Mercado': total_mercado,
+        'Días Analizados': n
+    }, index=cierres.columns)
+    
+    # Mismos mínimos de datos que _calcular_metricas_riesgo
+    suficientes = (cierres.notna().sum().to_numpy() >= 100) & (mercado.notna().sum() >= 100) & (n >= 50)
+    tabla.loc[~suficientes] = np.nan
+    tabla.index.name = 'Símbolo'
+    return tabla
+
+def calcular_metricas_moviles(ticker_symbol, periodo_años=5, ventanas=VENTANAS_RIESGO_MOVIL):
+    """
+    Beta, volatilidad, Sharpe y drawdown móviles a partir del núcleo de riesgo
+    Cada ventana se calcula en O(n) con sumas acumuladas, así que 20+ años de datos diarios no
+    cuestan más que unas pocas décimas de milisegundo por ventana.
+    Retorna: {ventana: DataFrame con una columna por métrica} ({} sin datos del mercado)
+    """
+    base = obtener_base_riesgo(ticker_symbol, periodo_años)
+    rendimientos = base['rendimientos']
+    if rendimientos.empty or base['rendimientos_mercado'].empty:
+        return {}
+    
+    moviles = {}
+    for ventana in ventanas:
+        if len(rendimientos) < ventana:
+            continue
+        series = metricas_moviles(rendimientos.to_numpy(), base['rendimientos_mercado'].to_numpy(), ventana)
+        moviles[ventana] = pd.DataFrame({
+            'Beta': series['beta'],
+            'Volatilidad Anual': series['volatilidad'],
+            'Sharpe Ratio': series['sharpe'],
+            'Drawdown': series['drawdown']
+        }, index=rendimientos.index)
+    return moviles
+
+def crear_grafica_metricas_moviles(ticker_symbol, periodo_años=5, ventanas=VENTANAS_RIESGO_MOVIL):
+    """
+    Crea gráfica de beta, volatilidad, Sharpe y drawdown móviles (una línea por ventana)
+    """
+    try:
+        moviles = calcular_metricas_moviles(ticker_symbol, periodo_años, ventanas)
+        if not moviles:
+            return None
         
-        # 11. CALCULAR PROBABILIDAD DE PÉRDIDA - CORREGIDO
-        try:
-            prob_loss = (np.sum(stock_returns_array < 0) / len(stock_returns_array)) * 100
-        except:
-            prob_loss = 50
+        paneles = [
+            ('Beta', 'Beta', '.2f'),
+            ('Volatilidad Anual', 'Volatilidad (%)', '.1%'),
+            ('Sharpe Ratio', 'Sharpe', '.2f'),
+            ('Drawdown', 'Drawdown (%)', '.1%')
+        ]
+        colores = ['#1f77b4', '#ff7f0e', '#2ca02c']
+        
+        fig = make_subplots(rows=len(paneles), cols=1, shared_xaxes=True, vertical_spacing=0.04,
+                            subplot_titles=[titulo for _, titulo, _ in paneles])
+        
+        for i, (ventana, datos) in enumerate(moviles.items()):
+            for fila, (columna, titulo, formato) in enumerate(paneles, start=1):
+                fig.add_trace(go.Scatter(
+                    x=datos.index,
+                    y=datos[columna],
+                    mode='lines',
+                    name=f'{ventana} días',
+                    legendgroup=str(ventana),
+                    showlegend=(fila == 1),
+                    line=dict(color=colores[i % len(colores)], width=1.5),
+                    hovertemplate=f'{ventana} días: %{{y:{formato}}}<extra></extra>'
+                ), row=fila, col=1)
+        
+        # Referencias: beta de mercado y Sharpe nulo
+        fig.add_hline(y=1, line_dash="dash", line_color="gray", row=1, col=1)
+        fig.add_hline(y=0, line_dash="dash", line_color="gray", row=3, col=1)
+        fig.update_yaxes(tickformat='.0%', row=2, col=1)
+        fig.update_yaxes(tickformat='.0%', row=4, col=1)
         
-        # 12. CALCULAR TREYNOR RATIO
-        try:
-            treynor_ratio = (stock_total_return - 0.02) / beta if beta != 0 else 0
-        except:
-            treynor_ratio = 0
+        fig.update_layout(
+            title=f'Métricas de Riesgo Móviles - {ticker_symbol}',
+            height=900,
+            hovermode='x unified',
+            legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1)
+        )
         
-        # 13. CALCULAR INFORMATION RATIO
-        try:
-            active_returns = stock_returns_array - market_returns_array
-            tracking_error = np.std(active_returns) * np.sqrt(252) if len(active_returns) > 0 else 0
-            information_ratio = (stock_total_return - market_total_return) / tracking_error if tracking_error != 0 else 0
-        except:
-            information_ratio = 0
+        return fig
         
-        st.success(f"✅ Métricas calculadas: {len(stock_returns)} días analizados")
+    except Exception as e:
+        st.error(f"Error creando gráfica de métricas móviles: {str(e)}")
+        return None
+
+def simular_var_montecarlo(ticker_symbol, modelo='bootstrap', trayectorias=None, horizontes=None,
+                           semilla=None, periodo_años=5):
+    """
+    VaR/CVaR Monte Carlo de una acción a partir de los rendimientos del núcleo de riesgo
+    Modelos: 'bootstrap', 'gbm' o 't' (ver utils/simulacion_riesgo). Con la misma semilla y el
+    mismo histórico el resultado es idéntico, así que se cachea por huella y parámetros.
+    Retorna: dict de simular_montecarlo o None si no hay datos suficientes
+    """
+    base = obtener_base_riesgo(ticker_symbol, periodo_años)
+    if len(base['rendimientos']) < 30:
+        return None
+    return _simular_var_montecarlo(
+        base['huella'], periodo_años, modelo,
+        int(trayectorias or SIMULACION_CONFIG['trayectorias']),
+        tuple(horizontes or SIMULACION_CONFIG['horizontes']),
+        SIMULACION_CONFIG['semilla'] if semilla is None else semilla,
+        base['rendimientos'].to_numpy()
+    )
+
+@st.cache_data(ttl=3600, show_spinner=False, max_entries=50)
+def _simular_var_montecarlo(huella, periodo_años, modelo, trayectorias, horizontes, semilla, _rendimientos):
+    """
+    Simulación cacheada por huella del histórico (el array de rendimientos no se hashea)
+    En este proceso: arrancar procesos desde el servidor de Streamlit (con hilos) cuesta más que
+    la simulación y un fork puede heredar candados tomados.
+    """
+    return simular_montecarlo(_rendimientos, modelo, trayectorias, horizontes, semilla=semilla, procesos=1)
+
+def crear_grafica_montecarlo(simulacion, ticker_symbol):
+    """
+    Crea gráfica de abanico con los percentiles simulados del rendimiento acumulado por horizonte
+    """
+    try:
+        horizontes = list(simulacion['horizontes'])
+        percentiles = simulacion['percentiles']
+        fig = go.Figure()
         
-        return {
-            # Métricas básicas
-            'Beta': beta,
-            'Alpha': alpha,
-            'Sharpe Ratio': sharpe_ratio,
-            'Sortino Ratio': sortino_ratio,
-            'Treynor Ratio': treynor_ratio,
-            'Information Ratio': information_ratio,
-            
-            # Métricas de riesgo
-            'VaR 95% Diario': var_95,
-            'VaR 95% Anual': var_95_annual,
-            'VaR 99% Diario': var_99,
-            'VaR 99% Anual': var_99_annual,
-            'Expected Shortfall 95%': cvar_95_annual,
-            'Drawdown Máximo': max_drawdown,
-            'Duración Drawdown (días)': max_dd_duration,
-            'Volatilidad Anual': volatility_annual,
-            
-            # Correlaciones
-            'Correlación S&P500': correlation_sp500,
-            
-            # Estadísticas avanzadas
-            'Máxima Ganancia Consecutiva': max_positive_streak,
-            'Máxima Pérdida Consecutiva': max_negative_streak,
-            'Skewness': skewness,
-            'Kurtosis': kurtosis,
-            'Probabilidad de Pérdida (%)': prob_loss,
-            
-            # Rendimientos
-            'Rendimiento Total': stock_total_return,
-            'Rendimiento Mercado': market_total_return,
-            'Días Analizados': len(stock_returns),
-            'Período': f"{periodo_años} años"
-        }
+        # Bandas 1-99, 5-95 y 25-75 alrededor de la mediana
+        for bajo, alto, opacidad in ((1, 99, 0.15), (5, 95, 0.3), (25, 75, 0.45)):
+            fig.add_trace(go.Scatter(
+                x=horizontes + horizontes[::-1],
+                y=list(percentiles[alto] * 100) + list(percentiles[bajo][::-1] * 100),
+                fill='toself',
+                fillcolor=f'rgba(31, 119, 180, {opacidad})',
+                line=dict(width=0),
+                name=f'Percentiles {bajo}-{alto}',
+                hoverinfo='skip'
+            ))
+        
+        fig.add_trace(go.Scatter(
+            x=horizontes, y=percentiles[50] * 100, mode='lines+markers',
+            line=dict(color='#0d47a1', width=2), name='Mediana',
+            hovertemplate='%{x} días: %{y:.2f}%<extra></extra>'
+        ))
+        for nivel, color in zip(sorted(simulacion['var']), ['orange', 'red']):
+            fig.add_trace(go.Scatter(
+                x=horizontes, y=simulacion['var'][nivel] * 100, mode='lines+markers',
+                line=dict(color=color, width=2, dash='dash'), name=f'VaR {nivel:.0%}',
+                hovertemplate='%{x} días: %{y:.2f}%<extra></extra>'
+            ))
+        
+        fig.update_layout(
+            title=f"Simulación Monte Carlo ({simulacion['trayectorias']:,} trayectorias, {simulacion['modelo']}) - {ticker_symbol}",
+            xaxis_title='Horizonte (días hábiles)',
+            yaxis_title='Rendimiento acumulado (%)',
+            height=450,
+            hovermode='x unified'
+        )
+        return fig
         
     except Exception as e:
-        st.error(f"❌ Error calculando métricas de riesgo: {str(e)}")
-        st.error(f"Tipo de error: {type(e).__name__}")
+        st.error(f"Error creando gráfica Monte Carlo: {str(e)}")
         return None
 
 def crear_grafica_drawdown_mejorada(ticker_symbol, periodo_años=5):
@@ -287,26 +609,11 @@ def crear_grafica_drawdown_mejorada(ticker_symbol, periodo_años=5):
     Crea gráfica de drawdown MEJORADA para visualizar pérdidas máximas
     """
     try:
-        # Descargar datos
-        end_date = datetime.today()
-        start_date = end_date - timedelta(days=periodo_años * 365)
-        
-        stock_data = yf.download(ticker_symbol, start=start_date, end=end_date, interval='1d')
-        if stock_data.empty:
+        # Drawdown del núcleo de riesgo (sin nueva descarga)
+        drawdown = obtener_base_riesgo(ticker_symbol, periodo_años)['drawdown']
+        if drawdown.empty:
             return None
         
-        # Manejar MultiIndex columns
-        if isinstance(stock_data.columns, pd.MultiIndex):
-            stock_close = stock_data[('Close', ticker_symbol)]
-        else:
-            stock_close = stock_data['Close']
-        
-        # Calcular drawdown
-        returns = stock_close.pct_change().dropna()
-        cumulative_returns = (1 + returns).cumprod()
-        rolling_max = cumulative_returns.expanding().max()
-        drawdown = (cumulative_returns - rolling_max) / rolling_max
-        
         # Crear gráfica
         fig = go.Figure()
         
@@ -361,46 +668,28 @@ def crear_grafica_distribucion_retornos(ticker_symbol, periodo_años=5):
     Crea gráfica de distribución de retornos diarios COMPLETA con estadísticas avanzadas
     """
     try:
-        # Descargar datos históricos
-        end_date = datetime.today()
-        start_date = end_date - timedelta(days=periodo_años * 365)
-        
         st.info(f"📊 Calculando distribución de retornos para {ticker_symbol} ({periodo_años} años)...")
         
-        stock_data = yf.download(ticker_symbol, start=start_date, end=end_date, interval='1d', progress=False)
-        if stock_data.empty:
+        # Rendimientos y estadísticas del núcleo de riesgo (sin nueva descarga)
+        base = obtener_base_riesgo(ticker_symbol, periodo_años)
+        if base['rendimientos'].empty:
             st.warning(f"No se pudieron obtener datos para {ticker_symbol}")
             return None
         
-        # Manejar MultiIndex columns
-        if isinstance(stock_data.columns, pd.MultiIndex):
-            stock_close = stock_data[('Close', ticker_symbol)]
-        else:
-            stock_close = stock_data['Close']
-        
-        # Calcular retornos diarios en porcentaje
-        returns = stock_close.pct_change().dropna() * 100
+        # Retornos diarios en porcentaje
+        returns = base['rendimientos'] * 100
         
-        if len(returns) < 30:
+        if base['distribucion'] is None:
             st.warning(f"Datos insuficientes para análisis: solo {len(returns)} días de trading")
             return None
         
-        # Calcular estadísticas avanzadas
-        mean_return = returns.mean()
-        std_return = returns.std()
-        median_return = returns.median()
-        skewness = returns.skew()
-        kurtosis = returns.kurtosis()
-        
-        # Calcular percentiles
-        percentiles = {
-            '1%': returns.quantile(0.01),
-            '5%': returns.quantile(0.05),
-            '25%': returns.quantile(0.25),
-            '75%': returns.quantile(0.75),
-            '95%': returns.quantile(0.95),
-            '99%': returns.quantile(0.99)
-        }
+        distribucion = base['distribucion']
+        mean_return = distribucion['media']
+        std_return = distribucion['desviacion']
+        median_return = distribucion['mediana']
+        skewness = distribucion['skewness']
+        kurtosis = distribucion['kurtosis']
+        percentiles = distribucion['percentiles']
         
         # Crear figura principal
         fig = go.Figure()
@@ -668,86 +957,5 @@ def calcular_scoring_fundamental(info):
     """
     Calcula scoring fundamental basado en múltiples métricas
     """
-    score = 0
-    max_score = 100
-    metricas = {}
-    
-    # P/E Ratio (15 puntos)
-    pe = info.get('trailingPE', 0)
-    if pe and pe > 0:
-        if pe < 15:
-            score += 15
-            metricas['P/E'] = '🟢 Excelente'
-        elif pe < 25:
-            score += 10
-            metricas['P/E'] = '🟡 Bueno'
-        else:
-            score += 5
-            metricas['P/E'] = '🔴 Alto'
-    
-    # ROE (15 puntos)
-    roe = info.get('returnOnEquity', 0)
-    if roe and roe > 0:
-        if roe > 0.15:
-            score += 15
-            metricas['ROE'] = '🟢 Excelente'
-        elif roe > 0.08:
-            score += 10
-            metricas['ROE'] = '🟡 Bueno'
-        else:
-            score += 5
-            metricas['ROE'] = '🔴 Bajo'
-    
-    # Deuda/Equity (15 puntos)
-    deuda_eq = info.get('debtToEquity', 0)
-    if deuda_eq and deuda_eq > 0:
-        if deuda_eq < 0.5:
-            score += 15
-            metricas['Deuda/Equity'] = '🟢 Excelente'
-        elif deuda_eq < 1.0:
-            score += 10
-            metricas['Deuda/Equity'] = '🟡 Bueno'
-        else:
-            score += 5
-            metricas['Deuda/Equity'] = '🔴 Alto'
-    
-    # Margen Beneficio (15 puntos)
-    margen = info.get('profitMargins', 0)
-    if margen and margen > 0:
-        if margen > 0.2:
-            score += 15
-            metricas['Margen Beneficio'] = '🟢 Excelente'
-        elif margen > 0.1:
-            score += 10
-            metricas['Margen Beneficio'] = '🟡 Bueno'
-        else:
-            score += 5
-            metricas['Margen Beneficio'] = '🔴 Bajo'
-    
-    # Crecimiento Ingresos (20 puntos)
-    crecimiento = info.get('revenueGrowth', 0)
-    if crecimiento and crecimiento > 0:
-        if crecimiento > 0.15:
-            score += 20
-            metricas['Crecimiento Ingresos'] = '🟢 Excelente'
-        elif crecimiento > 0.08:
-            score += 15
-            metricas['Crecimiento Ingresos'] = '🟡 Bueno'
-        else:
-            score += 8
-            metricas['Crecimiento Ingresos'] = '🔴 Bajo'
-    
-    # Rating Analistas (20 puntos)
-    rating_mean = info.get('recommendationMean', 3)
-    if rating_mean and rating_mean > 0:
-        if rating_mean < 2:
-            score += 20
-            metricas['Rating Analistas'] = '🟢 Fuerte Compra'
-        elif rating_mean < 3:
-            score += 15
-            metricas['Rating Analistas'] = '🟡 Compra'
-        else:
-            score += 8
-            metricas['Rating Analistas'] = '🔴 Neutral/Venta'
-    
-    return min(score, max_score), metricas
\ No newline at end of file
+    return puntuar_registro(info, PERFIL_FUNDAMENTAL)
+
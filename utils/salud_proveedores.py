@@ -0,0 +1,120 @@
+# utils/salud_proveedores.py
+"""
+Salud de cada proveedor de datos: cortacircuitos y percentiles de latencia
+Un único registro por proveedor para todo el proceso. Tras varios fallos seguidos el circuito se
+abre y las llamadas a ese proveedor se descartan al instante (sin esperar el timeout) hasta que
+pasa el enfriamiento; entonces se deja pasar una sola petición de prueba que lo cierra o lo
+vuelve a abrir. Las latencias recientes dan el percentil tras el que conviene lanzar en paralelo
+el siguiente proveedor de la cadena (petición de cobertura).
+"""
+
+import time
+from collections import deque
+from threading import Lock
+
+import numpy as np
+
+from utils.config import SALUD_PROVEEDORES_CONFIG
+
+_proveedores = {}
+_candado_proveedores = Lock()
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+class SaludProveedor:
+    """Cortacircuitos (cerrado → abierto → semiabierto) y ventana de latencias de un proveedor"""
+
+    def __init__(self, fallos_apertura, enfriamiento, muestras):
+        self.fallos_apertura = fallos_apertura
+        self.enfriamiento = enfriamiento
+        self._latencias = deque(maxlen=muestras)
+        self._estado = CERRADO
+        self._fallos_seguidos = 0
+        self._abierto_hasta = 0.0
+        self._sondeo_en_curso = False
+        self._llamadas = 0
+        self._fallos = 0
+        self._descartadas = 0
+        self._candado = Lock()
+
+    def permitir(self):
+        """Indica si se puede llamar al proveedor (con el circuito abierto solo pasa una prueba)"""
+        with self._candado:
+            if self._estado == CERRADO:
+                return True
+            if self._estado == ABIERTO and time.monotonic() >= self._abierto_hasta:
+                self._estado = SEMIABIERTO
+                self._sondeo_en_curso = False
+            if self._estado == SEMIABIERTO and not self._sondeo_en_curso:
+                self._sondeo_en_curso = True
+                return True
+            self._descartadas += 1
+            return False
+
+    def liberar_prueba(self):
+        """Devuelve el turno de prueba si al final no se hizo la llamada autorizada por permitir()"""
+        with self._candado:
+            self._sondeo_en_curso = False
+
+    def registrar(self, exito, segundos):
+        """Anota el resultado y la latencia de una llamada"""
+        with self._candado:
+            self._llamadas += 1
+            self._latencias.append(segundos)
+            if exito:
+                self._fallos_seguidos = 0
+                self._estado = CERRADO
+            else:
+                self._fallos += 1
+                self._fallos_seguidos += 1
+                if self._estado == SEMIABIERTO or self._fallos_seguidos >= self.fallos_apertura:
+                    self._estado = ABIERTO
+                    self._abierto_hasta = time.monotonic() + self.enfriamiento
+            self._sondeo_en_curso = False
+
+    def percentil(self, p):
+        """Percentil p de las latencias recientes en segundos (None sin muestras suficientes)"""
+        with self._candado:
+            latencias = list(self._latencias)
+        if len(latencias) < SALUD_PROVEEDORES_CONFIG["muestras_minimas"]:
+            return None
+        return float(np.percentile(latencias, p))
+
+    def espera_cobertura(self):
+        """Segundos que se espera a este proveedor antes de lanzar el siguiente en paralelo"""
+        percentil = self.percentil(SALUD_PROVEEDORES_CONFIG["percentil_cobertura"])
+        if percentil is None:
+            return SALUD_PROVEEDORES_CONFIG["cobertura_por_defecto"]
+        return max(SALUD_PROVEEDORES_CONFIG["cobertura_minima"], percentil)
+
+    def resumen(self):
+        """Estado, contadores y percentiles de latencia para mostrar en la interfaz"""
+        with self._candado:
+            resumen = {
+                "estado": self._estado,
+                "llamadas": self._llamadas,
+                "fallos": self._fallos,
+                "descartadas": self._descartadas
+            }
+        resumen["p50"] = self.percentil(50)
+        resumen["p95"] = self.percentil(95)
+        return resumen
+
+def obtener_salud(proveedor):
+    """Devuelve el registro de salud compartido de un proveedor (se crea la primera vez)"""
+    with _candado_proveedores:
+        if proveedor not in _proveedores:
+            _proveedores[proveedor] = SaludProveedor(
+                SALUD_PROVEEDORES_CONFIG["fallos_apertura"],
+                SALUD_PROVEEDORES_CONFIG["enfriamiento"],
+                SALUD_PROVEEDORES_CONFIG["muestras"]
+            )
+        return _proveedores[proveedor]
+
+def estado_proveedores():
+    """Resumen de todos los proveedores usados hasta ahora: {proveedor: resumen}"""
+    with _candado_proveedores:
+        proveedores = dict(_proveedores)
+    return {proveedor: salud.resumen() for proveedor, salud in proveedores.items()}
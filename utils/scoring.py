@@ -0,0 +1,197 @@
+# utils/scoring.py
+"""
+Motor de scoring fundamental
+Cada perfil es una lista de criterios (campo, umbrales, puntos por tramo). Las columnas completas
+se clasifican en tramos con np.digitize, así que se puntúan miles de tickers en una sola llamada
+con los mismos resultados que las escaleras if/elif originales.
+"""
+
+import numpy as np
+
+from utils.config import RANGOS_SCORING, PONDERACIONES_SCORING
+
+# Fracción de la ponderación que recibe cada tramo (del mejor al peor)
+_FRACCIONES_5_TRAMOS = [1.0, 0.8, 0.6, 0.4, 0.2]
+_FRACCIONES_4_TRAMOS = [1.0, 0.75, 0.5, 0.25]
+
+def _umbrales(rango):
+    """Umbrales de RANGOS_SCORING en orden ascendente"""
+    return sorted(rango.values())
+
+def _puntos(ponderacion, fracciones, sentido):
+    """
+    Puntos por tramo ordenados de menor a mayor valor del campo
+    En 'mayor' (más es mejor) el último tramo es el mejor; en 'menor', el primero.
+    """
+    puntos = [int(round(ponderacion * fraccion)) for fraccion in fracciones]
+    return puntos[::-1] if sentido == 'mayor' else puntos
+
+def _criterio(campo, sentido, umbrales, puntos, defecto=0, nombre=None,
+              etiquetas=None, etiqueta_invalido=None):
+    """
+    Define un criterio de scoring
+    - sentido 'mayor': tramos por "x > umbral" (np.digitize con right=True)
+    - sentido 'menor': tramos por "x < umbral" (np.digitize con right=False)
+    Solo puntúan valores > 0; el resto usa `etiqueta_invalido` y suma 0 puntos.
+    """
+    return {
+        'campo': campo,
+        'nombre': nombre or campo,
+        'sentido': sentido,
+        'umbrales': np.asarray(umbrales, dtype='float64'),
+        'puntos': np.asarray(puntos, dtype='int64'),
+        'defecto': defecto,
+        'etiquetas': etiquetas,
+        'etiqueta_invalido': etiqueta_invalido
+    }
+
+# Scoring del screener (antes calcular_scoring_dinamico): umbrales y pesos de utils/config
+PERFIL_DINAMICO = {
+    'maximo': 100,
+    'textos': 'anulan',  # un texto en cualquier campo dejaba el score en 0 (excepción capturada)
+    'vacio_cero': True,
+    'criterios': [
+        _criterio('P/E', 'menor', _umbrales(RANGOS_SCORING['pe_ratio']),
+                  _puntos(PONDERACIONES_SCORING['pe_ratio'], _FRACCIONES_4_TRAMOS, 'menor')),
+        _criterio('ROE', 'mayor', _umbrales(RANGOS_SCORING['roe']),
+                  _puntos(PONDERACIONES_SCORING['roe'], _FRACCIONES_5_TRAMOS, 'mayor')),
+        _criterio('Margen Beneficio', 'mayor', _umbrales(RANGOS_SCORING['margen_beneficio']),
+                  _puntos(PONDERACIONES_SCORING['margen_beneficio'], _FRACCIONES_5_TRAMOS, 'mayor')),
+        _criterio('Deuda/Equity', 'menor', _umbrales(RANGOS_SCORING['deuda_equity']),
+                  _puntos(PONDERACIONES_SCORING['deuda_equity'], _FRACCIONES_5_TRAMOS, 'menor')),
+        _criterio('Crecimiento Ingresos', 'mayor', _umbrales(RANGOS_SCORING['crecimiento_ingresos']),
+                  _puntos(PONDERACIONES_SCORING['crecimiento_ingresos'], _FRACCIONES_5_TRAMOS, 'mayor')),
+        _criterio('Beta', 'menor', _umbrales(RANGOS_SCORING['beta']),
+                  _puntos(PONDERACIONES_SCORING['beta'], _FRACCIONES_5_TRAMOS, 'menor'), defecto=1)
+    ]
+}
+
+# Scoring de la sección de riesgo (antes calcular_scoring_fundamental)
+PERFIL_FUNDAMENTAL = {
+    'maximo': 100,
+    'textos': 'convierten',
+    'criterios': [
+        _criterio('trailingPE', 'menor', [15, 25], [15, 10, 5], nombre='P/E',
+                  etiquetas=['🟢 Excelente', '🟡 Bueno', '🔴 Alto']),
+        _criterio('returnOnEquity', 'mayor', [0.08, 0.15], [5, 10, 15], nombre='ROE',
+                  etiquetas=['🔴 Bajo', '🟡 Bueno', '🟢 Excelente']),
+        _criterio('debtToEquity', 'menor', [0.5, 1.0], [15, 10, 5], nombre='Deuda/Equity',
+                  etiquetas=['🟢 Excelente', '🟡 Bueno', '🔴 Alto']),
+        _criterio('profitMargins', 'mayor', [0.1, 0.2], [5, 10, 15], nombre='Margen Beneficio',
+                  etiquetas=['🔴 Bajo', '🟡 Bueno', '🟢 Excelente']),
+        _criterio('revenueGrowth', 'mayor', [0.08, 0.15], [8, 15, 20], nombre='Crecimiento Ingresos',
+                  etiquetas=['🔴 Bajo', '🟡 Bueno', '🟢 Excelente']),
+        _criterio('recommendationMean', 'menor', [2, 3], [20, 15, 8], defecto=3, nombre='Rating Analistas',
+                  etiquetas=['🟢 Fuerte Compra', '🟡 Compra', '🔴 Neutral/Venta'])
+    ]
+}
+
+# Scoring del análisis IA (antes calcular_scoring_fundamental_mejorado)
+PERFIL_MEJORADO = {
+    'maximo': 100,
+    'textos': 'convierten',
+    'criterios': [
+        _criterio('trailingPE', 'menor', [12, 18, 25], [25, 20, 15, 5], nombre='P/E Ratio',
+                  etiquetas=['🟢 Excelente (Muy Barato)', '🟡 Bueno (Razonable)',
+                             '🟠 Moderado (Justo)', '🔴 Alto (Caro)'],
+                  etiqueta_invalido='⚪ No disponible'),
+        _criterio('revenueGrowth', 'mayor', [0.05, 0.10, 0.20], [5, 10, 15, 20], nombre='Crecimiento Ingresos',
+                  etiquetas=['🔴 Bajo (<5%)', '🟠 Moderado (5-10%)', '🟡 Bueno (10-20%)', '🟢 Excelente (>20%)'],
+                  etiqueta_invalido='🔴 Negativo'),
+        _criterio('returnOnEquity', 'mayor', [0.08, 0.15, 0.20], [5, 10, 15, 20], nombre='ROE',
+                  etiquetas=['🔴 Bajo (<8%)', '🟠 Moderado (8-15%)', '🟡 Bueno (15-20%)', '🟢 Excelente (>20%)'],
+                  etiqueta_invalido='🔴 Negativo'),
+        _criterio('debtToEquity', 'menor', [0.5, 1.0, 2.0], [15, 12, 8, 3], nombre='Deuda/Equity',
+                  etiquetas=['🟢 Excelente (<0.5)', '🟡 Bueno (0.5-1.0)', '🟠 Moderado (1.0-2.0)', '🔴 Alto (>2.0)'],
+                  etiqueta_invalido='🟢 Sin deuda'),
+        _criterio('profitMargins', 'mayor', [0.05, 0.10, 0.20], [2, 5, 8, 10], nombre='Margen Beneficio',
+                  etiquetas=['🔴 Bajo (<5%)', '🟠 Moderado (5-10%)', '🟡 Bueno (10-20%)', '🟢 Excelente (>20%)'],
+                  etiqueta_invalido='🔴 Sin beneficio'),
+        _criterio('currentRatio', 'mayor', [1.0, 1.5, 2.0], [2, 5, 8, 10], nombre='Liquidez',
+                  etiquetas=['🔴 Bajo (<1.0)', '🟠 Moderado (1.0-1.5)', '🟡 Bueno (1.5-2.0)', '🟢 Excelente (>2.0)'],
+                  etiqueta_invalido='⚪ No disponible')
+    ]
+}
+
+def puntuar_columnas(columnas, perfil):
+    """
+    Puntúa columnas completas (dict campo -> array float, NaN = ausente)
+    Retorna: (array de scores, dict nombre -> array de tramos con -1 para datos no válidos)
+    """
+    longitud = len(next(iter(columnas.values()))) if columnas else 0
+    scores = np.zeros(longitud, dtype='int64')
+    tramos = {}
+
+    for criterio in perfil['criterios']:
+        valores = np.asarray(columnas.get(criterio['campo'], np.full(longitud, np.nan)), dtype='float64')
+        with np.errstate(invalid='ignore'):
+            validos = valores > 0
+
+        tramo = np.digitize(np.where(validos, valores, 0.0), criterio['umbrales'],
+                            right=(criterio['sentido'] == 'mayor'))
+        scores += np.where(validos, criterio['puntos'][tramo], 0)
+        tramos[criterio['nombre']] = np.where(validos, tramo, -1)
+
+    return np.minimum(scores, perfil['maximo']), tramos
+
+def puntuar_registros(registros, perfil):
+    """
+    Puntúa una lista de dicts (datos del screener o .info de yfinance) en una sola pasada
+    Retorna: (array de scores, dict de tramos)
+    """
+    columnas = {}
+    anulados = np.zeros(len(registros), dtype=bool)
+
+    for criterio in perfil['criterios']:
+        valores = np.full(len(registros), np.nan)
+        for i, registro in enumerate(registros):
+            valor = registro.get(criterio['campo'], criterio['defecto']) if registro else None
+            numero = _a_numero(valor)
+            if numero is None and isinstance(valor, str) and valor:
+                if perfil['textos'] == 'anulan':
+                    anulados[i] = True
+                numero = _texto_a_numero(valor)
+            if numero is not None:
+                valores[i] = numero
+        columnas[criterio['campo']] = valores
+
+    scores, tramos = puntuar_columnas(columnas, perfil)
+    scores[anulados] = 0
+    if perfil.get('vacio_cero'):
+        scores[np.array([not registro for registro in registros], dtype=bool)] = 0
+    return scores, tramos
+
+def puntuar_registro(registro, perfil):
+    """
+    Puntúa un único dict
+    Retorna: (score, dict nombre -> etiqueta) con las etiquetas de los criterios que las definen
+    """
+    scores, tramos = puntuar_registros([registro], perfil)
+
+    metricas = {}
+    for criterio in perfil['criterios']:
+        if not criterio['etiquetas']:
+            continue
+        tramo = tramos[criterio['nombre']][0]
+        if tramo >= 0:
+            metricas[criterio['nombre']] = criterio['etiquetas'][tramo]
+        elif criterio['etiqueta_invalido']:
+            metricas[criterio['nombre']] = criterio['etiqueta_invalido']
+
+    return int(scores[0]), metricas
+
+def _a_numero(valor):
+    """Valor numérico como float (None para ausentes y textos)"""
+    if valor is None or isinstance(valor, str):
+        return None
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+def _texto_a_numero(valor):
+    """Convierte textos numéricos como 'Infinity' (None si no lo son)"""
+    try:
+        return float(valor)
+    except ValueError:
+        return None
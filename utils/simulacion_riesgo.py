@@ -0,0 +1,149 @@
+# utils/simulacion_riesgo.py
+"""
+Simulación Monte Carlo de rendimientos (solo NumPy)
+Genera trayectorias de rendimientos logarítmicos diarios por bloques de tamaño fijo, así que la
+memoria no depende del número total de trayectorias. Cada bloque recibe su propia semilla hija
+de un SeedSequence: el resultado depende solo de la semilla, no de cuántos procesos se usen.
+Modelos de innovaciones:
+- 'bootstrap': remuestreo con reemplazo de los rendimientos históricos
+- 'gbm': movimiento browniano geométrico (log-rendimientos normales con la media y la
+  desviación históricas)
+- 't': t de Student reescalada a la desviación histórica, con los grados de libertad que
+  reproducen la curtosis de la muestra
+"""
+
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utils.config import SIMULACION_CONFIG
+from utils.metricas_riesgo import var_cvar
+
+MODELOS_SIMULACION = ('bootstrap', 'gbm', 't')
+
+# Percentiles del abanico de resultados por horizonte
+PERCENTILES_SIMULACION = (1, 5, 25, 50, 75, 95, 99)
+
+def parametros_modelo(rendimientos, modelo):
+    """
+    Parámetros de las innovaciones estimados de rendimientos simples históricos
+    Retorna: dict con los log-rendimientos y lo que necesita cada modelo
+    """
+    logaritmicos = np.log1p(np.asarray(rendimientos, dtype='float64'))
+    logaritmicos = logaritmicos[np.isfinite(logaritmicos)]
+    if len(logaritmicos) < 2:
+        raise ValueError("Se necesitan al menos 2 rendimientos para simular")
+    if modelo not in MODELOS_SIMULACION:
+        raise ValueError(f"Modelo de simulación no válido: {modelo}")
+
+    parametros = {
+        'modelo': modelo,
+        'media': float(logaritmicos.mean()),
+        'desviacion': float(logaritmicos.std(ddof=1))
+    }
+    if modelo == 'bootstrap':
+        parametros['muestra'] = logaritmicos
+    elif modelo == 't':
+        # Curtosis en exceso de una t: 6 / (gl - 4); sin colas pesadas se usa una t casi normal
+        centrados = logaritmicos - logaritmicos.mean()
+        curtosis = (centrados ** 4).mean() / (centrados ** 2).mean() ** 2 - 3
+        parametros['grados_libertad'] = float(np.clip(6 / curtosis + 4, 4.5, 30)) if curtosis > 0 else 30.0
+    return parametros
+
+def _innovaciones(rng, parametros, trayectorias, dias):
+    """Log-rendimientos diarios simulados (trayectorias x días)"""
+    modelo = parametros['modelo']
+    if modelo == 'bootstrap':
+        muestra = parametros['muestra']
+        return muestra[rng.integers(0, len(muestra), size=(trayectorias, dias))]
+    if modelo == 'gbm':
+        return rng.normal(parametros['media'], parametros['desviacion'], size=(trayectorias, dias))
+
+    gl = parametros['grados_libertad']
+    escala = parametros['desviacion'] * np.sqrt((gl - 2) / gl)
+    return parametros['media'] + escala * rng.standard_t(gl, size=(trayectorias, dias))
+
+def simular_bloque(parametros, trayectorias, horizontes, semilla):
+    """
+    Simula un bloque de trayectorias y devuelve el rendimiento simple acumulado en cada horizonte
+    Retorna: array (trayectorias x horizontes) en float64
+    """
+    rng = np.random.default_rng(semilla)
+    acumulado = np.cumsum(_innovaciones(rng, parametros, trayectorias, max(horizontes)), axis=1)
+    return np.expm1(acumulado[:, np.asarray(horizontes) - 1])
+
+def simular_montecarlo(rendimientos, modelo='bootstrap', trayectorias=None, horizontes=None,
+                       niveles=None, semilla=None, tamano_bloque=None, procesos=None):
+    """
+    VaR/CVaR Monte Carlo del rendimiento acumulado a varios horizontes
+    Los bloques se reparten entre `procesos` procesos (1 = en este proceso, lo que usa la
+    interfaz); con la misma semilla el resultado es idéntico sea cual sea el reparto.
+    Retorna: dict con 'horizontes', 'var' y 'cvar' ({nivel: array por horizonte}), 'percentiles'
+    ({percentil: array por horizonte}), 'prob_perdida', los parámetros del modelo y la velocidad
+    """
+    trayectorias = int(trayectorias or SIMULACION_CONFIG['trayectorias'])
+    horizontes = tuple(sorted(horizontes or SIMULACION_CONFIG['horizontes']))
+    niveles = tuple(niveles or SIMULACION_CONFIG['niveles'])
+    tamano_bloque = int(tamano_bloque or SIMULACION_CONFIG['tamano_bloque'])
+    procesos = int(procesos or 1)
+    semilla = SIMULACION_CONFIG['semilla'] if semilla is None else semilla
+
+    parametros = parametros_modelo(rendimientos, modelo)
+    tamanos = [min(tamano_bloque, trayectorias - inicio) for inicio in range(0, trayectorias, tamano_bloque)]
+    semillas = np.random.SeedSequence(semilla).spawn(len(tamanos))
+
+    inicio = time.perf_counter()
+    if procesos > 1 and len(tamanos) > 1:
+        # forkserver: los procesos no se copian de uno con hilos (candados heredados)
+        contexto = (multiprocessing.get_context("forkserver")
+                    if "forkserver" in multiprocessing.get_all_start_methods() else None)
+        with ProcessPoolExecutor(max_workers=min(procesos, len(tamanos)), mp_context=contexto) as executor:
+            bloques = list(executor.map(simular_bloque, [parametros] * len(tamanos), tamanos,
+                                        [horizontes] * len(tamanos), semillas))
+    else:
+        bloques = [simular_bloque(parametros, tamano, horizontes, semilla_bloque)
+                   for tamano, semilla_bloque in zip(tamanos, semillas)]
+    finales = np.concatenate(bloques, axis=0)
+    duracion = time.perf_counter() - inicio
+
+    colas = var_cvar(finales, niveles)
+    resultado = {
+        'modelo': modelo,
+        'horizontes': horizontes,
+        'trayectorias': trayectorias,
+        'var': {nivel: colas[nivel]['historico']['var'] for nivel in niveles},
+        'cvar': {nivel: colas[nivel]['historico']['cvar'] for nivel in niveles},
+        'percentiles': dict(zip(PERCENTILES_SIMULACION, np.percentile(finales, PERCENTILES_SIMULACION, axis=0))),
+        'prob_perdida': (finales < 0).mean(axis=0) * 100,
+        'parametros': {clave: valor for clave, valor in parametros.items() if clave != 'muestra'},
+        'segundos': duracion,
+        'trayectorias_por_segundo': trayectorias / duracion if duracion > 0 else float('inf')
+    }
+    return resultado
+
+def medir_rendimiento(trayectorias=None, horizontes=None, procesos=(1, SIMULACION_CONFIG['procesos']), dias=1260):
+    """
+    Trayectorias por segundo de cada modelo y número de procesos sobre rendimientos sintéticos
+    Retorna: lista de dicts (modelo, procesos, segundos, trayectorias/s)
+    """
+    rng = np.random.default_rng(0)
+    rendimientos = rng.standard_t(4, size=dias) * 0.01
+    mediciones = []
+    for modelo in MODELOS_SIMULACION:
+        for numero in dict.fromkeys(procesos):
+            resultado = simular_montecarlo(rendimientos, modelo, trayectorias, horizontes, procesos=numero)
+            mediciones.append({
+                'modelo': modelo,
+                'procesos': numero,
+                'segundos': resultado['segundos'],
+                'trayectorias_por_segundo': resultado['trayectorias_por_segundo']
+            })
+    return mediciones
+
+# Benchmark: python -m utils.simulacion_riesgo
+if __name__ == "__main__":
+    for medicion in medir_rendimiento():
+        print(f"{medicion['modelo']:>9} | {medicion['procesos']} proceso(s) | "
+              f"{medicion['segundos']:.2f} s | {medicion['trayectorias_por_segundo']:,.0f} trayectorias/s")
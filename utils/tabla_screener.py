@@ -0,0 +1,194 @@
+# utils/tabla_screener.py
+"""
+Tabla columnar del universo del screener
+Cada campo numérico es una columna float64 (NaN = dato ausente). Los filtros se evalúan como
+máscaras booleanas de NumPy o, con los índices ordenados por campo, como rangos por búsqueda binaria.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Campos numéricos del screener que se guardan como columnas
+COLUMNAS_NUMERICAS = [
+    'P/E', 'ROE', 'Margen Beneficio', 'Deuda/Equity', 'Crecimiento Ingresos',
+    'Beta', 'RSI', 'Score', 'Market Cap', 'Precio Actual', 'Cambio %', 'Volumen',
+    'Sharpe Ratio', 'Drawdown Máximo'
+]
+
+# Campos con índice ordenado (los que aparecen en el dict de filtros del screener)
+_CAMPOS_INDEXADOS = ['P/E', 'ROE', 'Margen Beneficio', 'Deuda/Equity', 'Beta', 'RSI',
+                     'Sharpe Ratio', 'Drawdown Máximo']
+
+def construir_tabla_screener(acciones):
+    """
+    Convierte el dict {símbolo: datos} del universo en un DataFrame columnar indexado por símbolo
+    Valores None o no numéricos (p. ej. 'Infinity') quedan como NaN.
+    """
+    if not acciones:
+        return pd.DataFrame(columns=COLUMNAS_NUMERICAS + ['Sector'], dtype=float)
+
+    tabla = pd.DataFrame.from_dict(acciones, orient='index')
+    for columna in COLUMNAS_NUMERICAS:
+        if columna in tabla.columns:
+            # Solo valores numéricos reales: textos como 'Infinity' no se pueden comparar
+            es_numero = tabla[columna].map(lambda valor: isinstance(valor, (int, float, np.number)))
+            tabla[columna] = tabla[columna].where(es_numero, np.nan).astype('float64')
+        else:
+            tabla[columna] = np.nan
+
+    tabla.index.name = 'Símbolo'
+    return tabla[COLUMNAS_NUMERICAS + [c for c in ['Nombre', 'Sector', 'Industria'] if c in tabla.columns]]
+
+def mascara_filtros(tabla, filtros):
+    """
+    Compila el dict de filtros del screener en una máscara booleana (única definición de las reglas)
+    Un filtro se desactiva con su valor neutro (mínimos en 0, P/E máx. 1000, D/E máx. 10, Beta
+    máx. 5, Sharpe mín. -5, drawdown mín. -100%) y, si está activo, un dato ausente excluye la acción.
+    """
+    pe = tabla['P/E'].to_numpy()
+    mascara = np.ones(len(tabla), dtype=bool)
+
+    with np.errstate(invalid='ignore'):
+        if filtros['pe_min'] > 0:
+            mascara &= (pe != 0) & (pe >= filtros['pe_min'])
+        if filtros['pe_max'] < 1000:
+            mascara &= pe <= filtros['pe_max']
+        if filtros['roe_min'] > 0:
+            mascara &= tabla['ROE'].to_numpy() >= filtros['roe_min'] / 100
+        if filtros['profit_margin_min'] > 0:
+            mascara &= tabla['Margen Beneficio'].to_numpy() >= filtros['profit_margin_min'] / 100
+        if filtros['debt_equity_max'] < 10:
+            mascara &= tabla['Deuda/Equity'].to_numpy() <= filtros['debt_equity_max']
+        if filtros['beta_max'] < 5:
+            mascara &= tabla['Beta'].to_numpy() <= filtros['beta_max']
+        if filtros['sharpe_min'] > -5:
+            mascara &= tabla['Sharpe Ratio'].to_numpy() >= filtros['sharpe_min']
+        if filtros['drawdown_min'] > -100:
+            mascara &= tabla['Drawdown Máximo'].to_numpy() >= filtros['drawdown_min'] / 100
+
+        rsi = tabla['RSI'].to_numpy()
+        mascara &= (rsi >= filtros['rsi_min']) & (rsi <= filtros['rsi_max'])
+
+    return mascara
+
+def construir_indices_screener(tabla):
+    """
+    Índices ordenados por cada campo filtrable para resolver rangos con búsqueda binaria
+    Por campo se guardan los valores ordenados (sin NaN), las filas en ese orden y el rango de
+    cada fila dentro del orden (-1 si el dato falta).
+    """
+    indices = {
+        'n': len(tabla),
+        'score': np.nan_to_num(tabla['Score'].to_numpy(dtype='float64'), nan=0.0),
+        'campos': {}
+    }
+
+    for campo in _CAMPOS_INDEXADOS:
+        valores = tabla[campo].to_numpy(dtype='float64')
+        validas = np.flatnonzero(~np.isnan(valores))
+        orden = validas[np.argsort(valores[validas], kind='stable')]
+
+        rango = np.full(len(valores), -1, dtype=np.int64)
+        rango[orden] = np.arange(len(orden))
+
+        indices['campos'][campo] = {
+            'valores': valores[orden],
+            'filas': orden,
+            'rango': rango
+        }
+
+    return indices
+
+def consultar_indices_screener(indices, filtros):
+    """
+    Filas que cumplen los filtros usando búsquedas binarias por campo e intersección
+    Se parte del rango más selectivo y se descarta con el rango de cada fila en los demás campos.
+    """
+    intervalos = []
+    for campo, minimo, maximo in _rangos_filtros(filtros):
+        indice = indices['campos'][campo]
+        desde = 0 if minimo is None else np.searchsorted(indice['valores'], minimo, side='left')
+        hasta = len(indice['valores']) if maximo is None else np.searchsorted(indice['valores'], maximo, side='right')
+        if hasta <= desde:
+            return np.empty(0, dtype=np.int64)
+        intervalos.append((hasta - desde, campo, desde, hasta))
+
+    if not intervalos:
+        return np.arange(indices['n'])
+
+    intervalos.sort(key=lambda intervalo: intervalo[0])
+    _, campo, desde, hasta = intervalos[0]
+    candidatas = indices['campos'][campo]['filas'][desde:hasta]
+
+    for _, campo, desde, hasta in intervalos[1:]:
+        rango = indices['campos'][campo]['rango'][candidatas]
+        candidatas = candidatas[(rango >= desde) & (rango < hasta)]
+        if len(candidatas) == 0:
+            break
+
+    return np.sort(candidatas)
+
+def mejores_por_score(filas, scores, n):
+    """
+    Las `n` filas de mayor Score sin ordenar todo el conjunto (np.argpartition)
+    A igual Score se respeta el orden original de las filas, como un ordenamiento estable.
+    """
+    filas = np.sort(np.asarray(filas))
+    if len(filas) == 0 or n <= 0:
+        return filas[:0]
+
+    valores = scores[filas]
+    if len(filas) > n:
+        umbral = valores[np.argpartition(-valores, n - 1)[n - 1]]
+        mayores = valores > umbral
+        iguales = np.flatnonzero(valores == umbral)[:n - int(mayores.sum())]
+        seleccion = np.concatenate([np.flatnonzero(mayores), iguales])
+        filas, valores = filas[seleccion], valores[seleccion]
+
+    orden = np.lexsort((filas, -valores))
+    return filas[orden]
+
+def filtrar_tabla_screener(tabla, filtros, max_acciones=50, indices=None):
+    """
+    Devuelve los símbolos que cumplen los filtros, ordenados por Score descendente
+    Con `indices` (construir_indices_screener) los rangos se resuelven por búsqueda binaria;
+    sin ellos se evalúa la máscara completa.
+    """
+    if tabla is None or tabla.empty:
+        return []
+
+    if indices is not None:
+        filas = consultar_indices_screener(indices, filtros)
+        scores = indices['score']
+    else:
+        filas = np.flatnonzero(mascara_filtros(tabla, filtros))
+        scores = np.nan_to_num(tabla['Score'].to_numpy(), nan=0.0)
+
+    return tabla.index[mejores_por_score(filas, scores, max_acciones)].tolist()
+
+def _rangos_filtros(filtros):
+    """
+    Traduce el dict de filtros a rangos cerrados (campo, mínimo, máximo) con las reglas de
+    mascara_filtros. Con pe_min > 0 el P/E 0 ya queda fuera del rango [pe_min, ...].
+    """
+    rangos = []
+
+    pe_min = filtros['pe_min'] if filtros['pe_min'] > 0 else None
+    pe_max = filtros['pe_max'] if filtros['pe_max'] < 1000 else None
+    if pe_min is not None or pe_max is not None:
+        rangos.append(('P/E', pe_min, pe_max))
+    if filtros['roe_min'] > 0:
+        rangos.append(('ROE', filtros['roe_min'] / 100, None))
+    if filtros['profit_margin_min'] > 0:
+        rangos.append(('Margen Beneficio', filtros['profit_margin_min'] / 100, None))
+    if filtros['debt_equity_max'] < 10:
+        rangos.append(('Deuda/Equity', None, filtros['debt_equity_max']))
+    if filtros['beta_max'] < 5:
+        rangos.append(('Beta', None, filtros['beta_max']))
+    if filtros['sharpe_min'] > -5:
+        rangos.append(('Sharpe Ratio', filtros['sharpe_min'], None))
+    if filtros['drawdown_min'] > -100:
+        rangos.append(('Drawdown Máximo', filtros['drawdown_min'] / 100, None))
+    rangos.append(('RSI', filtros['rsi_min'], filtros['rsi_max']))
+
+    return rangos
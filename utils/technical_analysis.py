@@ -2,6 +2,7 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+from utils.config import PARAMETROS_TECNICOS
 
 @st.cache_data(ttl=3600, show_spinner=False, max_entries=50)
 def calcular_indicadores_tecnicos(data):
@@ -650,4 +651,121 @@ def calcular_indicadores_tecnicos(data):
         
     except Exception as e:
         print(f"Error calculando indicadores: {str(e)}")
-        return data_tech
\ No newline at end of file
+        return data_tech
+
+# Indicadores de muchos símbolos a la vez sobre un panel de cierres (fechas x tickers)
+def calcular_indicadores_panel(cierres, parametros=None):
+    """
+    Calcula RSI, MACD, Bandas de Bollinger, SMA y EMA para todas las columnas de un panel de cierres
+    Las medias móviles se resuelven con sumas acumuladas de NumPy sobre la matriz completa y las EMA
+    con ewm del DataFrame, con las mismas fórmulas que calcular_indicadores_tecnicos. Las fechas
+    anteriores al primer cierre de un ticker quedan en NaN.
+    Retorna: dict {indicador: DataFrame fechas x tickers}
+    """
+    p = dict(PARAMETROS_TECNICOS, **(parametros or {}))
+    cierres = cierres.astype('float64')
+    valores = cierres.to_numpy()
+
+    def _panel(matriz):
+        return pd.DataFrame(matriz, index=cierres.index, columns=cierres.columns)
+
+    # RSI (media simple de subidas y bajadas; la primera barra de cada ticker cuenta como 0)
+    delta = np.full_like(valores, np.nan)
+    delta[1:] = valores[1:] - valores[:-1]
+    validos = ~np.isnan(valores)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        gain = _media_movil_panel(np.where(validos, np.where(delta > 0, delta, 0.0), np.nan), p['rsi_period'])
+        loss = _media_movil_panel(np.where(validos, np.where(delta < 0, -delta, 0.0), np.nan), p['rsi_period'])
+        indicadores = {'RSI': _panel(100 - (100 / (1 + gain / loss)))}
+
+    # MACD
+    exp_fast = cierres.ewm(span=p['macd_fast'], adjust=False).mean()
+    exp_slow = cierres.ewm(span=p['macd_slow'], adjust=False).mean()
+    macd = exp_fast - exp_slow
+    senal = macd.ewm(span=p['macd_signal'], adjust=False).mean()
+    indicadores.update({
+        'MACD': macd,
+        'MACD_Signal': senal,
+        'MACD_Histogram': macd - senal,
+        f"EMA_{p['macd_fast']}": exp_fast,
+        f"EMA_{p['macd_slow']}": exp_slow
+    })
+
+    # Bandas de Bollinger
+    media = _media_movil_panel(valores, p['bb_period'])
+    desviacion = _desviacion_movil_panel(valores, p['bb_period'])
+    superior = media + desviacion * p['bb_std']
+    inferior = media - desviacion * p['bb_std']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ancho = (superior - inferior) / media
+    indicadores.update({
+        'BB_Middle': _panel(media),
+        'BB_Upper': _panel(superior),
+        'BB_Lower': _panel(inferior),
+        'BB_Width': _panel(ancho)
+    })
+
+    # Medias móviles simples
+    for ventana in sorted({p['sma_short'], p['sma_medium'], p['sma_long']}):
+        indicadores[f'SMA_{ventana}'] = _panel(_media_movil_panel(valores, ventana))
+
+    return indicadores
+
+def _media_movil_panel(valores, ventana):
+    """
+    Media móvil de cada columna con sumas acumuladas (NaN si falta algún dato en la ventana,
+    como rolling(window).mean()). Se resta el primer valor de cada columna para limitar el redondeo.
+    """
+    validos = ~np.isnan(valores)
+    primera = validos.argmax(axis=0)
+    referencia = np.nan_to_num(valores[primera, np.arange(valores.shape[1])])
+
+    suma = np.cumsum(np.where(validos, valores - referencia, 0.0), axis=0)
+    cuenta = np.cumsum(validos, axis=0)
+    if len(valores) > ventana:
+        suma[ventana:] = suma[ventana:] - suma[:-ventana]
+        cuenta[ventana:] = cuenta[ventana:] - cuenta[:-ventana]
+
+    media = suma / ventana + referencia
+    media[cuenta < ventana] = np.nan
+    return media
+
+def _desviacion_movil_panel(valores, ventana):
+    """Desviación estándar muestral móvil de cada columna (como rolling(window).std())"""
+    desviacion = np.full_like(valores, np.nan)
+    if len(valores) >= ventana:
+        ventanas = np.lib.stride_tricks.sliding_window_view(valores, ventana, axis=0)
+        desviacion[ventana - 1:] = ventanas.std(axis=-1, ddof=1)
+    return desviacion
+
+def ultimos_indicadores_panel(cierres, parametros=None):
+    """
+    Valor de cada indicador en la última barra con cierre de cada ticker, más la tendencia
+    ('ALCISTA' si Close > SMA corta > SMA media, 'BAJISTA' si es al revés, si no 'LATERAL')
+    Retorna: DataFrame indexado por ticker
+    """
+    if cierres is None or cierres.empty:
+        return pd.DataFrame()
+
+    p = dict(PARAMETROS_TECNICOS, **(parametros or {}))
+    indicadores = calcular_indicadores_panel(cierres, p)
+
+    validos = cierres.notna().to_numpy()
+    tiene_datos = validos.any(axis=0)
+    ultima_fila = len(cierres) - 1 - validos[::-1].argmax(axis=0)
+    columnas = np.arange(cierres.shape[1])
+
+    ultimos = pd.DataFrame(index=cierres.columns)
+    ultimos['Close'] = cierres.to_numpy(dtype='float64')[ultima_fila, columnas]
+    for nombre, panel in indicadores.items():
+        ultimos[nombre] = panel.to_numpy()[ultima_fila, columnas]
+    ultimos = ultimos[tiene_datos]
+
+    corta = ultimos[f"SMA_{p['sma_short']}"]
+    media = ultimos[f"SMA_{p['sma_medium']}"]
+    ultimos['Tendencia'] = np.select(
+        [(ultimos['Close'] > corta) & (corta > media), (ultimos['Close'] < corta) & (corta < media)],
+        ['ALCISTA', 'BAJISTA'],
+        default='LATERAL'
+    )
+    return ultimos
@@ -0,0 +1,73 @@
+# utils/vuelo_unico.py
+"""
+Agrupación de peticiones idénticas simultáneas (single-flight)
+Si varios hilos o sesiones de Streamlit piden lo mismo a la vez, solo el primero llama al
+proveedor; el resto espera a que termine y recibe su mismo resultado (o su misma excepción).
+st.cache_data solo evita repetir la llamada cuando la primera ya ha terminado; esto cubre la
+ventana en que aún está en curso.
+"""
+
+import functools
+from threading import Event, Lock
+
+_en_vuelo = {}
+_candado_vuelos = Lock()
+_estadisticas = {"ejecutadas": 0, "compartidas": 0}
+
+class _Vuelo:
+    """Petición en curso: los que esperan leen su resultado cuando se marca el evento"""
+
+    def __init__(self):
+        self.evento = Event()
+        self.resultado = None
+        self.error = None
+
+def ejecutar_unico(clave, funcion, *args, **kwargs):
+    """
+    Ejecuta funcion(*args, **kwargs) salvo que ya haya una llamada en curso con la misma `clave`,
+    en cuyo caso espera a esa llamada y devuelve su resultado
+    El resultado es el mismo objeto para todos: no debe modificarse.
+    """
+    with _candado_vuelos:
+        vuelo = _en_vuelo.get(clave)
+        lider = vuelo is None
+        if lider:
+            vuelo = _en_vuelo[clave] = _Vuelo()
+            _estadisticas["ejecutadas"] += 1
+        else:
+            _estadisticas["compartidas"] += 1
+
+    if not lider:
+        vuelo.evento.wait()
+        if vuelo.error is not None:
+            raise vuelo.error
+        return vuelo.resultado
+
+    try:
+        vuelo.resultado = funcion(*args, **kwargs)
+        return vuelo.resultado
+    except Exception as e:
+        vuelo.error = e
+        raise
+    except BaseException:
+        # Interrupción o control de script de Streamlit: los que esperan no deben recibir None
+        vuelo.error = RuntimeError("La petición compartida se interrumpió antes de terminar")
+        raise
+    finally:
+        # Se retira antes de avisar: una petición posterior ya no comparte este resultado
+        with _candado_vuelos:
+            _en_vuelo.pop(clave, None)
+        vuelo.evento.set()
+
+def vuelo_unico(funcion):
+    """Decorador: agrupa las llamadas simultáneas a `funcion` con los mismos argumentos"""
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        clave = (funcion.__module__, funcion.__qualname__, args, tuple(sorted(kwargs.items())))
+        return ejecutar_unico(clave, funcion, *args, **kwargs)
+    return envoltura
+
+def estadisticas_vuelos():
+    """Llamadas ejecutadas y llamadas que se sirvieron de una ya en curso"""
+    with _candado_vuelos:
+        return dict(_estadisticas, en_curso=len(_en_vuelo))